@@ -0,0 +1,240 @@
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import engine, get_session, pool_metrics
+from app.core.security import get_current_username
+from app.core import vector_index
+from app.core.embedding_cache import embedding_cache
+from app.core.search_cache import search_cache
+from app.core.ai_client import get_ai_client
+from app.services.case_service import CaseService
+from app.services.embedding_backfill import BACKFILL_MAX_ATTEMPTS, backfill_worker, count_backlog, count_exhausted
+from app.services.embedding_queue import embedding_queue
+from app.services.case_neighbors import neighbor_index
+from app.services.dedup_service import DEDUP_MODE, DEDUP_THRESHOLD, dedup_job
+from app.services.vehicle_model_service import VEHICLE_MODELS_STRICT, clean_name, vehicle_model_catalog
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+# Referencias a tareas en segundo plano (evita que el GC las cancele)
+_background_tasks: set = set()
+
+
+def _run_in_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# --- ÍNDICE VECTORIAL (ANN) ---
+@router.get("/vector-index")
+async def get_vector_index_status(username: str = Depends(get_current_username)):
+    """
+    Estado del índice ANN de diagnosis_cases.embedding y su configuración.
+    """
+    return {
+        "index": vector_index.VECTOR_INDEX_NAME,
+        "type": vector_index.VECTOR_INDEX_TYPE,
+        "compression": vector_index.EMBEDDING_COMPRESSION,
+        "rerank_depth": vector_index.RERANK_DEPTH if vector_index.uses_rerank() else None,
+        "exists": await vector_index.index_exists(engine),
+        "matches_config": await vector_index.index_matches_config(engine),
+        "definition": vector_index.index_definition(),
+        # Tabla particionada por construction_group: un índice por partición
+        "partitions": await vector_index.partition_stats(engine),
+        "rebuild": vector_index.rebuild_status,
+    }
+
+
+@router.post("/vector-index/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_vector_index(username: str = Depends(get_current_username)):
+    """
+    Reconstruye el índice ANN con CONCURRENTLY (la tabla sigue en servicio).
+    La operación corre en segundo plano; consultar GET /vector-index para el progreso.
+    """
+    if vector_index.is_rebuilding():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ya hay una reconstrucción del índice en curso",
+        )
+
+    async def _rebuild():
+        try:
+            await vector_index.rebuild_index(engine)
+        except Exception as e:
+            logger.exception("❌ Error reconstruyendo índice vectorial: %s", e)
+
+    _run_in_background(_rebuild())
+    return {"status": "accepted", "index": vector_index.VECTOR_INDEX_NAME}
+
+
+@router.get("/vector-index/recall")
+async def measure_vector_recall(
+    sample: int = Query(default=20, ge=1, le=200),
+    k: int = Query(default=10, ge=1, le=50),
+    session: AsyncSession = Depends(get_session),
+    username: str = Depends(get_current_username),
+):
+    """
+    Recall@k de la configuración actual (tipo de índice, compresión, re-ranking)
+    contra la búsqueda exacta. Cada consulta exacta es un Seq Scan: usar muestras chicas.
+    """
+    return await CaseService(session).measure_recall(sample, k)
+
+
+# --- CACHÉ DE EMBEDDINGS ---
+@router.get("/embedding-cache")
+async def get_embedding_cache_stats(username: str = Depends(get_current_username)):
+    """
+    Tamaño, hit rate y desalojos de la caché de embeddings (memoria + Postgres),
+    más coalescing y micro-batching del cliente de IA de este worker.
+    """
+    stats = await embedding_cache.stats()
+    stats["client"] = get_ai_client().stats()
+    return stats
+
+
+@router.delete("/embedding-cache")
+async def prune_embedding_cache(username: str = Depends(get_current_username)):
+    """
+    Vacía el tier en memoria de este worker y purga las entradas expiradas en la DB.
+    """
+    return await embedding_cache.prune()
+
+
+# --- CACHÉ DE RESULTADOS DE BÚSQUEDA ---
+@router.get("/search-cache")
+async def get_search_cache_stats(username: str = Depends(get_current_username)):
+    """
+    Backend, generación vigente, hit rate e invalidaciones de la caché de búsquedas.
+    """
+    return await search_cache.stats()
+
+
+@router.delete("/search-cache")
+async def clear_search_cache(username: str = Depends(get_current_username)):
+    """
+    Invalida todas las búsquedas cacheadas (incrementa la generación).
+    """
+    await search_cache.invalidate()
+    return await search_cache.stats()
+
+
+# --- BACKFILL DE EMBEDDINGS ---
+@router.get("/embeddings/backfill")
+async def get_backfill_status(username: str = Depends(get_current_username)):
+    """
+    Casos pendientes de vectorizar (embedding NULL), throughput del backfill
+    y estado de la cola de creación asíncrona de este proceso. 'exhausted'
+    son los casos que agotaron sus intentos (el proveedor rechaza su texto).
+    """
+    return {
+        "backlog": await count_backlog(),
+        "exhausted": await count_exhausted(),
+        "max_attempts": BACKFILL_MAX_ATTEMPTS,
+        "worker": backfill_worker.stats(),
+        "queue": embedding_queue.stats(),
+    }
+
+
+@router.get("/embeddings/provider")
+async def get_embedding_provider_status(username: str = Depends(get_current_username)):
+    """
+    Salud del proveedor de embeddings en este worker: estado y transiciones del
+    circuit breaker, latencias p50/p95, timeouts, reintentos y hedging.
+    """
+    return get_ai_client().stats()
+
+
+# --- VECINOS PRECALCULADOS (casos similares) ---
+@router.get("/neighbors")
+async def get_neighbors_status(username: str = Depends(get_current_username)):
+    """
+    Estado de las listas precalculadas de casos similares: casos pendientes
+    de refrescar, refrescos hechos y progreso del último rebuild.
+    """
+    return neighbor_index.stats()
+
+
+@router.post("/neighbors/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_neighbors(username: str = Depends(get_current_username)):
+    """
+    Recalcula todas las listas de vecinos en segundo plano (carga inicial o
+    tras activar NEIGHBORS_PRECOMPUTE). Consultar GET /neighbors para el progreso.
+    """
+    if not neighbor_index.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Vecinos precalculados desactivados (NEIGHBORS_PRECOMPUTE=false)",
+        )
+    if neighbor_index.rebuilding:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ya hay un rebuild de vecinos en curso")
+
+    async def _rebuild():
+        try:
+            await neighbor_index.rebuild()
+        except Exception as e:
+            logger.exception("❌ Error recalculando vecinos: %s", e)
+
+    _run_in_background(_rebuild())
+    return {"status": "accepted", "k": neighbor_index.k}
+
+
+# --- DEDUPLICACIÓN ---
+@router.get("/dedup")
+async def get_dedup_status(username: str = Depends(get_current_username)):
+    """
+    Configuración de la deduplicación al ingresar y progreso del último job offline.
+    """
+    return {"mode": DEDUP_MODE, "threshold": DEDUP_THRESHOLD, "job": dedup_job.status}
+
+
+@router.post("/dedup/run", status_code=status.HTTP_202_ACCEPTED)
+async def run_dedup_job(
+    dry_run: bool = Query(False, description="Solo contar grupos y variantes, sin modificar la tabla"),
+    username: str = Depends(get_current_username),
+):
+    """
+    Agrupa los casi duplicados ya guardados (mismo modelo y grupo, similitud >=
+    DEDUP_THRESHOLD) marcando como variantes los más nuevos de cada grupo.
+    Corre en segundo plano; consultar GET /dedup para el progreso.
+    """
+    if dedup_job.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ya hay un job de deduplicación en curso")
+
+    async def _run():
+        try:
+            await dedup_job.run(dry_run=dry_run)
+        except Exception as e:
+            logger.exception("❌ Error en el job de deduplicación: %s", e)
+
+    _run_in_background(_run())
+    return {"status": "accepted", "dry_run": dry_run, "threshold": DEDUP_THRESHOLD}
+
+
+# --- CATÁLOGO DE MODELOS ---
+@router.post("/vehicle-models", status_code=status.HTTP_201_CREATED)
+async def add_vehicle_model(
+    name: str = Query(..., min_length=1, max_length=100, description="Nombre canónico, p. ej. 'ID.7'"),
+    username: str = Depends(get_current_username),
+):
+    """
+    Agrega un modelo al catálogo (idempotente: si ya existe lo retorna).
+    Necesario con VEHICLE_MODELS_STRICT=true; si no, la primera alta lo registra sola.
+    """
+    if not clean_name(name):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="El nombre no puede estar vacío")
+    vehicle_model = await vehicle_model_catalog.register(name)
+    return {"id": vehicle_model.id, "name": vehicle_model.name, "strict": VEHICLE_MODELS_STRICT}
+
+
+# --- POOL DE CONEXIONES ---
+@router.get("/db/pool")
+async def get_pool_metrics(username: str = Depends(get_current_username)):
+    """
+    Saturación y tiempo de espera por conexión de cada pool (primario / réplica) de este worker.
+    """
+    return pool_metrics.snapshot()
@@ -1,56 +1,215 @@
-from fastapi import APIRouter, Depends, status
-from typing import List
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_session
+from app.core.database import get_session, get_read_session
+from app.core.metrics import observe_stage
 from app.core.security import get_current_username
-from app.models import DiagnosisCase, DiagnosisCaseCreate, SearchRequest, SearchResult
+from app.models import (
+    DiagnosisCaseCreate, SearchRequest, SearchResult, BulkCreateResponse,
+    CaseEmbeddingStatus, EmbeddingStatus, DiagnosisCaseRead,
+    ConstructionGroup, SearchFields, SimilarCasesRequest, SimilarCases,
+)
+from app.core.ai_client import get_ai_client
 from app.services.case_service import CaseService
+from app.services.case_export import SYNC_TOKEN_HEADER, current_sync_token, export_cases_ndjson, parse_since
+from app.services.embedding_queue import embedding_queue
+from app.services.vehicle_model_service import vehicle_model_catalog
 
 router = APIRouter()
 
+# Límite de casos por request en la carga masiva (los clientes deben trocear)
+BULK_MAX_CASES = int(os.getenv("BULK_MAX_CASES", "1000"))
+
+# La búsqueda serializa su respuesta directamente (sin re-validar contra
+# response_model, que queda solo para la documentación OpenAPI)
+SEARCH_RESULTS_ADAPTER = TypeAdapter(List[SearchResult])
+
 # --- NUEVO ENDPOINT: LISTA MAESTRA DE MODELOS ---
 @router.get("/models", response_model=List[str])
 async def get_vehicle_models(
-    session: AsyncSession = Depends(get_session),
     username: str = Depends(get_current_username)
 ):
     """
-    Devuelve la lista oficial de modelos para estandarizar la entrada de datos
-    y alimentar los autocompletados del frontend.
+    Devuelve la lista oficial de modelos (tabla vehicle_models) para estandarizar
+    la entrada de datos y alimentar los autocompletados del frontend.
     """
-    official_models = [
-        "Amarok", "Arteon", "Atlas", "Beetle", "Caddy", "Crafter", 
-        "Golf", "Golf GTI", "Golf R", "ID.3", "ID.4", "ID.Buzz", 
-        "Jetta", "Jetta GLI", "Passat", "Polo", "Saveiro", 
-        "T-Cross", "Taos", "Tiguan", "Touareg", "Transporter", 
-        "Virtus", "Vento"
-    ]
-    # Ordenamos alfabéticamente para mejor UX
-    return sorted(official_models)
+    # Ordenados alfabéticamente para mejor UX
+    return await vehicle_model_catalog.names()
 
 # --- ENDPOINTS EXISTENTES ---
-@router.post("/", response_model=DiagnosisCase, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=DiagnosisCaseRead, status_code=status.HTTP_201_CREATED)
 async def create_new_case(
     case_data: DiagnosisCaseCreate,
+    response: Response,
     session: AsyncSession = Depends(get_session),
     username: str = Depends(get_current_username)
 ):
     """
     Registra un nuevo caso y genera su embedding.
+
+    Con DEDUP_MODE un casi duplicado (mismo modelo y grupo) se rechaza con 409,
+    se fusiona en el caso existente (200 con ese caso) o se guarda como
+    variante; X-Dedup-Action indica 'merged' o 'variant'.
     """
     service = CaseService(session)
     new_case = await service.create_case(case_data)
+    if service.dedup_action:
+        response.headers["X-Dedup-Action"] = service.dedup_action
+        if service.dedup_action == "merged":
+            response.status_code = status.HTTP_200_OK
     return new_case
 
-@router.post("/search", response_model=List[SearchResult])
+@router.post("/async", response_model=CaseEmbeddingStatus, status_code=status.HTTP_202_ACCEPTED)
+async def create_new_case_async(
+    case_data: DiagnosisCaseCreate,
+    session: AsyncSession = Depends(get_session),
+    username: str = Depends(get_current_username)
+):
+    """
+    Registra un caso sin esperar a la IA: responde 202 con el ID y el
+    embedding se calcula en segundo plano. Consultar GET /{id}/status
+    para saber cuándo aparece en la búsqueda semántica. Con DEDUP_MODE la
+    deduplicación corre al adjuntar el vector y se informa en ese status.
+    """
+    service = CaseService(session)
+    new_case = await service.create_case_deferred(case_data)
+
+    queued = embedding_queue.enqueue(new_case.id)
+    return CaseEmbeddingStatus(
+        id=new_case.id,
+        status=EmbeddingStatus.QUEUED if queued else EmbeddingStatus.PENDING
+    )
+
+@router.get("/{case_id}/status", response_model=CaseEmbeddingStatus)
+async def get_case_status(
+    case_id: int,
+    session: AsyncSession = Depends(get_session),
+    username: str = Depends(get_current_username)
+):
+    """
+    Indica si el caso ya es buscable por similitud semántica, o si al
+    vectorizarlo resultó casi duplicado de otro caso (duplicate_of).
+    """
+    service = CaseService(session)
+    state = await service.embedding_state(case_id)
+    if state is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Caso no encontrado")
+
+    searchable, variant_of_id = state
+    if variant_of_id is not None:
+        return CaseEmbeddingStatus(id=case_id, status=EmbeddingStatus.DUPLICATE, duplicate_of=variant_of_id)
+    if searchable:
+        case_status = EmbeddingStatus.SEARCHABLE
+    elif embedding_queue.is_pending(case_id):
+        case_status = EmbeddingStatus.QUEUED
+    else:
+        case_status = EmbeddingStatus.PENDING
+    return CaseEmbeddingStatus(id=case_id, status=case_status)
+
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_cases_bulk(
+    cases_data: List[Dict[str, Any]],
+    session: AsyncSession = Depends(get_session),
+    username: str = Depends(get_current_username)
+):
+    """
+    Registra un lote de casos con embeddings por lotes e INSERT multi-fila.
+    Cada fila se valida por separado: los errores se reportan por índice
+    sin rechazar el lote completo.
+    """
+    if len(cases_data) > BULK_MAX_CASES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {BULK_MAX_CASES} casos por request (recibidos: {len(cases_data)})"
+        )
+    service = CaseService(session)
+    return await service.create_cases_bulk(cases_data)
+
+@router.post("/search", response_model=List[SearchResult], response_model_exclude_none=True)
 async def search_cases(
     search_data: SearchRequest,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
     username: str = Depends(get_current_username)
 ):
     """
     Busca casos usando IA o texto tradicional.
+    Si hay más resultados, el cursor de la página siguiente viaja en el header X-Next-Cursor.
+    """
+    service = CaseService(session)
+    page = await service.search_cases(search_data)
+
+    with observe_stage("serialization"):
+        body = SEARCH_RESULTS_ADAPTER.dump_json(page.results, exclude_none=True)
+    headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/export")
+async def export_cases(
+    include_embeddings: bool = Query(default=False, description="Incluir el vector de cada caso"),
+    since: Optional[str] = Query(default=None, description="Header X-Sync-Token de la exportación anterior"),
+    username: str = Depends(get_current_username)
+):
+    """
+    Exporta el corpus completo como NDJSON (un caso por línea) para réplicas
+    offline de los talleres y jobs de análisis.
+    Sincronización incremental: guardar el header X-Sync-Token y repetir con
+    since=<token>; trae los casos nuevos y los modificados (aplicar como upsert por id).
+    """
+    sync_point = parse_since(since) if since else None
+    # Antes de abrir el stream: ninguna escritura posterior queda fuera del próximo export
+    sync_token = await current_sync_token()
+    embedding_model = get_ai_client().model if include_embeddings else None
+    return StreamingResponse(
+        export_cases_ndjson(include_embeddings, sync_point, embedding_model),
+        media_type="application/x-ndjson",
+        headers={SYNC_TOKEN_HEADER: str(sync_token)},
+    )
+
+@router.get("/{case_id}/similar", response_model=List[SearchResult], response_model_exclude_none=True)
+async def get_similar_cases(
+    case_id: int,
+    limit: Optional[int] = Query(default=None, ge=1, le=50),
+    model_filter: Optional[str] = None,
+    group_filter: Optional[ConstructionGroup] = None,
+    fields: SearchFields = SearchFields.SUMMARY,
+    ef_search: Optional[int] = Query(default=None, ge=1, le=1000),
+    session: AsyncSession = Depends(get_read_session),
+    username: str = Depends(get_current_username)
+):
+    """
+    "Casos relacionados" al abrir un caso: usa su embedding ya guardado
+    (sin llamar a la IA), con los mismos filtros que la búsqueda y sin el caso mismo.
+    """
+    service = CaseService(session)
+    search_params = SearchRequest(
+        query="", limit=limit, model_filter=model_filter, group_filter=group_filter,
+        fields=fields, ef_search=ef_search,
+    )
+    return await service.similar_cases(case_id, search_params)
+
+@router.post("/similar", response_model=List[SimilarCases], response_model_exclude_none=True)
+async def get_similar_cases_batch(
+    request: SimilarCasesRequest,
+    session: AsyncSession = Depends(get_read_session),
+    username: str = Depends(get_current_username)
+):
+    """
+    Casos similares para varios IDs a la vez (listas precalculadas si están activas).
+    """
+    service = CaseService(session)
+    return await service.similar_cases_batch(request)
+
+@router.get("/{case_id}", response_model=DiagnosisCaseRead)
+async def get_case(
+    case_id: int,
+    session: AsyncSession = Depends(get_session),
+    username: str = Depends(get_current_username)
+):
+    """
+    Detalle completo de un caso (para abrir un resultado de búsqueda en modo 'summary').
     """
     service = CaseService(session)
-    results = await service.search_cases(search_data)
-    return results
\ No newline at end of file
+    return await service.get_case(case_id)
@@ -1,30 +1,85 @@
 import os
+import time
+import logging
+import random
 import asyncio
-from typing import List, Optional
-from openai import AsyncOpenAI, OpenAIError
+import httpx
+from collections import deque
+from typing import Dict, List, Optional
+from openai import APIConnectionError, APIStatusError, OpenAIError
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.core.embedding_cache import embedding_cache, make_key
+from app.core.embedding_batcher import EmbeddingBatcher
+from app.core.embedding_providers import EmbeddingProvider, get_embedding_provider
+from app.core.metrics import EMBEDDING_PROVIDER_SECONDS
+from app.models import EMBEDDING_DIMENSIONS
+
+# Micro-batching de get_embedding: ventana de espera y tamaño máximo del lote (0 ms = desactivado)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+
+# Presupuesto de latencia por llamada (incluye reintentos). Los lotes grandes
+# (bulk, backfill) tienen su propio presupuesto, más holgado.
+EMBEDDING_TIMEOUT_MS = float(os.getenv("EMBEDDING_TIMEOUT_MS", "2000"))
+EMBEDDING_BULK_TIMEOUT_MS = float(os.getenv("EMBEDDING_BULK_TIMEOUT_MS", "30000"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "1"))
+EMBEDDING_RETRY_BASE_MS = float(os.getenv("EMBEDDING_RETRY_BASE_MS", "100"))
+
+# Circuit breaker del proveedor
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("EMBEDDING_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("EMBEDDING_BREAKER_RECOVERY_SECONDS", "30"))
+
+# Hedging: si la respuesta tarda más que el p95 observado, se lanza una segunda
+# request idéntica y gana la primera que responda (solo proveedores remotos)
+EMBEDDING_HEDGE_ENABLED = os.getenv("EMBEDDING_HEDGE_ENABLED", "false").lower() == "true"
+EMBEDDING_HEDGE_DELAY_MS = float(os.getenv("EMBEDDING_HEDGE_DELAY_MS", "500"))  # Hasta tener muestras suficientes
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+logger = logging.getLogger(__name__)
 
 class AIClient:
     """
-    Adaptador para interactuar con proveedores de LLM (OpenRouter).
+    Adaptador para interactuar con proveedores de embeddings (OpenRouter, modelo local, hashing).
     Responsabilidad: Generar embeddings vectoriales para búsqueda semántica.
+    El proveedor se elige con EMBEDDING_PROVIDER (ver app/core/embedding_providers.py).
+
+    Se usa como singleton por proceso (get_ai_client): comparte el pool HTTP,
+    coalesce solicitudes idénticas en vuelo y agrupa las concurrentes en lotes.
     """
     
-    def __init__(self):
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        # Inicializamos el cliente asíncrono apuntando a OpenRouter
-        self.client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
-        # Modelo compatible con 1536 dimensiones (text-embedding-3-small)
-        # OpenRouter mapea esto al modelo adecuado de OpenAI
-        self.model = "text-embedding-3-small"
+    def __init__(self, provider: Optional[EmbeddingProvider] = None):
+        self.provider = provider or get_embedding_provider()
+        # El nombre del modelo forma parte de la clave de caché
+        self.model = self.provider.model
+
+        # Single-flight: una sola llamada upstream por texto idéntico en vuelo
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced_total = 0
+
+        self.breaker = CircuitBreaker("embeddings", BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_SECONDS)
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.timeouts_total = 0
+        self.retries_total = 0
+        self.hedges_total = 0
+        self.hedge_wins_total = 0
+
+        self.batcher: Optional[EmbeddingBatcher] = None
+        if EMBEDDING_BATCH_WINDOW_MS > 0:
+            self.batcher = EmbeddingBatcher(
+                self._call_provider, EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX_SIZE, _is_input_error
+            )
+
+    @property
+    def available(self) -> bool:
+        """False mientras el circuito está abierto: no vale la pena pedir un vector."""
+        return not self.breaker.is_open
 
     async def get_embedding(self, text: str) -> Optional[List[float]]:
         """
-        Genera un vector de 1536 dimensiones para el texto dado.
-        Implementa un patrón de resiliencia (Circuit Breaker simple):
-        Si falla, retorna None en lugar de romper la ejecución.
+        Genera un vector de EMBEDDING_DIMENSIONS dimensiones para el texto dado.
+        Resiliencia: presupuesto de latencia, reintentos con jitter y circuit breaker.
+        Si falla (o el circuito está abierto), retorna None en lugar de romper la ejecución.
         """
         if not text:
             return None
@@ -32,32 +87,264 @@ class AIClient:
         # Limpieza básica para mejorar la calidad del embedding
         cleaned_text = text.replace("\n", " ").strip()
 
+        # Consultas repetidas ("P0300", "ABS encendido") no pagan el round trip
+        cached = await embedding_cache.get(cleaned_text, self.model)
+        if cached is not None:
+            return cached
+
+        # Circuito abierto: el llamador cae al fallback sin pagar el timeout
+        if not self.available:
+            self.breaker.rejected_total += 1
+            return None
+
+        # Otra request ya está pidiendo este mismo texto: esperamos su resultado
+        key = make_key(cleaned_text, self.model)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced_total += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
         try:
-            # Llamada a la API externa
-            response = await self.client.embeddings.create(
-                input=[cleaned_text],
-                model=self.model
-            )
-            
-            # Extraer el vector (array de floats)
-            embedding = response.data[0].embedding
+            embedding = await self._fetch_embedding(cleaned_text)
+            future.set_result(embedding)
             return embedding
+        finally:
+            self._inflight.pop(key, None)
+            if not future.done():
+                future.set_result(None)
 
+    async def _fetch_embedding(self, cleaned_text: str) -> Optional[List[float]]:
+        try:
+            # Llamada al proveedor (agrupada con otras concurrentes si hay micro-batching)
+            if self.batcher is not None:
+                embedding = await self.batcher.submit(cleaned_text)
+            else:
+                embedding = (await self._call_provider([cleaned_text]))[0]
+            await embedding_cache.set(cleaned_text, self.model, embedding)
+            return embedding
+
+        except CircuitOpenError:
+            return None
+        except asyncio.TimeoutError:
+            logger.warning("⏱️  AI Timeout: sin respuesta en %.0f ms", EMBEDDING_TIMEOUT_MS)
+            return None
         except OpenAIError as e:
             # Loguear error pero NO detener la aplicación (Fallback Strategy)
-            print(f"⚠️  AI Error (OpenRouter): {str(e)}")
+            logger.warning("⚠️  AI Error (OpenRouter): %s", e)
             return None
         except Exception as e:
-            print(f"❌ Error inesperado en AIClient: {str(e)}")
+            logger.exception("❌ Error inesperado en AIClient: %s", e)
             return None
 
-# --- Bloque de Prueba Unitaria (Ejecutar directamente: python app/core/ai_client.py) ---
+    async def get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Versión por lotes de get_embedding: una sola llamada multi-input para
+        todos los textos que no estén en caché. El resultado conserva el orden
+        de entrada; si el proveedor falla, las posiciones pendientes quedan en None.
+        La caché se consulta y se escribe una sola vez por lote (no por texto).
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        cleaned = [text.replace("\n", " ").strip() if text else "" for text in texts]
+
+        candidates = [i for i, cleaned_text in enumerate(cleaned) if cleaned_text]
+        cached = await embedding_cache.get_many([cleaned[i] for i in candidates], self.model)
+        pending: List[int] = []
+        for i, vector in zip(candidates, cached):
+            if vector is not None:
+                results[i] = vector
+            else:
+                pending.append(i)
+
+        if not pending:
+            return results
+
+        try:
+            vectors = await self._call_provider([cleaned[i] for i in pending], EMBEDDING_BULK_TIMEOUT_MS)
+            for i, vector in zip(pending, vectors):
+                results[i] = vector
+            await embedding_cache.set_many([(cleaned[i], results[i]) for i in pending], self.model)
+
+        except CircuitOpenError:
+            logger.warning("🔌 Circuito abierto: lote de %d queda sin vector", len(pending))
+        except asyncio.TimeoutError:
+            logger.warning("⏱️  AI Timeout (lote de %d): sin respuesta en %.0f ms", len(pending), EMBEDDING_BULK_TIMEOUT_MS)
+        except OpenAIError as e:
+            logger.warning("⚠️  AI Error (OpenRouter, lote de %d): %s", len(pending), e)
+        except Exception as e:
+            logger.exception("❌ Error inesperado en AIClient (lote): %s", e)
+
+        return results
+
+    # --- Resiliencia ---
+    async def _call_provider(self, texts: List[str], budget_ms: Optional[float] = None) -> List[List[float]]:
+        """
+        Llamada al proveedor dentro de un presupuesto de latencia estricto.
+        Reintenta errores transitorios con backoff exponencial + jitter mientras
+        quede presupuesto. Al circuit breaker solo llegan los fallos del
+        proveedor (401/403, 429, 5xx, timeouts y red): un 400/413/422 es culpa
+        del texto de un llamador y no debe abrir el circuito para todos.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Circuito de embeddings abierto")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (budget_ms or EMBEDDING_TIMEOUT_MS) / 1000
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                vectors = await asyncio.wait_for(self._hedged_embed(texts), timeout=deadline - loop.time())
+            except asyncio.CancelledError:
+                # Cancelada desde afuera (cliente desconectado): no es un fallo del
+                # proveedor, pero si era la prueba de half_open hay que liberar el cupo
+                self.breaker.release()
+                raise
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                EMBEDDING_PROVIDER_SECONDS.labels(outcome="timeout" if timed_out else "error").observe(
+                    time.perf_counter() - start
+                )
+                if timed_out:
+                    self.timeouts_total += 1
+                if _is_provider_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    # El proveedor respondió: sin veredicto (libera el cupo de half_open)
+                    self.breaker.release()
+                if not _is_retryable(e):
+                    raise
+
+                attempt += 1
+                backoff = random.uniform(0, EMBEDDING_RETRY_BASE_MS * 2 ** attempt) / 1000
+                if attempt > EMBEDDING_MAX_RETRIES or loop.time() + backoff >= deadline:
+                    raise
+                await asyncio.sleep(backoff)
+                if not self.breaker.allow_request():
+                    raise
+                self.retries_total += 1
+                continue
+
+            elapsed = time.perf_counter() - start
+            self._latencies.append(elapsed)
+            EMBEDDING_PROVIDER_SECONDS.labels(outcome="ok").observe(elapsed)
+            self.breaker.record_success()
+            return vectors
+
+    async def _hedged_embed(self, texts: List[str]) -> List[List[float]]:
+        if not (EMBEDDING_HEDGE_ENABLED and self.provider.remote):
+            return await self.provider.embed(texts)
+
+        tasks = [asyncio.ensure_future(self.provider.embed(texts))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+            if not done:
+                # La primera request va lenta (cola del proveedor): lanzamos otra
+                self.hedges_total += 1
+                tasks.append(asyncio.ensure_future(self.provider.embed(texts)))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins_total += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _hedge_delay(self) -> float:
+        """p95 de las latencias recientes (o el valor configurado si aún no hay muestras)."""
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return EMBEDDING_HEDGE_DELAY_MS / 1000
+        return _percentile(self._latencies, 0.95)
+
+    def stats(self) -> dict:
+        return {
+            "provider": type(self.provider).__name__,
+            "model": self.model,
+            "inflight": len(self._inflight),
+            "coalesced_total": self.coalesced_total,
+            "batcher": self.batcher.stats() if self.batcher else None,
+            "breaker": self.breaker.stats(),
+            "latency_p50_ms": round(_percentile(self._latencies, 0.50) * 1000, 1) if self._latencies else None,
+            "latency_p95_ms": round(_percentile(self._latencies, 0.95) * 1000, 1) if self._latencies else None,
+            "timeouts_total": self.timeouts_total,
+            "retries_total": self.retries_total,
+            "hedges_total": self.hedges_total,
+            "hedge_wins_total": self.hedge_wins_total,
+        }
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Timeouts, errores de red, 429 y 5xx son transitorios; un 4xx no mejora reintentando."""
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return not isinstance(error, (CircuitOpenError, ValueError))
+
+
+def _is_provider_failure(error: Exception) -> bool:
+    """
+    Fallos que hablan de la salud del proveedor: credenciales (401/403), 429,
+    5xx, timeouts y errores de conexión. Un 400/413/422 ("input too long")
+    depende del texto enviado, no del proveedor.
+    """
+    if isinstance(error, APIStatusError):
+        return error.status_code in (401, 403, 429) or error.status_code >= 500
+    return isinstance(error, (asyncio.TimeoutError, APIConnectionError, httpx.TransportError, ConnectionError))
+
+
+def _is_input_error(error: Exception) -> bool:
+    """4xx causado por el texto enviado (400/413/422...), no por credenciales ni cuota."""
+    return isinstance(error, APIStatusError) and 400 <= error.status_code < 500 and error.status_code not in (401, 403, 429)
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+# --- Singleton por proceso (creado en el lifespan de app/main.py) ---
+_ai_client: Optional[AIClient] = None
+
+
+def get_ai_client() -> AIClient:
+    """Cliente compartido: un pool HTTP y un batcher para todo el proceso."""
+    global _ai_client
+    if _ai_client is None:
+        _ai_client = AIClient()
+    return _ai_client
+
+
+def current_ai_client() -> Optional[AIClient]:
+    """El singleton si ya fue creado (sin crearlo): para métricas y diagnóstico."""
+    return _ai_client
+
+
+async def close_ai_client() -> None:
+    global _ai_client
+    if _ai_client is not None:
+        await _ai_client.aclose()
+        _ai_client = None
+
+# --- Bloque de Prueba Unitaria (Ejecutar desde backend/: python -m app.core.ai_client) ---
 if __name__ == "__main__":
     async def test_connection():
-        print("🔄 Probando conexión con OpenRouter...")
+        from app.core.embedding_providers import EMBEDDING_PROVIDER
+        print(f"🔄 Probando proveedor de embeddings '{EMBEDDING_PROVIDER}'...")
         
-        # Verificamos que la KEY exista antes de probar
-        if not os.getenv("OPENROUTER_API_KEY"):
+        # Verificamos que la KEY exista antes de probar (solo proveedor remoto)
+        if EMBEDDING_PROVIDER == "openrouter" and not os.getenv("OPENROUTER_API_KEY"):
             print("❌ ERROR: Variable OPENROUTER_API_KEY no definida.")
             return
 
@@ -71,8 +358,8 @@ if __name__ == "__main__":
             print(f"📊 Dimensiones: {len(vector)}")
             print(f"🔍 Muestra: {vector[:5]}...")
             
-            if len(vector) == 1536:
-                print("🎯 Validación de dimensiones: CORRECTA (1536)")
+            if len(vector) == EMBEDDING_DIMENSIONS:
+                print(f"🎯 Validación de dimensiones: CORRECTA ({EMBEDDING_DIMENSIONS})")
             else:
                 print(f"⚠️  ADVERTENCIA: Dimensiones incorrectas ({len(vector)})")
         else:
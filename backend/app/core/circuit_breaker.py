@@ -0,0 +1,104 @@
+import time
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la llamada se rechaza sin tocar el proveedor."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico de tres estados:
+
+    - closed: las llamadas pasan; N fallos consecutivos abren el circuito.
+    - open: se rechaza todo (sin pagar timeouts) durante recovery_seconds.
+    - half_open: pasan hasta half_open_max_calls llamadas de prueba; un éxito
+      cierra el circuito y un fallo lo vuelve a abrir.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._half_open_calls = 0
+
+        # Métricas
+        self.transitions: Dict[str, int] = {}
+        self.successes_total = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                self.rejected_total += 1
+                return False
+            self._transition(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected_total += 1
+                return False
+            self._half_open_calls += 1
+        return True
+
+    def record_success(self) -> None:
+        self.successes_total += 1
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures_total += 1
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """
+        Libera el cupo de una llamada de prueba sin veredicto (p. ej. cancelada
+        porque el cliente se desconectó): si no, half_open quedaría sin cupos.
+        """
+        if self.state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    @property
+    def is_open(self) -> bool:
+        """Abierto y todavía dentro del periodo de enfriamiento."""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.recovery_seconds
+
+    def _transition(self, new_state: str) -> None:
+        key = f"{self.state}->{new_state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning("🔌 Circuit breaker '%s': %s -> %s", self.name, self.state, new_state)
+
+        self.state = new_state
+        self._half_open_calls = 0
+        if new_state == self.OPEN:
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_seconds": self.recovery_seconds,
+            "transitions": dict(self.transitions),
+            "successes_total": self.successes_total,
+            "failures_total": self.failures_total,
+            "rejected_total": self.rejected_total,
+        }
@@ -1,22 +1,164 @@
+import os
+import time
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import SQLModel
-import os
+from app.core.metrics import DB_POOL_WAIT_SECONDS
+from app.core.vector_index import search_server_settings
 
 # Leemos la URL y validamos
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL is None:
     raise ValueError("FATAL: La variable de entorno DATABASE_URL no está definida.")
 
-# Creamos el motor asíncrono
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+# Réplica de lectura opcional: la búsqueda va a la réplica, las escrituras al primario
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+# --- CONFIGURACIÓN DEL POOL (por worker de uvicorn) ---
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"  # Loguea cada SQL: solo para desarrollo
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))       # Segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))       # Renueva conexiones viejas (LB / firewalls)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # asyncpg (0 con pgbouncer en modo transaction)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))  # Corta queries desbocadas en el servidor
+
+
+class PoolMetrics:
+    """
+    Espera por conexión y saturación de cada pool. Sin esto, bajo ráfagas
+    las requests hacen cola en el pool sin que nada lo muestre.
+    """
+
+    def __init__(self):
+        # Engines, no pools: dispose()/recreate() cambian engine.pool por uno nuevo
+        self.engines: dict = {}
+        self.waits: dict = {}
+
+    def register(self, name: str, engine) -> None:
+        self.engines[name] = engine
+        self.waits[name] = {"checkouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "timeouts": 0}
+
+    def observe_wait(self, name: str, seconds: float, timed_out: bool = False) -> None:
+        stats = self.waits.get(name)
+        if stats is None:
+            return
+        DB_POOL_WAIT_SECONDS.labels(pool=name).observe(seconds)
+        stats["checkouts"] += 1
+        stats["wait_seconds_total"] += seconds
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], seconds)
+        if timed_out:
+            stats["timeouts"] += 1
+
+    def snapshot(self) -> dict:
+        result = {}
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            waits = self.waits[name]
+            capacity = pool.size() + DB_MAX_OVERFLOW
+            checked_out = pool.checkedout()
+            result[name] = {
+                "size": pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "checked_out": checked_out,
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "saturation": round(checked_out / capacity, 4) if capacity else 0.0,
+                "checkouts": waits["checkouts"],
+                "wait_seconds_avg": round(waits["wait_seconds_total"] / waits["checkouts"], 6) if waits["checkouts"] else 0.0,
+                "wait_seconds_max": round(waits["wait_seconds_max"], 6),
+                "timeouts": waits["timeouts"],
+            }
+        return result
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Pool estándar que mide cuánto espera cada checkout (incluye abrir conexión nueva)."""
+    metrics_name = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.observe_wait(self.metrics_name, time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe_wait(self.metrics_name, time.perf_counter() - start)
+        return connection
+
+
+def _pool_class(name: str) -> type:
+    """
+    Subclase con el nombre del pool como atributo de clase: recreate() (p. ej.
+    en engine.dispose()) instancia self.__class__ y el nombre se conserva.
+    """
+    return type(f"InstrumentedQueuePool_{name}", (InstrumentedQueuePool,), {"metrics_name": name})
+
+
+def _create_engine(url: str, name: str):
+    connect_args = {}
+    if "asyncpg" in url:
+        connect_args = {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {
+                "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+                "application_name": f"vw-kb-backend-{name}",
+                # ef_search / escaneo iterativo por defecto: sin SET por búsqueda
+                **search_server_settings(),
+            },
+        }
+
+    new_engine = create_async_engine(
+        url,
+        echo=DB_ECHO,
+        future=True,
+        # Cada pool reporta con su propio nombre ('primary' / 'replica')
+        poolclass=_pool_class(name),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    pool_metrics.register(name, new_engine.sync_engine)
+    return new_engine
+
+
+# Creamos el motor asíncrono (primario: lecturas y escrituras)
+engine = _create_engine(DATABASE_URL, "primary")
+
+# Motor de solo lectura (si no hay réplica configurada, es el mismo primario)
+read_engine = _create_engine(DATABASE_READ_URL, "replica") if DATABASE_READ_URL else engine
 
 # Creamos la fábrica de sesiones
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Sesiones para consultas de solo lectura (búsqueda). Ojo: la réplica puede ir
+# unos instantes detrás del primario.
+async_read_session = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
 # Dependencia para inyectar la sesión en los endpoints
 async def get_session() -> AsyncSession:
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+# Dependencia para endpoints de solo lectura (enrutados a la réplica si existe)
+async def get_read_session() -> AsyncSession:
+    async with async_read_session() as session:
+        yield session
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
@@ -0,0 +1,94 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+ErrorPredicate = Callable[[Exception], bool]
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching: las solicitudes de embedding que llegan dentro de una
+    ventana corta (pocos ms) se agrupan en una sola llamada multi-input al
+    proveedor. Cada solicitante recibe su vector o la excepción del lote.
+
+    Si el lote falla por un texto concreto (is_input_error, p. ej. un 400 por
+    "input too long"), se divide en mitades hasta aislarlo: solo su
+    solicitante recibe el error y el resto obtiene su vector.
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFn,
+        window_ms: float,
+        max_batch_size: int,
+        is_input_error: Optional[ErrorPredicate] = None,
+    ):
+        # Normalmente AIClient._call_provider (timeouts, reintentos y circuit breaker)
+        self.embed = embed
+        self.is_input_error = is_input_error
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Métricas
+        self.batches_total = 0
+        self.items_total = 0
+        self.splits_total = 0
+
+    async def submit(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.batches_total += 1
+        self.items_total += len(batch)
+        try:
+            vectors = await self.embed([text for text, _ in batch])
+        except Exception as e:
+            if len(batch) > 1 and self.is_input_error is not None and self.is_input_error(e):
+                # Un texto rechazado no debe arrastrar a los demás solicitantes
+                self.splits_total += 1
+                middle = len(batch) // 2
+                await asyncio.gather(self._run(batch[:middle]), self._run(batch[middle:]))
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            # El solicitante pudo haber cancelado (p.ej. cliente desconectado)
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window_seconds * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "splits_total": self.splits_total,
+            "avg_batch_size": round(self.items_total / self.batches_total, 2) if self.batches_total else 0.0,
+        }
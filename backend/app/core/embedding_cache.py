@@ -0,0 +1,237 @@
+import os
+import logging
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select, func, delete
+from sqlalchemy.dialects.postgresql import insert
+from app.core.cache import LRUTTLCache
+
+# --- CONFIGURACIÓN ---
+# Tier 1: LRU en memoria (por proceso / worker de uvicorn)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+
+# Tier 2: tabla embedding_cache en Postgres (sobrevive reinicios, compartida entre workers)
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "false").lower() == "true"
+EMBEDDING_CACHE_DB_TTL_DAYS = int(os.getenv("EMBEDDING_CACHE_DB_TTL_DAYS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalización para la clave de caché: Unicode NFC, espacios colapsados
+    y sin distinción de mayúsculas ("p0300 " y "P0300" comparten entrada).
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split()).casefold()
+
+
+def make_key(text: str, model: str) -> str:
+    """Clave content-addressed: sha256(modelo + texto normalizado)."""
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché de embeddings en dos niveles delante de AIClient.get_embedding.
+    Ningún fallo de la caché debe romper la generación de embeddings:
+    ante errores de DB se comporta como un miss.
+    """
+
+    def __init__(self):
+        self.memory = LRUTTLCache(EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_TTL_SECONDS)
+        self.persistent = EMBEDDING_CACHE_PERSISTENT
+
+        # Contadores del tier persistente
+        self.db_hits = 0
+        self.db_misses = 0
+        self.db_writes = 0
+        self.db_errors = 0
+
+    async def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = make_key(text, model)
+
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        if not self.persistent:
+            return None
+
+        vector = await self._db_get(key)
+        if vector is not None:
+            # Promover al tier en memoria
+            self.memory.set(key, vector)
+        return vector
+
+    async def set(self, text: str, model: str, embedding: List[float]) -> None:
+        key = make_key(text, model)
+        self.memory.set(key, embedding)
+
+        if self.persistent:
+            await self._db_set(key, model, embedding)
+
+    async def get_many(self, texts: Sequence[str], model: str) -> List[Optional[List[float]]]:
+        """
+        Versión por lotes de get (bulk, backfill): los misses del tier en
+        memoria se resuelven con una sola consulta a la DB, no una por texto.
+        """
+        keys = [make_key(text, model) for text in texts]
+        results: List[Optional[List[float]]] = [self.memory.get(key) for key in keys]
+
+        missing = {key for key, vector in zip(keys, results) if vector is None}
+        if not missing or not self.persistent:
+            return results
+
+        found = await self._db_get_many(list(missing))
+        for position, key in enumerate(keys):
+            if results[position] is None and key in found:
+                results[position] = found[key]
+        for key, vector in found.items():
+            self.memory.set(key, vector)
+        return results
+
+    async def set_many(self, items: Sequence[Tuple[str, List[float]]], model: str) -> None:
+        """Versión por lotes de set: un único upsert multi-fila en el tier persistente."""
+        entries: Dict[str, List[float]] = {}
+        for text, embedding in items:
+            key = make_key(text, model)
+            self.memory.set(key, embedding)
+            # ON CONFLICT no admite dos filas con la misma clave en un mismo INSERT
+            entries[key] = embedding
+
+        if self.persistent and entries:
+            await self._db_set_many(entries, model)
+
+    async def _db_get(self, key: str) -> Optional[List[float]]:
+        # Import diferido: el cliente de IA se puede usar sin DATABASE_URL (p.ej. pruebas manuales)
+        from app.core.database import async_session
+        from app.models import EmbeddingCacheEntry
+
+        min_created_at = datetime.utcnow() - timedelta(days=EMBEDDING_CACHE_DB_TTL_DAYS)
+        try:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(EmbeddingCacheEntry.embedding).where(
+                        EmbeddingCacheEntry.key == key,
+                        EmbeddingCacheEntry.created_at >= min_created_at,
+                    )
+                )
+                embedding = result.scalar_one_or_none()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning("⚠️  Embedding cache (DB) no disponible: %s", e)
+            return None
+
+        if embedding is None:
+            self.db_misses += 1
+            return None
+
+        self.db_hits += 1
+        # pgvector devuelve numpy arrays
+        return embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+
+    async def _db_get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        from app.core.database import async_session
+        from app.models import EmbeddingCacheEntry
+
+        min_created_at = datetime.utcnow() - timedelta(days=EMBEDDING_CACHE_DB_TTL_DAYS)
+        try:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(EmbeddingCacheEntry.key, EmbeddingCacheEntry.embedding).where(
+                        EmbeddingCacheEntry.key.in_(keys),
+                        EmbeddingCacheEntry.created_at >= min_created_at,
+                    )
+                )
+                rows = result.all()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning("⚠️  Embedding cache (DB) no disponible: %s", e)
+            return {}
+
+        found = {
+            key: embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+            for key, embedding in rows
+        }
+        self.db_hits += len(found)
+        self.db_misses += len(keys) - len(found)
+        return found
+
+    async def _db_set(self, key: str, model: str, embedding: List[float]) -> None:
+        await self._db_set_many({key: embedding}, model)
+
+    async def _db_set_many(self, entries: Dict[str, List[float]], model: str) -> None:
+        from app.core.database import async_session
+        from app.models import EmbeddingCacheEntry
+
+        created_at = datetime.utcnow()
+        statement = insert(EmbeddingCacheEntry).values([
+            {"key": key, "model": model, "embedding": embedding, "created_at": created_at}
+            for key, embedding in entries.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[EmbeddingCacheEntry.key],
+            set_={"embedding": statement.excluded.embedding, "created_at": statement.excluded.created_at},
+        )
+        try:
+            async with async_session() as session:
+                await session.execute(statement)
+                await session.commit()
+            self.db_writes += len(entries)
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning("⚠️  No se pudo persistir el embedding en caché: %s", e)
+
+    async def prune(self) -> dict:
+        """Vacía el tier en memoria y elimina de la DB las entradas expiradas."""
+        self.memory.clear()
+        deleted = 0
+
+        if self.persistent:
+            from app.core.database import async_session
+            from app.models import EmbeddingCacheEntry
+
+            min_created_at = datetime.utcnow() - timedelta(days=EMBEDDING_CACHE_DB_TTL_DAYS)
+            async with async_session() as session:
+                result = await session.execute(
+                    delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.created_at < min_created_at)
+                )
+                await session.commit()
+                deleted = result.rowcount
+        return {"memory_cleared": True, "db_expired_deleted": deleted}
+
+    async def stats(self) -> dict:
+        stats = {"memory": self.memory.stats(), "persistent": {"enabled": self.persistent}}
+
+        if self.persistent:
+            from app.core.database import async_session
+            from app.models import EmbeddingCacheEntry
+
+            db_size = None
+            try:
+                async with async_session() as session:
+                    result = await session.execute(select(func.count()).select_from(EmbeddingCacheEntry))
+                    db_size = result.scalar_one()
+            except Exception as e:
+                self.db_errors += 1
+                logger.warning("⚠️  No se pudo contar la caché persistente: %s", e)
+
+            lookups = self.db_hits + self.db_misses
+            stats["persistent"].update({
+                "size": db_size,
+                "ttl_days": EMBEDDING_CACHE_DB_TTL_DAYS,
+                "hits": self.db_hits,
+                "misses": self.db_misses,
+                "hit_rate": round(self.db_hits / lookups, 4) if lookups else 0.0,
+                "writes": self.db_writes,
+                "errors": self.db_errors,
+            })
+        return stats
+
+
+# Instancia única por proceso (compartida por todas las requests)
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,190 @@
+import os
+import re
+import math
+import asyncio
+import hashlib
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List
+import httpx
+from openai import AsyncOpenAI
+from app.models import EMBEDDING_DIMENSIONS
+
+# --- CONFIGURACIÓN ---
+# 'openrouter' (remoto), 'local' (sentence-transformers en CPU) o 'hashing' (determinista, offline/pruebas)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openrouter").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Proveedor local: modelo multilingüe (los casos están en español) y backend de inferencia
+EMBEDDING_LOCAL_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_LOCAL_BACKEND = os.getenv("EMBEDDING_LOCAL_BACKEND", "torch")  # 'torch' u 'onnx'
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "2"))
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "32"))
+
+# Pool HTTP compartido hacia el proveedor remoto (keep-alive: sin handshake TLS por request)
+EMBEDDING_HTTP_MAX_CONNECTIONS = int(os.getenv("EMBEDDING_HTTP_MAX_CONNECTIONS", "20"))
+EMBEDDING_HTTP_KEEPALIVE_SECONDS = float(os.getenv("EMBEDDING_HTTP_KEEPALIVE_SECONDS", "120"))
+
+# La inferencia en CPU corre aquí para no bloquear el event loop
+_executor = ThreadPoolExecutor(max_workers=EMBEDDING_LOCAL_THREADS, thread_name_prefix="embeddings")
+
+
+def fit_dimensions(vector: List[float], dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """
+    Adapta un vector a la dimensión de la columna Vector(EMBEDDING_DIMENSIONS).
+    Rellenar con ceros no altera la similitud coseno entre vectores del mismo modelo.
+    """
+    if len(vector) > dimensions:
+        raise ValueError(f"El modelo produce {len(vector)} dimensiones y la columna admite {dimensions}")
+    if len(vector) < dimensions:
+        return list(vector) + [0.0] * (dimensions - len(vector))
+    return list(vector)
+
+
+class EmbeddingProvider:
+    """
+    Contrato de un proveedor de embeddings: recibe textos ya limpios y
+    devuelve un vector por texto en el mismo orden. Ante un fallo LANZA la
+    excepción; la política de resiliencia (None, caché, fallback) vive en AIClient.
+    """
+    model: str = ""
+    remote: bool = False
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Libera recursos (conexiones HTTP, etc.) al apagar la aplicación."""
+
+
+class OpenRouterEmbeddingProvider(EmbeddingProvider):
+    """Embeddings remotos vía OpenRouter (API compatible con OpenAI)."""
+    remote = True
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        # Pool HTTP propio y afinado: conexiones reutilizadas entre requests,
+        # HTTP/2 si el paquete 'h2' está instalado (pip install httpx[http2])
+        self.http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=EMBEDDING_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=EMBEDDING_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=EMBEDDING_HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+        # Inicializamos el cliente asíncrono apuntando a OpenRouter
+        self.client = AsyncOpenAI(
+            base_url="https://openrouter.ai/api/v1",
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            http_client=self.http_client,
+            # Reintentos y timeouts los gestiona AIClient (presupuesto de latencia + circuit breaker)
+            max_retries=0,
+        )
+        # Modelo compatible con 1536 dimensiones (text-embedding-3-small)
+        # OpenRouter mapea esto al modelo adecuado de OpenAI
+        self.model = model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        response = await self.client.embeddings.create(input=texts, model=self.model)
+        # La API devuelve 'index' por item; no asumimos el orden
+        vectors: List[List[float]] = [[] for _ in texts]
+        for item in response.data:
+            vectors[item.index] = item.embedding
+        return vectors
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """
+    Modelo local en CPU (sentence-transformers, opcionalmente con backend ONNX).
+    Dependencia opcional: pip install sentence-transformers (y 'optimum[onnxruntime]' para ONNX).
+    Funciona sin red una vez descargado el modelo (modo offline de talleres).
+    """
+
+    def __init__(self, model: str = EMBEDDING_LOCAL_MODEL, backend: str = EMBEDDING_LOCAL_BACKEND):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_PROVIDER=local requiere 'sentence-transformers' (pip install sentence-transformers)"
+            ) from e
+
+        kwargs = {"backend": backend} if backend != "torch" else {}
+        self._model = SentenceTransformer(model, device="cpu", **kwargs)
+        self.model = f"local:{model}"
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts, batch_size=EMBEDDING_LOCAL_BATCH_SIZE, normalize_embeddings=True, show_progress_bar=False
+        )
+        return [fit_dimensions(vector.tolist()) for vector in vectors]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, self._encode, texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Vectorizador determinista por feature hashing (palabras + trigramas de
+    caracteres, sin acentos). Sin dependencias ni red: pensado para pruebas,
+    benchmarks y como último recurso offline. Captura coincidencias léxicas,
+    no semánticas.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    def _features(self, text: str) -> List[str]:
+        # Minúsculas y sin acentos: "Eléctrico" == "electrico"
+        decomposed = unicodedata.normalize("NFKD", text.casefold())
+        plain = "".join(c for c in decomposed if not unicodedata.combining(c))
+        words = re.findall(r"\w+", plain)
+        trigrams = [f"#{w[i:i + 3]}" for w in words if len(w) > 3 for i in range(len(w) - 2)]
+        return words + trigrams
+
+    def _encode_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dimensions] += sign
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        return [self._encode_one(text) for text in texts]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 1:
+            # Un solo texto cuesta menos que el salto al thread pool
+            return self._encode(texts)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, self._encode, texts)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_provider() -> EmbeddingProvider:
+    """Proveedor configurado por EMBEDDING_PROVIDER (uno por proceso: cargar un modelo es caro)."""
+    if EMBEDDING_PROVIDER == "openrouter":
+        return OpenRouterEmbeddingProvider()
+    if EMBEDDING_PROVIDER == "local":
+        return SentenceTransformerEmbeddingProvider()
+    if EMBEDDING_PROVIDER == "hashing":
+        return HashingEmbeddingProvider()
+    raise ValueError(
+        f"FATAL: EMBEDDING_PROVIDER inválido: '{EMBEDDING_PROVIDER}' (usar 'openrouter', 'local' o 'hashing')."
+    )
@@ -0,0 +1,64 @@
+import os
+import sys
+import queue
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# --- CONFIGURACIÓN ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv(
+    "LOG_FORMAT",
+    "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s",
+)
+
+# Request en curso (lo fija el middleware de app/core/metrics.py). Las tareas
+# de asyncio heredan el contexto: las piernas de la búsqueda híbrida y el
+# batcher de embeddings loguean con el id de la request que las originó.
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """Agrega record.request_id. Corre en el hilo que loguea (antes de encolar)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> None:
+    """
+    Logging no bloqueante: los módulos solo encolan el registro (QueueHandler)
+    y un hilo aparte (QueueListener) formatea y escribe a stdout. Un print()
+    o un StreamHandler directo escriben de forma síncrona desde el event loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola de logs pendientes (llamar al final del shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,233 @@
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.core.logging_config import request_id_var
+
+# Buckets en segundos: de 1 ms (caché / pool libre) a 10 s (presupuestos de la IA)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "vwkb_http_request_duration_seconds",
+    "Latencia de las requests HTTP por ruta (plantilla, no la URL concreta)",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# --- BÚSQUEDA ---
+SEARCH_STAGE_SECONDS = Histogram(
+    "vwkb_search_stage_duration_seconds",
+    "Tiempo por etapa de la búsqueda: embedding, db_query, hydration, snippets, serialization",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+SEARCH_PATH_TOTAL = Counter(
+    "vwkb_search_path_total",
+    "Búsquedas por estrategia efectiva (vector, lexical_fallback, hybrid, ...)",
+    ["path"],
+)
+
+# --- DEDUPLICACIÓN ---
+DEDUP_TOTAL = Counter(
+    "vwkb_dedup_total",
+    "Casi duplicados detectados por acción (reject, merge, variant, job_variant)",
+    ["action"],
+)
+
+# --- PROVEEDOR DE EMBEDDINGS ---
+EMBEDDING_PROVIDER_SECONDS = Histogram(
+    "vwkb_embedding_provider_duration_seconds",
+    "Latencia de cada intento contra el proveedor de embeddings",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# --- POOL DE CONEXIONES ---
+DB_POOL_WAIT_SECONDS = Histogram(
+    "vwkb_db_pool_wait_seconds",
+    "Espera por una conexión del pool (incluye abrir una conexión nueva)",
+    ["pool"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """Cronometra una etapa de la búsqueda (también si termina con error)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SEARCH_STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Cuerpo y content-type del endpoint /metrics (formato de exposición de Prometheus)."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI puro (sin el costo de BaseHTTPMiddleware):
+    - toma X-Request-ID del proxy o genera uno, lo deja en request_id_var
+      para los logs y lo devuelve en la respuesta;
+    - mide la latencia de cada request por ruta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode("latin-1"):
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            # Plantilla de la ruta ('/api/cases/{case_id}'): la URL concreta dispararía la cardinalidad
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope["method"], route=route_path, status=str(status_code)
+            ).observe(time.perf_counter() - start)
+            request_id_var.reset(token)
+
+
+class RuntimeStatsCollector:
+    """
+    Exporta en cada scrape los contadores que ya llevan los componentes
+    (pool, circuit breaker, batcher, cachés) en lugar de duplicarlos:
+    leerlos solo cuando Prometheus pregunta no cuesta nada en el camino caliente.
+    """
+
+    BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, pool_metrics, get_ai_client: Callable[[], Optional[object]], search_cache, embedding_cache):
+        self.pool_metrics = pool_metrics
+        self.get_ai_client = get_ai_client
+        self.search_cache = search_cache
+        self.embedding_cache = embedding_cache
+
+    def collect(self):
+        yield from self._pool_metrics()
+        yield from self._ai_client_metrics()
+        yield from self._cache_metrics()
+
+    def _pool_metrics(self):
+        connections = GaugeMetricFamily(
+            "vwkb_db_pool_connections", "Conexiones del pool por estado", labels=["pool", "state"]
+        )
+        saturation = GaugeMetricFamily(
+            "vwkb_db_pool_saturation", "Conexiones en uso / capacidad (pool_size + max_overflow)", labels=["pool"]
+        )
+        timeouts = CounterMetricFamily(
+            "vwkb_db_pool_timeouts", "Checkouts que agotaron DB_POOL_TIMEOUT", labels=["pool"]
+        )
+        for name, stats in self.pool_metrics.snapshot().items():
+            for state in ("checked_out", "idle", "overflow"):
+                connections.add_metric([name, state], stats[state])
+            saturation.add_metric([name], stats["saturation"])
+            timeouts.add_metric([name], stats["timeouts"])
+        yield from (connections, saturation, timeouts)
+
+    def _ai_client_metrics(self):
+        client = self.get_ai_client()
+        if client is None:
+            return
+
+        breaker = client.breaker
+        state = GaugeMetricFamily(
+            "vwkb_circuit_breaker_state", "Estado del circuito (0 closed, 1 half_open, 2 open)", labels=["breaker"]
+        )
+        state.add_metric([breaker.name], self.BREAKER_STATES.get(breaker.state, -1))
+        transitions = CounterMetricFamily(
+            "vwkb_circuit_breaker_transitions", "Transiciones de estado del circuito", labels=["breaker", "transition"]
+        )
+        for transition, count in breaker.transitions.items():
+            transitions.add_metric([breaker.name, transition], count)
+        rejected = CounterMetricFamily(
+            "vwkb_circuit_breaker_rejected", "Llamadas rechazadas con el circuito abierto", labels=["breaker"]
+        )
+        rejected.add_metric([breaker.name], breaker.rejected_total)
+        yield from (state, transitions, rejected)
+
+        events = CounterMetricFamily(
+            "vwkb_embedding_events", "Eventos de resiliencia del cliente de embeddings", labels=["event"]
+        )
+        events.add_metric(["coalesced"], client.coalesced_total)
+        events.add_metric(["timeout"], client.timeouts_total)
+        events.add_metric(["retry"], client.retries_total)
+        events.add_metric(["hedge"], client.hedges_total)
+        events.add_metric(["hedge_win"], client.hedge_wins_total)
+        yield events
+
+        inflight = GaugeMetricFamily("vwkb_embedding_inflight", "Textos distintos esperando al proveedor")
+        inflight.add_metric([], len(client._inflight))
+        yield inflight
+
+        if client.batcher is not None:
+            batches = CounterMetricFamily("vwkb_embedding_batches", "Lotes enviados por el micro-batcher")
+            batches.add_metric([], client.batcher.batches_total)
+            items = CounterMetricFamily("vwkb_embedding_batch_items", "Textos enviados por el micro-batcher")
+            items.add_metric([], client.batcher.items_total)
+            splits = CounterMetricFamily(
+                "vwkb_embedding_batch_splits", "Lotes divididos porque el proveedor rechazó un texto (4xx)"
+            )
+            splits.add_metric([], client.batcher.splits_total)
+            yield from (batches, items, splits)
+
+    def _cache_metrics(self):
+        lookups = CounterMetricFamily(
+            "vwkb_cache_lookups", "Consultas a las cachés por resultado", labels=["cache", "result"]
+        )
+        size = GaugeMetricFamily("vwkb_cache_entries", "Entradas en las cachés en memoria", labels=["cache"])
+
+        memory = self.embedding_cache.memory
+        lookups.add_metric(["embedding_memory", "hit"], memory.hits)
+        lookups.add_metric(["embedding_memory", "miss"], memory.misses)
+        size.add_metric(["embedding_memory"], len(memory))
+        if self.embedding_cache.persistent:
+            lookups.add_metric(["embedding_db", "hit"], self.embedding_cache.db_hits)
+            lookups.add_metric(["embedding_db", "miss"], self.embedding_cache.db_misses)
+
+        if self.search_cache.enabled:
+            backend_stats = self.search_cache.backend.stats()
+            lookups.add_metric(["search", "hit"], backend_stats["hits"])
+            lookups.add_metric(["search", "miss"], backend_stats["misses"])
+            if "size" in backend_stats:
+                size.add_metric(["search"], backend_stats["size"])
+            invalidations = CounterMetricFamily(
+                "vwkb_search_cache_invalidations", "Invalidaciones (cambios de generación) de la caché de búsqueda"
+            )
+            invalidations.add_metric([], self.search_cache.invalidations)
+            yield invalidations
+
+        yield from (lookups, size)
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import logging
+import hashlib
+from typing import Optional, Tuple
+from app.core.cache import LRUTTLCache
+from app.core.embedding_cache import normalize_text
+from app.models import SearchPage, SearchRequest
+
+# --- CONFIGURACIÓN ---
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+
+# 'memory': por proceso. 'redis': compartida entre workers/réplicas del backend,
+# incluida la generación (una escritura en un worker invalida a todos).
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory").lower()
+SEARCH_CACHE_REDIS_URL = os.getenv("SEARCH_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Con réplica de lectura (DATABASE_READ_URL) la búsqueda puede leer datos
+# anteriores a la última escritura: durante este lapso tras cada invalidate()
+# no se cachea, para no guardar una página vieja bajo la generación nueva.
+# Debe cubrir el retraso máximo de replicación esperado.
+SEARCH_CACHE_REPLICA_LAG_SECONDS = float(os.getenv("SEARCH_CACHE_REPLICA_LAG_SECONDS", "5"))
+REPLICA_CONFIGURED = bool(os.getenv("DATABASE_READ_URL"))
+
+GENERATION_KEY = "search:generation"
+GENERATION_AT_KEY = "search:generation:at"
+
+logger = logging.getLogger(__name__)
+
+
+class MemorySearchCacheBackend:
+    """
+    LRU + TTL en memoria. La generación también es local: con varios workers
+    de uvicorn, una escritura solo invalida al worker que la atendió y el resto
+    converge al expirar el TTL (usar 'redis' si eso no es aceptable).
+    """
+    name = "memory"
+
+    def __init__(self):
+        self.entries = LRUTTLCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS)
+        self._generation = 0
+        self._bumped_at = 0.0
+
+    async def get_generation(self) -> Tuple[int, float]:
+        """(generación vigente, epoch de la última invalidación)."""
+        return self._generation, self._bumped_at
+
+    async def bump_generation(self) -> int:
+        self._generation += 1
+        self._bumped_at = time.time()
+        # Las entradas viejas ya son inalcanzables; liberamos la memoria de una vez
+        self.entries.clear()
+        return self._generation
+
+    async def get(self, key: str) -> Optional[SearchPage]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, page: SearchPage) -> None:
+        self.entries.set(key, page)
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+
+class RedisSearchCacheBackend:
+    """
+    Backend compartido en Redis. Dependencia opcional: pip install redis.
+    Las entradas de generaciones anteriores no se borran: expiran solas por TTL.
+    """
+    name = "redis"
+
+    def __init__(self, url: str = SEARCH_CACHE_REDIS_URL):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("SEARCH_CACHE_BACKEND=redis requiere 'redis' (pip install redis)") from e
+        self.client = redis.from_url(url)
+        self.hits = 0
+        self.misses = 0
+
+    async def get_generation(self) -> Tuple[int, float]:
+        # Un solo round trip para la generación y su fecha
+        generation, bumped_at = await self.client.mget(GENERATION_KEY, GENERATION_AT_KEY)
+        return int(generation or 0), float(bumped_at or 0)
+
+    async def bump_generation(self) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(GENERATION_KEY)
+            pipe.set(GENERATION_AT_KEY, time.time())
+            generation, _ = await pipe.execute()
+        return generation
+
+    async def get(self, key: str) -> Optional[SearchPage]:
+        raw = await self.client.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return SearchPage.model_validate_json(raw)
+
+    async def set(self, key: str, page: SearchPage) -> None:
+        await self.client.set(key, page.model_dump_json(), ex=int(SEARCH_CACHE_TTL_SECONDS))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": SEARCH_CACHE_TTL_SECONDS,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SearchCache:
+    """
+    Caché de resultados de búsqueda delante de CaseService.search_cases.
+
+    La clave incluye la generación vigente: cada escritura que cambia los
+    resultados posibles (alta, vectorización, carga masiva) la incrementa con
+    invalidate() y todas las entradas anteriores dejan de ser alcanzables.
+    Ningún fallo de la caché debe romper la búsqueda: ante errores se comporta
+    como un miss.
+    """
+
+    def __init__(self):
+        self.enabled = SEARCH_CACHE_ENABLED
+        self.backend = None
+        if self.enabled:
+            self.backend = RedisSearchCacheBackend() if SEARCH_CACHE_BACKEND == "redis" else MemorySearchCacheBackend()
+        self.errors = 0
+        self.invalidations = 0
+        # Ventana sin caché tras cada escritura (solo si la búsqueda lee de una réplica)
+        self.replica_lag_seconds = SEARCH_CACHE_REPLICA_LAG_SECONDS if REPLICA_CONFIGURED else 0.0
+        self.skipped_replica_lag = 0
+
+    async def key_for(self, search_params: SearchRequest, model: str) -> Optional[str]:
+        """
+        Clave de la request normalizada ("ABS  encendido" == "abs encendido"),
+        ligada a la generación actual. None si la caché está desactivada o caída,
+        o si la última escritura es tan reciente que la réplica puede no tenerla.
+        """
+        if not self.enabled:
+            return None
+        payload = search_params.model_dump(mode="json")
+        payload["query"] = normalize_text(search_params.query)
+        if search_params.model_filter:
+            payload["model_filter"] = normalize_text(search_params.model_filter)
+
+        try:
+            generation, bumped_at = await self.backend.get_generation()
+        except Exception as e:
+            self._error("leer la generación", e)
+            return None
+
+        if self.replica_lag_seconds and time.time() - bumped_at < self.replica_lag_seconds:
+            # Ni se lee ni se escribe: la página saldría de la réplica, quizá sin la escritura
+            self.skipped_replica_lag += 1
+            return None
+
+        digest = hashlib.sha256(json.dumps([model, payload], sort_keys=True).encode("utf-8")).hexdigest()
+        return f"search:{generation}:{digest}"
+
+    async def get(self, key: Optional[str]) -> Optional[SearchPage]:
+        if key is None:
+            return None
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self._error("leer", e)
+            return None
+
+    async def set(self, key: Optional[str], page: SearchPage) -> None:
+        if key is None:
+            return
+        try:
+            await self.backend.set(key, page)
+        except Exception as e:
+            self._error("escribir", e)
+
+    async def invalidate(self) -> None:
+        """Llamar DESPUÉS del commit de cualquier escritura sobre diagnosis_cases."""
+        if not self.enabled:
+            return
+        try:
+            await self.backend.bump_generation()
+            self.invalidations += 1
+        except Exception as e:
+            self._error("invalidar", e)
+
+    def _error(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        logger.warning("⚠️  Search cache: no se pudo %s: %s", action, error)
+
+    async def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+
+        generation = None
+        try:
+            generation, _ = await self.backend.get_generation()
+        except Exception as e:
+            self._error("leer la generación", e)
+        return {
+            "enabled": True,
+            "backend": self.backend.name,
+            "generation": generation,
+            "invalidations": self.invalidations,
+            "replica_lag_seconds": self.replica_lag_seconds,
+            "skipped_replica_lag": self.skipped_replica_lag,
+            "errors": self.errors,
+            **self.backend.stats(),
+        }
+
+
+# Instancia única por proceso (compartida por todas las requests)
+search_cache = SearchCache()
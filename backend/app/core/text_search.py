@@ -0,0 +1,78 @@
+import os
+import html
+from sqlalchemy import func, literal, literal_column, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+# --- CONFIGURACIÓN DE BÚSQUEDA LÉXICA (Postgres full-text + pg_trgm) ---
+# Configuración creada en database/init.sql: español + unaccent ("eléctrico" == "electrico")
+TEXT_SEARCH_CONFIG = "es_unaccent"
+
+# Trigramas para códigos y piezas con errores de tipeo ("P300" ~ "P0300")
+LEXICAL_TRIGRAM_ENABLED = os.getenv("LEXICAL_TRIGRAM_ENABLED", "true").lower() == "true"
+
+# Columna generada (tsvector ponderado: título A, problema B, solución C) e índice GIN
+search_vector = literal_column("diagnosis_cases.search_vector")
+
+# Debe coincidir EXACTAMENTE con la expresión del índice idx_diagnosis_cases_search_trgm
+search_text = literal_column(
+    "(diagnosis_cases.title || ' ' || coalesce(diagnosis_cases.problem_description, '')"
+    " || ' ' || coalesce(diagnosis_cases.solution_description, ''))"
+)
+
+_regconfig = literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig")
+
+# Delimitadores de ts_headline: caracteres de uso privado (no aparecen en los
+# casos) que render_headline convierte en <mark> después de escapar el texto
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_STOP = "\ue001"
+
+
+def build_tsquery(query: str) -> ColumnElement:
+    """Sintaxis tipo buscador web: comillas, OR y '-' para excluir."""
+    return func.websearch_to_tsquery(_regconfig, query)
+
+
+def match_condition(query: str) -> ColumnElement:
+    """WHERE indexable: GIN sobre search_vector (+ GIN trigram si está habilitado)."""
+    condition = search_vector.op("@@")(build_tsquery(query))
+    if LEXICAL_TRIGRAM_ENABLED:
+        condition = or_(condition, literal(query).op("<%")(search_text))
+    return condition
+
+
+def rank_expression(query: str) -> ColumnElement:
+    """
+    Score léxico en [0, 1): ts_rank_cd con normalización 32 (rank / (rank + 1)).
+    Con trigramas se toma el mayor entre el rank y la word_similarity.
+    """
+    rank = func.ts_rank_cd(search_vector, build_tsquery(query), 32)
+    if LEXICAL_TRIGRAM_ENABLED:
+        rank = func.greatest(rank, func.word_similarity(query, search_text))
+    return rank
+
+
+def headline_expression(query: str) -> ColumnElement:
+    """
+    Fragmento del problema/solución con los términos buscados entre
+    HIGHLIGHT_START/HIGHLIGHT_STOP. Es texto del usuario SIN escapar: pasarlo
+    por render_headline antes de devolverlo.
+    """
+    document = literal_column(
+        "(coalesce(diagnosis_cases.problem_description, '') || ' ' "
+        "|| coalesce(diagnosis_cases.solution_description, ''))"
+    )
+    return func.ts_headline(
+        _regconfig,
+        document,
+        build_tsquery(query),
+        f"MaxWords=30, MinWords=10, MaxFragments=2, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}",
+    )
+
+
+def render_headline(fragment: str) -> str:
+    """HTML seguro: escapa el texto del caso y solo entonces agrega los <mark>."""
+    return (
+        html.escape(fragment)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_STOP, "</mark>")
+    )
@@ -0,0 +1,291 @@
+import os
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Union
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import bindparam, cast, func, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+from app.models import DiagnosisCase, EMBEDDING_DIMENSIONS
+
+# --- CONFIGURACIÓN DEL ÍNDICE ANN (pgvector) ---
+# Tipo de índice: 'hnsw' (mejor recall/latencia) o 'ivfflat' (build más rápido, menos memoria)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+VECTOR_INDEX_NAME = "idx_diagnosis_cases_embedding"
+
+# Parámetros de construcción
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "1000"))
+
+# Parámetros de búsqueda por defecto (se pueden sobrescribir por request)
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+# Búsquedas con filtros (modelo / grupo): escaneo iterativo del índice (pgvector >= 0.8).
+# Sin esto el índice devuelve ef_search candidatos, el filtro descarta la mayoría
+# y la página llega incompleta. 'off' para versiones anteriores de pgvector.
+# IVFFlat solo admite 'relaxed_order'.
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "strict_order").lower()
+HNSW_MAX_SCAN_TUPLES = int(os.getenv("HNSW_MAX_SCAN_TUPLES", "20000"))
+IVFFLAT_MAX_PROBES = int(os.getenv("IVFFLAT_MAX_PROBES", "100"))
+
+# Compresión del índice: la tabla guarda siempre el vector completo (float32) y el
+# índice se construye sobre una expresión comprimida.
+#   'none'    -> vector (4 bytes/dim)
+#   'halfvec' -> float16 (2x más chico, pérdida de recall casi nula)
+#   'binary'  -> binary_quantize, 1 bit/dim (32x más chico, requiere re-ranking)
+# Con compresión, la búsqueda trae RERANK_DEPTH candidatos del índice comprimido
+# y los reordena por distancia coseno exacta sobre el vector completo.
+# Cambiarla requiere reconstruir el índice (POST /api/admin/vector-index/rebuild).
+EMBEDDING_COMPRESSION = os.getenv("EMBEDDING_COMPRESSION", "none").lower()
+RERANK_DEPTH = int(os.getenv("RERANK_DEPTH", "100"))
+
+# Estado del último rebuild (un solo rebuild a la vez por proceso)
+_rebuild_lock = asyncio.Lock()
+rebuild_status: dict = {"running": False, "started_at": None, "finished_at": None, "error": None}
+
+if VECTOR_INDEX_TYPE not in ("hnsw", "ivfflat"):
+    raise ValueError(f"FATAL: VECTOR_INDEX_TYPE inválido: '{VECTOR_INDEX_TYPE}' (usar 'hnsw' o 'ivfflat').")
+if EMBEDDING_COMPRESSION not in ("none", "halfvec", "binary"):
+    raise ValueError(
+        f"FATAL: EMBEDDING_COMPRESSION inválido: '{EMBEDDING_COMPRESSION}' (usar 'none', 'halfvec' o 'binary')."
+    )
+if VECTOR_ITERATIVE_SCAN not in ("off", "strict_order", "relaxed_order"):
+    raise ValueError(
+        f"FATAL: VECTOR_ITERATIVE_SCAN inválido: '{VECTOR_ITERATIVE_SCAN}' (usar 'off', 'strict_order' o 'relaxed_order')."
+    )
+
+
+# Expresión indexada y operator class por modo de compresión. La expresión de la
+# consulta (coarse_distance) debe coincidir EXACTAMENTE para que se use el índice.
+_INDEXED_EXPRESSIONS = {
+    "none": ("embedding", "vector_cosine_ops"),
+    "halfvec": (f"(embedding::halfvec({EMBEDDING_DIMENSIONS}))", "halfvec_cosine_ops"),
+    "binary": (f"(binary_quantize(embedding)::bit({EMBEDDING_DIMENSIONS}))", "bit_hamming_ops"),
+}
+
+
+def _index_method() -> str:
+    expression, opclass = _INDEXED_EXPRESSIONS[EMBEDDING_COMPRESSION]
+    if VECTOR_INDEX_TYPE == "hnsw":
+        return f"hnsw ({expression} {opclass}) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+    return f"ivfflat ({expression} {opclass}) WITH (lists = {IVFFLAT_LISTS})"
+
+
+def uses_rerank() -> bool:
+    return EMBEDDING_COMPRESSION != "none"
+
+
+def coarse_distance(query_vector: Union[list, ColumnElement]) -> ColumnElement:
+    """
+    Distancia de la primera pasada, sobre la misma expresión que el índice:
+    halfvec <=> halfvec (coseno en float16) o bit <~> bit (Hamming).
+    El vector de consulta puede ser una lista o una expresión SQL de tipo
+    vector (p. ej. el embedding guardado de un caso, por subconsulta).
+    """
+    if isinstance(query_vector, ColumnElement):
+        query = query_vector
+    else:
+        # Cast explícito: binary_quantize() tiene sobrecargas para vector y halfvec
+        query = cast(bindparam(None, query_vector, type_=Vector(EMBEDDING_DIMENSIONS)), Vector(EMBEDDING_DIMENSIONS))
+    if EMBEDDING_COMPRESSION == "halfvec":
+        halfvec = HALFVEC(EMBEDDING_DIMENSIONS)
+        return cast(DiagnosisCase.embedding, halfvec).op("<=>")(cast(query, halfvec))
+    if EMBEDDING_COMPRESSION == "binary":
+        bits = BIT(EMBEDDING_DIMENSIONS)
+        return cast(func.binary_quantize(DiagnosisCase.embedding), bits).op("<~>")(
+            cast(func.binary_quantize(query), bits)
+        )
+    return DiagnosisCase.embedding.cosine_distance(query_vector)
+
+
+def index_definition(index_name: str = VECTOR_INDEX_NAME, table: str = "diagnosis_cases", concurrently: bool = True) -> str:
+    """
+    DDL del índice vectorial según la configuración actual.
+    Por defecto con CONCURRENTLY para no bloquear escrituras sobre la tabla
+    (no aplica al índice padre de una tabla particionada: 'ONLY diagnosis_cases').
+    """
+    mode = "CONCURRENTLY " if concurrently else ""
+    return f"CREATE INDEX {mode}IF NOT EXISTS {index_name} ON {table} USING {_index_method()}"
+
+
+def search_server_settings() -> dict:
+    """
+    Parámetros de búsqueda por defecto como server_settings de asyncpg: se fijan
+    una vez al abrir cada conexión del pool, no en cada búsqueda.
+    El escaneo iterativo queda siempre activo: toda búsqueda filtra al menos
+    variant_of_id IS NULL, y solo sigue leyendo el índice si la página no se completa.
+    """
+    iterative = VECTOR_ITERATIVE_SCAN != "off"
+    if VECTOR_INDEX_TYPE == "hnsw":
+        settings = {"hnsw.ef_search": str(HNSW_EF_SEARCH)}
+        if iterative:
+            settings.update({
+                "hnsw.iterative_scan": VECTOR_ITERATIVE_SCAN,
+                "hnsw.max_scan_tuples": str(HNSW_MAX_SCAN_TUPLES),
+            })
+    else:
+        settings = {"ivfflat.probes": str(IVFFLAT_PROBES)}
+        if iterative:
+            # IVFFlat solo admite 'relaxed_order'
+            settings.update({
+                "ivfflat.iterative_scan": "relaxed_order",
+                "ivfflat.max_probes": str(max(IVFFLAT_PROBES, IVFFLAT_MAX_PROBES)),
+            })
+    return settings
+
+
+async def apply_search_params(
+    session: AsyncSession,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+) -> None:
+    """
+    Ajusta el compromiso recall/latencia SOLO para la transacción actual
+    (set_config(..., is_local => true)), y solo si difiere de los defaults de
+    la conexión (search_server_settings): con los defaults no hay round trip
+    extra; con un override, uno solo para todos los parámetros.
+    """
+    if VECTOR_INDEX_TYPE == "hnsw":
+        value = int(ef_search or HNSW_EF_SEARCH)
+        if value == HNSW_EF_SEARCH:
+            return
+        settings = {"hnsw.ef_search": str(value)}
+    else:
+        value = int(probes or IVFFLAT_PROBES)
+        if value == IVFFLAT_PROBES:
+            return
+        settings = {"ivfflat.probes": str(value)}
+        if VECTOR_ITERATIVE_SCAN != "off" and value > IVFFLAT_MAX_PROBES:
+            settings["ivfflat.max_probes"] = str(value)
+
+    params = {}
+    calls = []
+    for position, (name, setting) in enumerate(settings.items()):
+        params[f"name_{position}"] = name
+        params[f"value_{position}"] = setting
+        calls.append(f"set_config(:name_{position}, :value_{position}, true)")
+    await session.execute(text(f"SELECT {', '.join(calls)}"), params)
+
+
+async def index_exists(engine: AsyncEngine) -> bool:
+    return await _current_definition(engine) is not None
+
+
+async def index_matches_config(engine: AsyncEngine) -> bool:
+    """False si el índice existente usa otro tipo o compresión que la configuración actual."""
+    definition = await _current_definition(engine)
+    if definition is None:
+        return False
+    _, opclass = _INDEXED_EXPRESSIONS[EMBEDDING_COMPRESSION]
+    return f"USING {VECTOR_INDEX_TYPE} " in definition and opclass in definition
+
+
+async def _current_definition(engine: AsyncEngine) -> Optional[str]:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE tablename = 'diagnosis_cases' AND indexname = :name"),
+            {"name": VECTOR_INDEX_NAME},
+        )
+        return result.scalar_one_or_none()
+
+
+async def list_partitions(conn) -> List[str]:
+    """Particiones de diagnosis_cases (lista vacía si la tabla no está particionada)."""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'diagnosis_cases' ORDER BY c.relname"
+    ))
+    return list(result.scalars().all())
+
+
+async def partition_stats(engine: AsyncEngine) -> List[dict]:
+    """Filas estimadas y tamaño del índice vectorial de cada partición."""
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT c.relname AS name, greatest(c.reltuples, 0)::bigint AS estimated_rows, "
+            "       (SELECT pg_size_pretty(pg_relation_size(ix.indexrelid)) "
+            "        FROM pg_inherits ii JOIN pg_index ix ON ix.indexrelid = ii.inhrelid "
+            "        WHERE ii.inhparent = to_regclass(:index) AND ix.indrelid = c.oid) AS vector_index_size "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'diagnosis_cases' "
+            "ORDER BY c.reltuples DESC"
+        ), {"index": VECTOR_INDEX_NAME})
+        return [dict(row) for row in result.mappings().all()]
+
+
+async def _rebuild_partitioned(conn, partitions: List[str], new_name: str) -> None:
+    """
+    En una tabla particionada CREATE INDEX CONCURRENTLY no aplica al padre:
+    se crea el índice padre con ON ONLY (inválido) y se adjunta un índice
+    construido con CONCURRENTLY en cada partición; al adjuntar el último
+    el padre pasa a válido.
+    """
+    await conn.execute(text(f"DROP INDEX IF EXISTS {new_name}"))
+    await conn.execute(text(index_definition(new_name, table="ONLY diagnosis_cases", concurrently=False)))
+
+    for partition in partitions:
+        partition_index = f"{partition}_embedding_idx_new"
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {partition_index}"))
+        await conn.execute(text(index_definition(partition_index, table=partition)))
+        await conn.execute(text(f"ALTER INDEX {new_name} ATTACH PARTITION {partition_index}"))
+
+    # Borrar el índice padre viejo borra también los de cada partición
+    await conn.execute(text(f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME}"))
+    await conn.execute(text(f"ALTER INDEX {new_name} RENAME TO {VECTOR_INDEX_NAME}"))
+    for partition in partitions:
+        await conn.execute(text(f"ALTER INDEX {partition}_embedding_idx_new RENAME TO {partition}_embedding_idx"))
+
+
+async def rebuild_index(engine: AsyncEngine) -> dict:
+    """
+    Reconstruye el índice vectorial sin sacar la tabla de servicio:
+    1. Crea un índice nuevo con CONCURRENTLY (aplica los parámetros actuales).
+    2. Elimina el índice viejo con CONCURRENTLY.
+    3. Renombra el nuevo al nombre canónico.
+    Las búsquedas siguen usando el índice viejo hasta que el nuevo está listo.
+    Con la tabla particionada se construye partición por partición.
+    """
+    new_name = f"{VECTOR_INDEX_NAME}_new"
+
+    async with _rebuild_lock:
+        rebuild_status.update(running=True, started_at=datetime.utcnow(), finished_at=None, error=None)
+        try:
+            # CREATE/DROP INDEX CONCURRENTLY no puede correr dentro de una transacción
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+                # El build puede tardar minutos: sin el statement_timeout del pool
+                await conn.execute(text("SET statement_timeout = 0"))
+                try:
+                    partitions = await list_partitions(conn)
+                    if partitions:
+                        await _rebuild_partitioned(conn, partitions, new_name)
+                    else:
+                        # Restos de un rebuild interrumpido (índice INVALID)
+                        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))
+                        await conn.execute(text(index_definition(new_name)))
+                        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}"))
+                        await conn.execute(text(f"ALTER INDEX {new_name} RENAME TO {VECTOR_INDEX_NAME}"))
+                finally:
+                    await conn.execute(text("RESET statement_timeout"))
+        except Exception as e:
+            rebuild_status["error"] = str(e)
+            raise
+        finally:
+            rebuild_status.update(running=False, finished_at=datetime.utcnow())
+
+    return {
+        "index": VECTOR_INDEX_NAME,
+        "type": VECTOR_INDEX_TYPE,
+        "definition": index_definition(),
+    }
+
+
+def is_rebuilding() -> bool:
+    return _rebuild_lock.locked()
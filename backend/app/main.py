@@ -1,5 +1,6 @@
 # backend/app/main.py
-from fastapi import FastAPI, Depends
+import logging
+from fastapi import FastAPI, Depends, Response
 from sqlalchemy import text
 from contextlib import asynccontextmanager
 
@@ -7,46 +8,100 @@ from contextlib import asynccontextmanager
 from app.core.security import get_current_username
 
 # --- CAMBIO: Importamos engine de la nueva ubicación para evitar ciclos ---
-from app.core.database import engine
+from app.core.database import engine, dispose_engines
 
 # --- NUEVO: Importamos el router de casos ---
-from app.api.endpoints import cases
+from app.api.endpoints import cases, admin
+from app.core import vector_index
+from app.core.ai_client import get_ai_client, close_ai_client, current_ai_client
+from app.core.database import pool_metrics
+from app.core.embedding_cache import embedding_cache
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.core.metrics import REGISTRY, RequestContextMiddleware, RuntimeStatsCollector, render_metrics
+from app.core.search_cache import search_cache
+from app.services.embedding_backfill import backfill_worker, EMBEDDING_BACKFILL_ENABLED
+from app.services.embedding_queue import embedding_queue
+from app.services.case_neighbors import neighbor_index
+
+# 1. Observabilidad: logging no bloqueante (con request id) y métricas de Prometheus
+setup_logging()
+logger = logging.getLogger("app")
+REGISTRY.register(RuntimeStatsCollector(pool_metrics, current_ai_client, search_cache, embedding_cache))
 
 # 2. Ciclo de Vida de la Aplicación (Startup/Shutdown)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("🚀 Iniciando aplicación y verificando conexión a DB...")
+    logger.info("🚀 Iniciando aplicación y verificando conexión a DB...")
     try:
         # Creamos una conexión para probar la DB
         async with engine.connect() as conn:
             # A. Verificación simple de conectividad
             await conn.execute(text("SELECT 1"))
-            print("✅ Conexión a Base de Datos exitosa.")
+            logger.info("✅ Conexión a Base de Datos exitosa.")
             
             # B. Verificación de la extensión pgvector
             result = await conn.execute(text("SELECT * FROM pg_extension WHERE extname = 'vector'"))
             if result.fetchone():
-                print("✅ Extensión 'vector' detectada correctamente.")
+                logger.info("✅ Extensión 'vector' detectada correctamente.")
             else:
-                print("⚠️  ADVERTENCIA: Extensión 'vector' NO detectada.")
+                logger.warning("⚠️  ADVERTENCIA: Extensión 'vector' NO detectada.")
                 
             # C. Inicialización de Tablas (Opcional si usas init.sql, pero útil para SQLModel)
             # Nota: Esto creará las columnas nuevas si no existen y la DB lo permite, 
             # pero en producción se recomienda Alembic.
             # from app.models import SQLModel
             # await conn.run_sync(SQLModel.metadata.create_all)
-            
+
+        # D. Verificación del índice ANN (sin él, cada búsqueda es un Seq Scan)
+        if await vector_index.index_matches_config(engine):
+            logger.info("✅ Índice vectorial '%s' (%s, compresión %s) presente.", vector_index.VECTOR_INDEX_NAME,
+                        vector_index.VECTOR_INDEX_TYPE, vector_index.EMBEDDING_COMPRESSION)
+        elif await vector_index.index_exists(engine):
+            # La consulta no coincidiría con la expresión indexada: Seq Scan
+            logger.warning("⚠️  ADVERTENCIA: El índice vectorial no coincide con VECTOR_INDEX_TYPE/EMBEDDING_COMPRESSION. "
+                           "Ejecutar POST /api/admin/vector-index/rebuild.")
+        else:
+            logger.warning("⚠️  ADVERTENCIA: Índice vectorial NO encontrado. Ejecutar database/migrations/001_vector_index.sql "
+                           "o POST /api/admin/vector-index/rebuild.")
+
     except Exception as e:
-        print(f"❌ Error CRÍTICO conectando a la DB: {e}")
-    
+        logger.error("❌ Error CRÍTICO conectando a la DB: %s", e)
+
+    try:
+        # E. Cliente de IA compartido (pool HTTP keep-alive para todo el proceso)
+        get_ai_client()
+
+        # F. Backfill de embeddings pendientes (casos guardados con embedding NULL)
+        if EMBEDDING_BACKFILL_ENABLED:
+            backfill_worker.start()
+
+        # G. Cola de embeddings para la creación asíncrona (POST /api/cases/async)
+        embedding_queue.start()
+
+        # H. Listas de vecinos precalculadas (solo con NEIGHBORS_PRECOMPUTE=true)
+        neighbor_index.start()
+    except Exception as e:
+        # Sin cliente de IA los casos se guardan igual (embedding NULL)
+        logger.warning("⚠️  Workers de embeddings no iniciados: %s", e)
+
     yield
-    print("🛑 Apagando aplicación...")
+    logger.info("🛑 Apagando aplicación...")
+    await neighbor_index.stop()
+    await embedding_queue.stop()
+    await backfill_worker.stop()
+    await close_ai_client()
+    await dispose_engines()
+    shutdown_logging()
 
 # 3. Definición de la App FastAPI
 app = FastAPI(title="Volkswagen Knowledge Base API", lifespan=lifespan)
 
+# Request id (X-Request-ID) en logs y respuesta + latencia por ruta
+app.add_middleware(RequestContextMiddleware)
+
 # --- REGISTRO DE ROUTERS ---
 app.include_router(cases.router, prefix="/api/cases", tags=["Casos de Diagnóstico"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Administración"])
 
 # --- ENDPOINTS EXISTENTES ---
 
@@ -54,6 +109,12 @@ app.include_router(cases.router, prefix="/api/cases", tags=["Casos de Diagnósti
 async def health_check():
     return {"status": "ok", "service": "backend-api"}
 
+# Scrape de Prometheus (sin auth, como /health: nginx solo expone /api/, /docs y el frontend)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/", dependencies=[Depends(get_current_username)])
 async def root():
     return {
@@ -1,3 +1,4 @@
+import os
 from enum import Enum
 from typing import Optional
 from datetime import datetime
@@ -5,6 +6,9 @@ from sqlalchemy import String
 from sqlmodel import SQLModel, Field, Column
 from pgvector.sqlalchemy import Vector
 
+# Dimensión de la columna vectorial (debe coincidir con vector(N) en database/init.sql)
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
 # 1. Definición del Enum
 class ConstructionGroup(str, Enum):
     MOTOR = "Motor"
@@ -32,25 +36,153 @@ class DiagnosisCaseBase(SQLModel):
 class DiagnosisCaseCreate(DiagnosisCaseBase):
     pass
 
+# 3.1 DTO de Lectura (detalle sin el vector)
+class DiagnosisCaseRead(DiagnosisCaseBase):
+    id: int
+    created_at: datetime
+    duplicate_count: int = 0  # Altas casi idénticas fusionadas en este caso (DEDUP_MODE=merge)
+    variant_of_id: Optional[int] = None  # Caso canónico del que este es una variante
+
+# 3.2 Catálogo normalizado de modelos (tabla vehicle_models)
+class VehicleModel(SQLModel, table=True):
+    __tablename__ = "vehicle_models"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(max_length=100)
+
 # 4. Modelo de Base de Datos
 class DiagnosisCase(DiagnosisCaseBase, table=True):
     __tablename__ = "diagnosis_cases"
 
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # FK al catálogo: los filtros usan este id (B-tree), vehicle_model guarda el nombre canónico
+    vehicle_model_id: Optional[int] = Field(default=None, foreign_key="vehicle_models.id")
+
+    # Deduplicación: las variantes apuntan a su caso canónico y no aparecen en la búsqueda
+    duplicate_count: int = Field(default=0)
+    variant_of_id: Optional[int] = Field(default=None)
     
     # Columna Vectorial (pgvector)
-    embedding: Optional[list[float]] = Field(default=None, sa_column=Column(Vector(1536)))
+    embedding: Optional[list[float]] = Field(default=None, sa_column=Column(Vector(EMBEDDING_DIMENSIONS)))
+
+    # Backfill: intentos fallidos de vectorizar la fila por sí sola
+    embedding_attempts: int = Field(default=0)
+    embedding_failed_at: Optional[datetime] = Field(default=None)
 
     class Config:
         arbitrary_types_allowed = True
 
+# 5. Caché persistente de embeddings (clave = sha256(modelo + texto normalizado))
+class EmbeddingCacheEntry(SQLModel, table=True):
+    __tablename__ = "embedding_cache"
+
+    key: str = Field(primary_key=True, max_length=64)
+    model: str = Field(max_length=100)
+    embedding: list[float] = Field(sa_column=Column(Vector(EMBEDDING_DIMENSIONS), nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+# 6. Vecinos precalculados (sin FK: diagnosis_cases está particionada y su PK es (id, construction_group))
+class CaseNeighbor(SQLModel, table=True):
+    __tablename__ = "case_neighbors"
+
+    case_id: int = Field(primary_key=True)
+    neighbor_id: int = Field(primary_key=True)
+    distance: float  # Distancia coseno exacta
+
+# --- NUEVO: DTOs para Creación Asíncrona ---
+class EmbeddingStatus(str, Enum):
+    QUEUED = "queued"          # En la cola de embeddings de este proceso
+    PENDING = "pending"        # Sin vector, esperando al backfill
+    SEARCHABLE = "searchable"  # Con vector: ya aparece en la búsqueda semántica
+    DUPLICATE = "duplicate"    # Con vector, pero casi duplicado de otro caso (DEDUP_MODE)
+
+class CaseEmbeddingStatus(SQLModel):
+    id: int
+    status: EmbeddingStatus
+    duplicate_of: Optional[int] = None  # Caso canónico cuando status = duplicate
+
 # --- NUEVO: DTOs para Búsqueda (Épica 3) ---
+class SearchMode(str, Enum):
+    AUTO = "auto"        # Vectorial si hay embedding; si no, léxica (comportamiento original)
+    VECTOR = "vector"
+    LEXICAL = "lexical"
+    HYBRID = "hybrid"    # Vectorial + léxica en paralelo, fusionadas
+
+class FusionMethod(str, Enum):
+    RRF = "rrf"            # Reciprocal Rank Fusion: solo usa posiciones
+    WEIGHTED = "weighted"  # Suma ponderada de scores (ambos en [0, 1])
+
+class SearchFields(str, Enum):
+    FULL = "full"        # Incluye problema y solución completos
+    SUMMARY = "summary"  # Solo id, título, metadatos y score (detalle vía GET /api/cases/{id})
+
 class SearchRequest(SQLModel):
     query: str
     model_filter: Optional[str] = None
     group_filter: Optional[ConstructionGroup] = None
 
-class SearchResult(DiagnosisCaseBase):
+    # Ajuste de recall/latencia del índice ANN (None = default del servidor)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000, description="HNSW: candidatos explorados")
+    probes: Optional[int] = Field(default=None, ge=1, le=1000, description="IVFFlat: listas exploradas")
+
+    # Estrategia de recuperación y fusión (modo híbrido)
+    mode: SearchMode = SearchMode.AUTO
+    fusion: FusionMethod = FusionMethod.RRF
+    vector_weight: float = Field(default=1.0, ge=0)
+    lexical_weight: float = Field(default=1.0, ge=0)
+    rrf_k: int = Field(default=60, ge=1, description="Constante k de RRF: mayor = menos peso al top del ranking")
+
+    # Paginación y proyección
+    limit: Optional[int] = Field(default=None, ge=1, le=50, description="Resultados por página (None = default)")
+    cursor: Optional[str] = Field(default=None, description="Cursor devuelto en X-Next-Cursor")
+    fields: SearchFields = SearchFields.FULL
+    snippet: bool = Field(default=False, description="Incluir fragmento resaltado con <mark>")
+
+class SearchResult(SQLModel):
+    id: int
+    title: str
+    vehicle_model: str
+    year: int
+    construction_group: ConstructionGroup
+    # Ausentes con fields='summary'
+    problem_description: Optional[str] = None
+    solution_description: Optional[str] = None
+    snippet: Optional[str] = Field(
+        default=None, description="HTML seguro: texto del caso escapado, solo con etiquetas <mark>"
+    )
+    score: float = 0.0
+
+class SearchPage(SQLModel):
+    results: list[SearchResult] = []
+    next_cursor: Optional[str] = None
+
+# --- DTOs para Casos Similares ---
+class SimilarCasesRequest(SQLModel):
+    ids: list[int] = Field(min_length=1, max_length=100)
+    limit: Optional[int] = Field(default=None, ge=1, le=50, description="Vecinos por caso (None = default)")
+    fields: SearchFields = SearchFields.SUMMARY
+
+class SimilarCases(SQLModel):
     id: int
-    score: float = 0.0
\ No newline at end of file
+    results: list[SearchResult] = []
+
+# --- NUEVO: DTOs para Carga Masiva ---
+class BulkRowError(SQLModel):
+    index: int  # Posición del caso dentro del lote recibido
+    error: str
+
+class BulkCreateResponse(SQLModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    without_embedding: int = 0  # Guardados con embedding NULL (pendientes de backfill)
+    reused_embeddings: int = 0  # Guardados con el vector que traía la fila (sin llamar a la IA)
+    merged: int = 0  # Casi duplicados fusionados en un caso existente (no insertados)
+    variants: int = 0  # Insertados como variante de un caso existente
+    ids: list[int] = []
+    errors: list[BulkRowError] = []
@@ -0,0 +1,115 @@
+import os
+import json
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import literal_column, select, text
+from app.core.database import async_read_session
+from app.models import DiagnosisCase
+
+# Filas por vuelta del cursor del servidor (y por chunk de la respuesta)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+# Header con el token para la siguiente exportación incremental
+SYNC_TOKEN_HEADER = "X-Sync-Token"
+
+# Transacción que escribió por última vez las columnas exportadas (trigger, migración 011)
+sync_xid = literal_column("diagnosis_cases.sync_xid")
+
+
+def parse_since(since: str) -> int:
+    """Token de X-Sync-Token de la exportación anterior (entero, xid8)."""
+    try:
+        token = int(since)
+    except ValueError:
+        token = -1
+    if token < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Parámetro 'since' inválido: usar el valor del header {SYNC_TOKEN_HEADER} de la exportación anterior"
+        )
+    return token
+
+
+async def current_sync_token() -> int:
+    """
+    Transacción en curso más antigua (pg_snapshot_xmin): toda transacción con
+    id menor ya terminó. Se toma ANTES de abrir el export, así cada escritura
+    queda o visible en este export o con sync_xid >= token (entra en el próximo).
+    """
+    async with async_read_session() as session:
+        result = await session.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text"))
+        return int(result.scalar_one())
+
+
+async def export_cases_ndjson(
+    include_embeddings: bool = False,
+    since: Optional[int] = None,
+    embedding_model: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Exporta el corpus como NDJSON, un caso por línea, en orden (sync_xid, id).
+
+    Lee con un cursor del servidor (session.stream + yield_per) en su propia
+    sesión: la memoria es constante sin importar el tamaño de la tabla y la
+    sesión vive lo que dure la respuesta, no lo que dure el endpoint.
+
+    Sincronización incremental por orden de commit, no de created_at: la
+    siguiente exportación se pide con since=<X-Sync-Token de esta>. Trae los
+    casos creados y los modificados (p. ej. vectorizados después) desde
+    entonces; un caso puede repetirse entre exports, así que el destino aplica
+    cada línea como upsert por id.
+
+    Las variantes (casi duplicados, variant_of_id) no se exportan: su id no
+    significa nada en la base de destino y ahí reaparecerían como casos normales.
+    Un caso marcado como variante después de exportado sigue en la réplica
+    hasta que corra su propio job de deduplicación.
+    """
+    columns = [
+        DiagnosisCase.id,
+        DiagnosisCase.title,
+        DiagnosisCase.vehicle_model,
+        DiagnosisCase.year,
+        DiagnosisCase.construction_group,
+        DiagnosisCase.problem_description,
+        DiagnosisCase.solution_description,
+        DiagnosisCase.created_at,
+    ]
+    if include_embeddings:
+        columns.append(DiagnosisCase.embedding)
+
+    statement = (
+        select(*columns)
+        .where(DiagnosisCase.variant_of_id.is_(None))
+        .order_by(sync_xid, DiagnosisCase.id)
+    )
+    if since:
+        # Usa el índice (sync_xid, id); el parámetro viaja como texto (asyncpg no codifica xid8)
+        statement = statement.where(sync_xid >= text("CAST(CAST(:since AS text) AS xid8)").bindparams(since=str(since)))
+
+    async with async_read_session() as session:
+        result = await session.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.mappings().partitions():
+            yield "".join(
+                json.dumps(_export_row(row, include_embeddings, embedding_model), ensure_ascii=False) + "\n"
+                for row in partition
+            ).encode("utf-8")
+
+
+def _export_row(row, include_embeddings: bool, embedding_model: Optional[str]) -> dict:
+    item = {
+        "id": row["id"],
+        "title": row["title"],
+        "vehicle_model": row["vehicle_model"],
+        "year": row["year"],
+        "construction_group": row["construction_group"],
+        "problem_description": row["problem_description"],
+        "solution_description": row["solution_description"],
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+    }
+    if include_embeddings:
+        embedding = row["embedding"]
+        # pgvector devuelve numpy arrays
+        item["embedding"] = embedding.tolist() if hasattr(embedding, "tolist") else embedding
+        # Un vector solo sirve en otra base si se generó con el mismo modelo
+        item["embedding_model"] = embedding_model if embedding is not None else None
+    return item
@@ -0,0 +1,188 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from app.core.database import async_session
+from app.models import CaseNeighbor, DiagnosisCase, SearchFields, SearchRequest
+
+# Listas de vecinos precalculadas (tabla case_neighbors) para GET /api/cases/{id}/similar
+# sin filtros y para POST /api/cases/similar. Desactivado: todo se resuelve con ANN en vivo.
+NEIGHBORS_PRECOMPUTE = os.getenv("NEIGHBORS_PRECOMPUTE", "false").lower() == "true"
+NEIGHBORS_K = min(50, int(os.getenv("NEIGHBORS_K", "10")))
+NEIGHBORS_REFRESH_BATCH = int(os.getenv("NEIGHBORS_REFRESH_BATCH", "50"))
+
+logger = logging.getLogger(__name__)
+
+
+class NeighborIndex:
+    """
+    Mantiene las listas de los K vecinos más cercanos de cada caso vectorizado.
+
+    Actualización incremental: cada caso que recibe su embedding (alta, carga
+    masiva, cola o backfill) se agenda con schedule(); una tarea en segundo
+    plano calcula su lista con el ANN y lo inserta también en la lista de cada
+    vecino encontrado (la relación es simétrica), recortando cada lista a K.
+    Lo que quede agendado al apagar el proceso se recupera con rebuild().
+    """
+
+    def __init__(self, k: int = NEIGHBORS_K, batch_size: int = NEIGHBORS_REFRESH_BATCH):
+        self.enabled = NEIGHBORS_PRECOMPUTE
+        self.k = k
+        self.batch_size = batch_size
+        self._pending: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Métricas
+        self.refreshed_total = 0
+        self.failed_total = 0
+        self.rebuild_status: dict = {"running": False, "started_at": None, "finished_at": None, "processed": 0, "error": None}
+
+    # --- Ciclo de vida ---
+    def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("🧭 Vecinos precalculados activos (k=%d).", self.k)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # --- API ---
+    def schedule(self, case_ids: Iterable[int]) -> None:
+        """Agenda casos recién vectorizados (no bloquea: corre en segundo plano)."""
+        if self._task is None:
+            return
+        self._pending.update(case_ids)
+        if self._pending:
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "k": self.k,
+            "running": self._task is not None and not self._task.done(),
+            "pending": len(self._pending),
+            "refreshed_total": self.refreshed_total,
+            "failed_total": self.failed_total,
+            "rebuild": self.rebuild_status,
+        }
+
+    # --- Trabajo ---
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                batch = [self._pending.pop() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    await self.refresh(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed_total += len(batch)
+                    logger.exception("❌ Vecinos: error refrescando %d casos: %s", len(batch), e)
+
+    async def refresh(self, case_ids: List[int]) -> None:
+        """Recalcula la lista de cada caso y lo propaga a las listas de sus vecinos."""
+        # Import diferido: case_service usa este módulo para leer las listas
+        from app.services.case_service import CaseService
+
+        params = SearchRequest(query="", limit=self.k, fields=SearchFields.SUMMARY)
+        touched: Set[int] = set()
+
+        async with async_session() as session:
+            service = CaseService(session)
+            for case_id in case_ids:
+                if not await service.is_searchable(case_id):
+                    continue
+
+                # ANN con el vector guardado (sin IA); distancia exacta como clave
+                hits = await service._similar_hits(session, case_id, params)
+
+                await session.execute(delete(CaseNeighbor).where(CaseNeighbor.case_id == case_id))
+                if hits:
+                    rows = [{"case_id": case_id, "neighbor_id": result.id, "distance": distance} for result, distance in hits]
+                    # Arista inversa: el caso nuevo puede entrar en el top-K de cada vecino
+                    rows += [{"case_id": result.id, "neighbor_id": case_id, "distance": distance} for result, distance in hits]
+                    statement = insert(CaseNeighbor).values(rows)
+                    statement = statement.on_conflict_do_update(
+                        index_elements=[CaseNeighbor.case_id, CaseNeighbor.neighbor_id],
+                        set_={"distance": statement.excluded.distance},
+                    )
+                    await session.execute(statement)
+                await session.commit()
+
+                touched.add(case_id)
+                touched.update(result.id for result, _ in hits)
+                self.refreshed_total += 1
+
+            if touched:
+                await self._trim(session, touched)
+                await session.commit()
+
+    async def _trim(self, session, case_ids: Set[int]) -> None:
+        """Deja solo los K más cercanos en cada lista tocada."""
+        ranked = (
+            select(
+                CaseNeighbor.case_id,
+                CaseNeighbor.neighbor_id,
+                func.row_number().over(
+                    partition_by=CaseNeighbor.case_id,
+                    order_by=(CaseNeighbor.distance, CaseNeighbor.neighbor_id),
+                ).label("position"),
+            )
+            .where(CaseNeighbor.case_id.in_(case_ids))
+            .subquery()
+        )
+        await session.execute(
+            delete(CaseNeighbor).where(
+                CaseNeighbor.case_id == ranked.c.case_id,
+                CaseNeighbor.neighbor_id == ranked.c.neighbor_id,
+                ranked.c.position > self.k,
+            )
+        )
+
+    async def rebuild(self) -> None:
+        """Recalcula todas las listas (carga inicial o tras activar NEIGHBORS_PRECOMPUTE)."""
+        self.rebuild_status.update(running=True, started_at=datetime.utcnow(), finished_at=None, processed=0, error=None)
+        try:
+            last_id = 0
+            while True:
+                async with async_session() as session:
+                    result = await session.execute(
+                        select(DiagnosisCase.id)
+                        .where(
+                            DiagnosisCase.embedding.is_not(None),
+                            DiagnosisCase.variant_of_id.is_(None),
+                            DiagnosisCase.id > last_id,
+                        )
+                        .order_by(DiagnosisCase.id)
+                        .limit(self.batch_size)
+                    )
+                    ids = list(result.scalars().all())
+                if not ids:
+                    break
+                await self.refresh(ids)
+                last_id = ids[-1]
+                self.rebuild_status["processed"] += len(ids)
+        except Exception as e:
+            self.rebuild_status["error"] = str(e)
+            raise
+        finally:
+            self.rebuild_status.update(running=False, finished_at=datetime.utcnow())
+            logger.info("🧭 Vecinos: rebuild terminado (%d casos).", self.rebuild_status["processed"])
+
+    @property
+    def rebuilding(self) -> bool:
+        return self.rebuild_status["running"]
+
+
+# Instancia del proceso web (arrancada desde el lifespan de app/main.py)
+neighbor_index = NeighborIndex()
@@ -1,72 +1,595 @@
+import os
+import json
+import logging
+import base64
+import asyncio
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pydantic import ValidationError
 from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import HTTPException, status
-from sqlalchemy import select, or_
-from app.models import DiagnosisCase, DiagnosisCaseCreate, SearchRequest, SearchResult
-from app.core.ai_client import AIClient
+from sqlalchemy import select, insert, or_, and_, false, func, text
+from sqlalchemy.orm import defer
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.elements import ColumnElement
+from app.models import (
+    EMBEDDING_DIMENSIONS, DiagnosisCase, DiagnosisCaseCreate, SearchRequest, SearchResult,
+    BulkCreateResponse, BulkRowError, SearchMode, FusionMethod, SearchFields,
+    SearchPage, DiagnosisCaseRead, VehicleModel, CaseNeighbor, SimilarCasesRequest, SimilarCases,
+)
+from app.core.ai_client import AIClient, get_ai_client
+from app.core.database import async_read_session, async_session
+from app.core.metrics import DEDUP_TOTAL, SEARCH_PATH_TOTAL, observe_stage
+from app.core.search_cache import search_cache
+from app.core.vector_index import apply_search_params, HNSW_EF_SEARCH, RERANK_DEPTH
+from app.core import vector_index
+from app.core import text_search
+from app.services.vehicle_model_service import VEHICLE_MODELS_STRICT, clean_name, vehicle_model_catalog
+from app.services.case_neighbors import neighbor_index, NEIGHBORS_K
+from app.services.dedup_service import DEDUP_MODE, Duplicate, find_near_duplicates, merge_into
+
+# Tamaño de cada lote: una llamada de embeddings multi-input + un INSERT multi-fila
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# Resultados por página (por defecto) según estrategia de búsqueda
+VECTOR_LIMIT = 5
+LEXICAL_LIMIT = 10
+# Candidatos que aporta cada pierna antes de la fusión híbrida
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+logger = logging.getLogger(__name__)
+
+
+# Lectura liviana de entidades: el vector (~6 KB por fila) nunca se carga por
+# accidente; acceder a .embedding en una entidad así cargada lanza error.
+LEAN_CASE_OPTIONS = (defer(DiagnosisCase.embedding, raiseload=True),)
+
+# (resultado, clave de orden para el cursor keyset)
+Hit = Tuple[SearchResult, float]
+
+
+def build_embedding_text(problem_description: str, solution_description: str) -> str:
+    """Texto que se vectoriza por caso (mismo formato en todas las vías de ingesta)."""
+    return f"Problema: {problem_description}. Solución: {solution_description}"
+
 
 class CaseService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, ai_client: Optional[AIClient] = None):
         self.session = session
-        self.ai_client = AIClient()
+        # Cliente compartido por proceso: reutiliza conexiones HTTP y coalesce requests
+        self.ai_client = ai_client or get_ai_client()
+        # Búsqueda en curso cayó a léxica por falta de vector (no se cachea)
+        self._vector_unavailable = False
+        # Qué hizo la deduplicación con el último create_case ('merged', 'variant' o None)
+        self.dedup_action: Optional[str] = None
 
-    async def create_case(self, case_create: DiagnosisCaseCreate) -> DiagnosisCase:
+    async def create_case(self, case_create: DiagnosisCaseCreate) -> DiagnosisCaseRead:
         """
         Crea un nuevo caso de diagnóstico, validando reglas de negocio
         y generando automáticamente el embedding vectorial.
         """
         # 1. Validación de Negocio
-        current_year = datetime.now().year
-        if case_create.year < 1950 or case_create.year > current_year + 1:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"El año debe estar entre 1950 y {current_year + 1}"
-            )
+        self._validate_business_rules(case_create)
+        vehicle_model = await self._resolve_vehicle_model(case_create.vehicle_model)
 
         # 2. Preparación del Modelo
         db_case = DiagnosisCase.model_validate(case_create)
+        db_case.vehicle_model = vehicle_model.name
+        db_case.vehicle_model_id = vehicle_model.id
 
         # 3. Generación de Embeddings (IA)
-        text_to_vectorize = f"Problema: {case_create.problem_description}. Solución: {case_create.solution_description}"
-        print(f"🤖 Generando vector para caso: '{case_create.title}'...")
+        text_to_vectorize = build_embedding_text(case_create.problem_description, case_create.solution_description)
+        logger.debug("🤖 Generando vector para caso: '%s'...", case_create.title)
         
         vector = await self.ai_client.get_embedding(text_to_vectorize)
         
         if vector:
             db_case.embedding = vector
         else:
-            print("⚠️  Advertencia: No se pudo generar el vector (se guardará sin IA).")
+            logger.warning("⚠️  Advertencia: No se pudo generar el vector (se guardará sin IA).")
             db_case.embedding = None
 
+        # 3.1 Casi duplicados (mismo modelo y grupo) según DEDUP_MODE
+        self.dedup_action = None
+        duplicate = await self._find_duplicate(vector, vehicle_model.id, case_create.construction_group)
+        if duplicate is not None:
+            existing_id, similarity = duplicate
+            if DEDUP_MODE == "reject":
+                DEDUP_TOTAL.labels(action="reject").inc()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Caso casi duplicado de #{existing_id} (similitud {similarity:.3f})"
+                )
+            if DEDUP_MODE == "merge":
+                await merge_into(self.session, existing_id)
+                await self.session.commit()
+                await search_cache.invalidate()
+                self.dedup_action = "merged"
+                return await self.get_case(existing_id)
+            db_case.variant_of_id = existing_id
+            DEDUP_TOTAL.labels(action="variant").inc()
+            self.dedup_action = "variant"
+
         # 4. Persistencia
+        # Sin refresh: id y created_at ya están en memoria (expire_on_commit=False),
+        # recargar la fila solo traería de vuelta el vector
         self.session.add(db_case)
         await self.session.commit()
-        await self.session.refresh(db_case)
-        
-        # Fix: Convertir numpy array a lista nativa para JSON
-        if db_case.embedding is not None and hasattr(db_case.embedding, 'tolist'):
-            db_case.embedding = db_case.embedding.tolist()
+        # El caso nuevo debe aparecer ya en las búsquedas cacheadas
+        await search_cache.invalidate()
+        if db_case.embedding is not None and db_case.variant_of_id is None:
+            neighbor_index.schedule([db_case.id])
         
+        return DiagnosisCaseRead.model_validate(db_case)
+
+    async def _find_duplicate(
+        self, vector: Optional[List[float]], vehicle_model_id: int, construction_group: str
+    ) -> Optional[Duplicate]:
+        """Caso canónico más parecido sobre DEDUP_THRESHOLD (None si DEDUP_MODE=off o sin vector)."""
+        if DEDUP_MODE == "off" or not vector:
+            return None
+        duplicates = await find_near_duplicates(self.session, vector, vehicle_model_id, construction_group)
+        return duplicates[0] if duplicates else None
+
+    async def create_case_deferred(self, case_create: DiagnosisCaseCreate) -> DiagnosisCase:
+        """
+        Variante sin IA en el request: valida y persiste el caso con embedding NULL.
+        El embedding lo calcula después la cola de embeddings (o el backfill).
+        """
+        self._validate_business_rules(case_create)
+        vehicle_model = await self._resolve_vehicle_model(case_create.vehicle_model)
+
+        db_case = DiagnosisCase.model_validate(case_create)
+        db_case.vehicle_model = vehicle_model.name
+        db_case.vehicle_model_id = vehicle_model.id
+        db_case.embedding = None
+
+        self.session.add(db_case)
+        await self.session.commit()
+        # Sin vector aún, pero ya es visible para la búsqueda léxica
+        await search_cache.invalidate()
         return db_case
 
-    async def search_cases(self, search_params: SearchRequest) -> List[SearchResult]:
+    async def embedding_state(self, case_id: int) -> Optional[Tuple[bool, Optional[int]]]:
+        """(tiene embedding, caso canónico si es un casi duplicado) o None si no existe."""
+        result = await self.session.execute(
+            select(DiagnosisCase.embedding.is_not(None), DiagnosisCase.variant_of_id).where(DiagnosisCase.id == case_id)
+        )
+        row = result.first()
+        return (row[0], row[1]) if row is not None else None
+
+    async def is_searchable(self, case_id: int) -> Optional[bool]:
+        """True si el caso ya tiene embedding, False si está pendiente, None si no existe."""
+        result = await self.session.execute(
+            select(DiagnosisCase.embedding.is_not(None)).where(DiagnosisCase.id == case_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def create_cases_bulk(self, raw_cases: List[Dict[str, Any]]) -> BulkCreateResponse:
+        """
+        Carga masiva: valida cada fila por separado, agrupa en lotes de
+        EMBEDDING_BATCH_SIZE con una sola llamada de embeddings por lote y
+        persiste cada lote con un único INSERT multi-fila.
+        Las filas inválidas se reportan sin abortar el resto; si la IA no
+        responde, los casos se guardan con embedding NULL para backfill posterior.
+
+        Las filas que traen 'embedding' (p. ej. un NDJSON de GET /api/cases/export
+        con include_embeddings) se guardan con ese vector sin volver a
+        vectorizarlas, salvo que 'embedding_model' indique otro modelo.
+
+        Con DEDUP_MODE cada fila vectorizada se compara contra los casos ya
+        guardados (no contra las del mismo lote: eso lo resuelve el job offline).
+        """
+        report = BulkCreateResponse(received=len(raw_cases))
+
+        # 1. Validación por fila (esquema + reglas de negocio + modelo del catálogo)
+        valid: List[tuple[int, DiagnosisCaseCreate]] = []
+        vehicle_model_ids: Dict[int, int] = {}
+        provided_vectors: Dict[int, List[float]] = {}
+        for index, raw in enumerate(raw_cases):
+            try:
+                case_create = DiagnosisCaseCreate.model_validate(raw)
+                self._validate_business_rules(case_create)
+                vehicle_model = await self._resolve_vehicle_model(case_create.vehicle_model)
+                case_create.vehicle_model = vehicle_model.name
+                vehicle_model_ids[index] = vehicle_model.id
+                vector = self._provided_embedding(raw)
+                if vector is not None:
+                    provided_vectors[index] = vector
+            except ValidationError as e:
+                report.errors.append(BulkRowError(index=index, error=_format_validation_error(e)))
+            except HTTPException as e:
+                report.errors.append(BulkRowError(index=index, error=str(e.detail)))
+            else:
+                valid.append((index, case_create))
+
+        # 2. Lotes: embeddings multi-input + INSERT multi-fila
+        for start in range(0, len(valid), EMBEDDING_BATCH_SIZE):
+            chunk = valid[start:start + EMBEDDING_BATCH_SIZE]
+            # Solo se vectorizan las filas que no trajeron su vector
+            vectors = [provided_vectors.get(index) for index, _ in chunk]
+            missing = [position for position, vector in enumerate(vectors) if vector is None]
+            if missing:
+                computed = await self.ai_client.get_embeddings([
+                    build_embedding_text(chunk[p][1].problem_description, chunk[p][1].solution_description)
+                    for p in missing
+                ])
+                for position, vector in zip(missing, computed):
+                    vectors[position] = vector
+
+            variant_of: Dict[int, int] = {}
+            if DEDUP_MODE != "off":
+                chunk, vectors, variant_of = await self._dedup_chunk(chunk, vectors, vehicle_model_ids, report)
+                if not chunk:
+                    continue
+
+            created_at = datetime.utcnow()
+            rows = [
+                {
+                    **case_create.model_dump(mode="json"),
+                    "vehicle_model_id": vehicle_model_ids[index],
+                    "embedding": vector,
+                    "variant_of_id": variant_of.get(index),
+                    "created_at": created_at,
+                }
+                for (index, case_create), vector in zip(chunk, vectors)
+            ]
+
+            try:
+                result = await self.session.execute(
+                    insert(DiagnosisCase).values(rows).returning(DiagnosisCase.id)
+                )
+                ids = list(result.scalars().all())
+                await self.session.commit()
+            except SQLAlchemyError:
+                # Algo en el lote violó la DB: reintentamos fila por fila para aislarlo
+                await self.session.rollback()
+                ids = await self._insert_rows_individually(chunk, rows, report)
+                inserted = [row_id is not None for row_id in ids]
+                chunk = [item for item, ok in zip(chunk, inserted) if ok]
+                rows = [row for row, ok in zip(rows, inserted) if ok]
+                ids = [row_id for row_id in ids if row_id is not None]
+
+            report.ids.extend(ids)
+            report.inserted += len(ids)
+            neighbor_index.schedule(
+                row_id for row, row_id in zip(rows, ids)
+                if row["embedding"] is not None and row["variant_of_id"] is None
+            )
+            report.without_embedding += sum(1 for row in rows if row["embedding"] is None)
+            report.reused_embeddings += sum(1 for index, _ in chunk if index in provided_vectors)
+            report.variants += sum(1 for row in rows if row["variant_of_id"] is not None)
+
+        if report.inserted or report.merged:
+            await search_cache.invalidate()
+
+        report.failed = len(report.errors)
+        report.errors.sort(key=lambda e: e.index)
+        logger.info("📦 Carga masiva: %d/%d insertados (%d sin vector, %d con error, %d fusionados, %d variantes).",
+                    report.inserted, report.received, report.without_embedding, report.failed,
+                    report.merged, report.variants)
+        return report
+
+    async def _dedup_chunk(
+        self,
+        chunk: List[tuple[int, DiagnosisCaseCreate]],
+        vectors: List[Optional[List[float]]],
+        vehicle_model_ids: Dict[int, int],
+        report: BulkCreateResponse,
+    ) -> tuple[List[tuple[int, DiagnosisCaseCreate]], List[Optional[List[float]]], Dict[int, int]]:
+        """
+        Aplica DEDUP_MODE a un lote: las filas rechazadas pasan a errores y las
+        fusionadas se descuentan (el existente suma duplicate_count). Retorna el
+        lote restante y, por índice, el caso canónico de las variantes.
+        """
+        kept_chunk, kept_vectors = [], []
+        variant_of: Dict[int, int] = {}
+        merged = 0
+        for (index, case_create), vector in zip(chunk, vectors):
+            duplicate = await self._find_duplicate(vector, vehicle_model_ids[index], case_create.construction_group)
+            if duplicate is None:
+                kept_chunk.append((index, case_create))
+                kept_vectors.append(vector)
+                continue
+
+            existing_id, similarity = duplicate
+            if DEDUP_MODE == "reject":
+                DEDUP_TOTAL.labels(action="reject").inc()
+                report.errors.append(BulkRowError(
+                    index=index, error=f"Caso casi duplicado de #{existing_id} (similitud {similarity:.3f})"
+                ))
+            elif DEDUP_MODE == "merge":
+                await merge_into(self.session, existing_id)
+                merged += 1
+            else:
+                DEDUP_TOTAL.labels(action="variant").inc()
+                variant_of[index] = existing_id
+                kept_chunk.append((index, case_create))
+                kept_vectors.append(vector)
+
+        if merged:
+            # Confirmadas aparte: el reintento fila por fila del INSERT hace rollback
+            await self.session.commit()
+            report.merged += merged
+        return kept_chunk, kept_vectors, variant_of
+
+    def _provided_embedding(self, raw: Dict[str, Any]) -> Optional[List[float]]:
+        """Vector incluido en la fila (validado) o None si hay que generarlo."""
+        embedding = raw.get("embedding")
+        if embedding is None:
+            return None
+        model = raw.get("embedding_model")
+        if model and model != self.ai_client.model:
+            # Vector de otro modelo: no es comparable con los de esta base
+            return None
+        if (
+            not isinstance(embedding, list)
+            or len(embedding) != EMBEDDING_DIMENSIONS
+            or not all(isinstance(value, (int, float)) for value in embedding)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"embedding: se esperaba una lista de {EMBEDDING_DIMENSIONS} números"
+            )
+        return embedding
+
+    async def _insert_rows_individually(
+        self,
+        chunk: List[tuple[int, DiagnosisCaseCreate]],
+        rows: List[Dict[str, Any]],
+        report: BulkCreateResponse,
+    ) -> List[Any]:
+        ids: List[Any] = []
+        for (index, _), row in zip(chunk, rows):
+            try:
+                result = await self.session.execute(
+                    insert(DiagnosisCase).values(row).returning(DiagnosisCase.id)
+                )
+                ids.append(result.scalar_one())
+                await self.session.commit()
+            except SQLAlchemyError as e:
+                await self.session.rollback()
+                report.errors.append(BulkRowError(index=index, error=str(e.__cause__ or e).splitlines()[0]))
+                ids.append(None)
+        return ids
+
+    async def _resolve_vehicle_model(self, name: str) -> VehicleModel:
+        """
+        Modelo del catálogo (nombre canónico + id). Un modelo desconocido se
+        registra al vuelo, o se rechaza con 422 si VEHICLE_MODELS_STRICT.
+        """
+        if not clean_name(name):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="vehicle_model: el modelo de vehículo no puede estar vacío"
+            )
+        vehicle_model = await vehicle_model_catalog.resolve(name)
+        if vehicle_model is not None:
+            return vehicle_model
+        if VEHICLE_MODELS_STRICT:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Modelo de vehículo desconocido: '{name}' (ver GET /api/cases/models)"
+            )
+        return await vehicle_model_catalog.register(name)
+
+    def _validate_business_rules(self, case_create: DiagnosisCaseCreate) -> None:
+        current_year = datetime.now().year
+        if case_create.year < 1950 or case_create.year > current_year + 1:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"El año debe estar entre 1950 y {current_year + 1}"
+            )
+
+    async def search_cases(self, search_params: SearchRequest) -> SearchPage:
         """
         Motor de Búsqueda Híbrido V2 (Corregido):
         Retorna el SCORE REAL de similitud (0 a 1) e ignora registros con embedding NULL.
+        Sin vector, cae a full-text (tsvector + GIN) con score ts_rank_cd normalizado.
+        En modo 'hybrid' ambas estrategias corren en paralelo y se fusionan.
+
+        Paginación keyset: cada página devuelve un cursor opaco (clave de orden + id)
+        que se envía en la siguiente request para continuar donde terminó la anterior.
+
+        Las requests repetidas se responden desde la caché de resultados
+        (invalidada por generación en cada escritura).
+        """
+        with observe_stage("cache"):
+            cache_key = await search_cache.key_for(search_params, self.ai_client.model)
+            cached = await search_cache.get(cache_key)
+        if cached is not None:
+            SEARCH_PATH_TOTAL.labels(path="cache_hit").inc()
+            return cached
+
+        self._vector_unavailable = False
+        page = await self._run_search(search_params)
+        # Una respuesta degradada (IA caída -> solo léxica) no se cachea:
+        # en cuanto vuelva el proveedor se debe recalcular
+        if not self._vector_unavailable:
+            await search_cache.set(cache_key, page)
+        return page
+
+    async def _run_search(self, search_params: SearchRequest) -> SearchPage:
+        mode = search_params.mode
+        cursor = decode_cursor(search_params.cursor) if search_params.cursor else None
+        # Estrategia que efectivamente corrió (en 'auto' puede caer a léxica):
+        # define el tamaño de página contra el que se decide si hay más resultados
+        strategy = mode
+
+        if mode == SearchMode.HYBRID:
+            hits = await self._hybrid_search(search_params, cursor)
+        elif mode == SearchMode.LEXICAL:
+            SEARCH_PATH_TOTAL.labels(path="lexical").inc()
+            hits = await self._lexical_search(self.session, search_params, cursor)
+        else:
+            with observe_stage("embedding"):
+                search_vector = await self.ai_client.get_embedding(search_params.query)
+
+            # ESTRATEGIA 1: BÚSQUEDA VECTORIAL (SI HAY VECTOR)
+            if search_vector:
+                SEARCH_PATH_TOTAL.labels(path="vector").inc()
+                strategy = SearchMode.VECTOR
+                logger.debug("🔍 Búsqueda Semántica (Vector) para: '%s'", search_params.query)
+                hits = await self._vector_search(self.session, search_vector, search_params, cursor)
+
+            elif mode == SearchMode.VECTOR:
+                # Solo semántica pedida explícitamente: sin vector no hay resultados
+                SEARCH_PATH_TOTAL.labels(path="vector_unavailable").inc()
+                self._vector_unavailable = True
+                hits = []
+
+            # ESTRATEGIA 2: FALLBACK TEXTO (SI FALLA IA, CIRCUITO ABIERTO O NO HAY VECTOR)
+            else:
+                SEARCH_PATH_TOTAL.labels(path="lexical_fallback").inc()
+                strategy = SearchMode.LEXICAL
+                self._vector_unavailable = True
+                logger.info("⚠️ Fallback: Búsqueda de Texto (full-text)")
+                hits = await self._lexical_search(self.session, search_params, cursor)
+
+        results = [result for result, _ in hits]
+        if search_params.snippet and results:
+            await self._attach_snippets(results, search_params.query)
+
+        # Cursor solo si la página vino completa (puede haber más resultados)
+        next_cursor = None
+        if hits and len(hits) == self._page_size(search_params, strategy):
+            last_result, last_key = hits[-1]
+            offset = (cursor or {}).get("n", 0) + len(hits)
+            next_cursor = encode_cursor(last_key, last_result.id, offset)
+
+        return SearchPage(results=results, next_cursor=next_cursor)
+
+    def _page_size(self, search_params: SearchRequest, mode: SearchMode) -> int:
+        """Resultados por página: el límite pedido o el default de la estrategia."""
+        if search_params.limit:
+            return search_params.limit
+        return LEXICAL_LIMIT if mode == SearchMode.LEXICAL else VECTOR_LIMIT
+
+    async def _hybrid_search(self, search_params: SearchRequest, cursor: Optional[dict]) -> List[Hit]:
+        """
+        Ejecuta la pierna vectorial (embedding + ANN) y la léxica (full-text) a la vez,
+        cada una en su propia conexión (réplica de lectura si existe):
+        la latencia total es max(vector, léxica).
         """
-        results = []
-        search_vector = await self.ai_client.get_embedding(search_params.query)
+        logger.debug("🔀 Búsqueda Híbrida (%s) para: '%s'", search_params.fusion.value, search_params.query)
+        page_size = self._page_size(search_params, SearchMode.HYBRID)
 
-        # ESTRATEGIA 1: BÚSQUEDA VECTORIAL (SI HAY VECTOR)
-        if search_vector:
-            print(f"🔍 Búsqueda Semántica (Vector) para: '{search_params.query}'")
-            
-            # Calcular distancia coseno en la DB
-            distance_col = DiagnosisCase.embedding.cosine_distance(search_vector)
-            
-            statement = select(DiagnosisCase, distance_col)
+        # Cada pierna aporta suficientes candidatos para cubrir hasta el final de esta página
+        depth = max(HYBRID_CANDIDATES, (cursor or {}).get("n", 0) + page_size)
+        leg_params = search_params.model_copy(update={"limit": depth})
+
+        async def vector_leg() -> List[Hit]:
+            with observe_stage("embedding"):
+                search_vector = await self.ai_client.get_embedding(search_params.query)
+            if not search_vector:
+                self._vector_unavailable = True
+                return []
+            async with async_read_session() as session:
+                return await self._vector_search(session, search_vector, leg_params, None)
+
+        async def lexical_leg() -> List[Hit]:
+            async with async_read_session() as session:
+                return await self._lexical_search(session, leg_params, None)
+
+        vector_hits, lexical_hits = await asyncio.gather(vector_leg(), lexical_leg())
+
+        if not vector_hits:
+            # IA caída o sin vectores: la pierna léxica ya es el fallback
+            SEARCH_PATH_TOTAL.labels(path="hybrid_lexical_only").inc()
+            fused = lexical_hits
+        else:
+            SEARCH_PATH_TOTAL.labels(path="hybrid").inc()
+            # Clave de orden del ranking fusionado = score fusionado
+            fused = [
+                (result, result.score)
+                for result in fuse_results(
+                    [
+                        ([r for r, _ in vector_hits], search_params.vector_weight),
+                        ([r for r, _ in lexical_hits], search_params.lexical_weight),
+                    ],
+                    search_params.fusion,
+                    search_params.rrf_k,
+                )
+            ]
+
+        if cursor:
+            # Keyset sobre el ranking fusionado: (score desc, id asc)
+            fused = [
+                (result, key) for result, key in fused
+                if key < cursor["k"] or (key == cursor["k"] and result.id > cursor["i"])
+            ]
+        return fused[:page_size]
+
+    async def _apply_filters(self, statement, search_params: SearchRequest):
+        """
+        Filtros indexables (B-tree sobre vehicle_model_id, construction_group, year):
+        el filtro de modelo se resuelve por prefijo contra el catálogo ('Golf' ->
+        Golf, Golf GTI, Golf R) y se aplica como igualdad / IN sobre el id.
+        """
+        if search_params.model_filter:
+            model_ids = await vehicle_model_catalog.match_prefix(search_params.model_filter)
+            if not model_ids:
+                # Ningún modelo coincide: la consulta no devuelve filas sin tocar la tabla
+                statement = statement.where(false())
+            elif len(model_ids) == 1:
+                statement = statement.where(DiagnosisCase.vehicle_model_id == model_ids[0])
+            else:
+                statement = statement.where(DiagnosisCase.vehicle_model_id.in_(model_ids))
+        if search_params.group_filter:
+            statement = statement.where(DiagnosisCase.construction_group == search_params.group_filter)
+        # Las variantes (casi duplicados enlazados a su caso canónico) no se listan
+        statement = statement.where(DiagnosisCase.variant_of_id.is_(None))
+        return statement
 
+    def _result_columns(self, search_params: SearchRequest) -> list:
+        """Proyección: en modo 'summary' no se leen ni serializan los textos largos."""
+        columns = [
+            DiagnosisCase.id,
+            DiagnosisCase.title,
+            DiagnosisCase.vehicle_model,
+            DiagnosisCase.year,
+            DiagnosisCase.construction_group,
+        ]
+        if search_params.fields == SearchFields.FULL:
+            columns += [DiagnosisCase.problem_description, DiagnosisCase.solution_description]
+        return columns
+
+    async def _vector_search(
+        self,
+        session: AsyncSession,
+        search_vector: Union[List[float], ColumnElement],
+        search_params: SearchRequest,
+        cursor: Optional[dict],
+        exclude_id: Optional[int] = None,
+    ) -> List[Hit]:
+        limit = self._page_size(search_params, SearchMode.VECTOR)
+
+        # Calcular distancia coseno en la DB
+        distance_col = DiagnosisCase.embedding.cosine_distance(search_vector).label("distance")
+        
+        statement = select(*self._result_columns(search_params), distance_col)
+
+        # Candidatos que debe entregar el índice ANN para cubrir esta página
+        depth = (cursor or {}).get("n", 0) + limit
+
+        if vector_index.uses_rerank():
+            # --- RE-RANKING: 1ª pasada sobre el índice comprimido (halfvec / binario),
+            # 2ª pasada con la distancia coseno exacta sobre los vectores completos ---
+            depth = max(RERANK_DEPTH, depth)
+            candidates = select(DiagnosisCase.id, DiagnosisCase.construction_group).where(
+                DiagnosisCase.embedding.is_not(None)
+            )
+            candidates = await self._apply_filters(candidates, search_params)
+            if exclude_id is not None:
+                candidates = candidates.where(DiagnosisCase.id != exclude_id)
+            candidates = (
+                candidates.order_by(vector_index.coarse_distance(search_vector)).limit(depth).subquery("candidates")
+            )
+            statement = statement.join(candidates, and_(
+                DiagnosisCase.id == candidates.c.id,
+                DiagnosisCase.construction_group == candidates.c.construction_group,
+            ))
+        else:
             # --- CORRECCIÓN CRÍTICA ---
             # Solo comparamos contra casos que TIENEN vector.
             # Esto evita que 'dist' sea None y rompa la matemática.
@@ -74,68 +597,305 @@ class CaseService:
             # --------------------------
 
             # --- FILTROS ---
-            if search_params.model_filter:
-                statement = statement.where(DiagnosisCase.vehicle_model.ilike(f"%{search_params.model_filter}%"))
-            if search_params.group_filter:
-                statement = statement.where(DiagnosisCase.construction_group == search_params.group_filter)
+            statement = await self._apply_filters(statement, search_params)
+            if exclude_id is not None:
+                statement = statement.where(DiagnosisCase.id != exclude_id)
+
+        # --- PAGINACIÓN KEYSET: (distancia asc, id asc) ---
+        if cursor:
+            statement = statement.where(or_(
+                distance_col > cursor["k"],
+                and_(distance_col == cursor["k"], DiagnosisCase.id > cursor["i"]),
+            ))
+
+        # Ordenar: Menor distancia = Mayor similitud
+        # (solo por distancia: un segundo criterio impediría usar el índice ANN;
+        # los empates exactos de distancia entre floats son despreciables)
+        statement = statement.order_by(distance_col).limit(limit)
 
-            # Ordenar: Menor distancia = Mayor similitud
-            statement = statement.order_by(distance_col).limit(5)
+        # Recall del índice ANN (ef_search / probes) solo para esta transacción.
+        # HNSW no devuelve más de ef_search filas: en páginas profundas (o con
+        # re-ranking) necesita explorar al menos 'depth' candidatos.
+        ef_search = search_params.ef_search
+        if cursor or vector_index.uses_rerank():
+            ef_search = min(1000, max(ef_search or HNSW_EF_SEARCH, depth))
+        # El escaneo iterativo ya viene activo en la conexión (variant_of_id IS NULL
+        # filtra siempre); solo se envía algo si ef_search / probes cambian
+        await apply_search_params(session, ef_search, search_params.probes)
 
-            # Ejecutar
-            exec_result = await self.session.execute(statement)
-            rows = exec_result.all()
+        # Ejecutar
+        with observe_stage("db_query"):
+            exec_result = await session.execute(statement)
+            rows = exec_result.mappings().all()
 
-            for case, dist in rows:
+        with observe_stage("hydration"):
+            hits = []
+            for row in rows:
+                dist = row["distance"]
                 # Si por alguna razón remota sigue llegando None, usamos 1.0 (distancia máxima/sin similitud)
                 safe_dist = dist if dist is not None else 1.0
                 
                 # La distancia coseno va de 0 (idéntico) a 2 (opuesto).
                 similarity = max(0, 1 - safe_dist)
                 
-                results.append(SearchResult(
-                    id=case.id,
-                    title=case.title,
-                    vehicle_model=case.vehicle_model,
-                    year=case.year,
-                    construction_group=case.construction_group,
-                    problem_description=case.problem_description,
-                    solution_description=case.solution_description,
-                    score=similarity 
-                ))
+                hits.append((_to_search_result(row, similarity), safe_dist))
 
-        # ESTRATEGIA 2: FALLBACK TEXTO (SI FALLA IA O NO HAY VECTOR)
-        else:
-            print(f"⚠️ Fallback: Búsqueda de Texto (LIKE)")
-            statement = select(DiagnosisCase)
-            
-            # Filtros
-            if search_params.model_filter:
-                statement = statement.where(DiagnosisCase.vehicle_model.ilike(f"%{search_params.model_filter}%"))
-            if search_params.group_filter:
-                statement = statement.where(DiagnosisCase.construction_group == search_params.group_filter)
-            
-            # Búsqueda de texto simple (ILIKE)
-            statement = statement.where(
-                or_(
-                    DiagnosisCase.problem_description.ilike(f"%{search_params.query}%"),
-                    DiagnosisCase.solution_description.ilike(f"%{search_params.query}%")
-                )
-            ).limit(10)
-            
-            exec_result = await self.session.execute(statement)
-            cases = exec_result.scalars().all()
-            
-            for case in cases:
-                results.append(SearchResult(
-                    id=case.id,
-                    title=case.title,
-                    vehicle_model=case.vehicle_model,
-                    year=case.year,
-                    construction_group=case.construction_group,
-                    problem_description=case.problem_description,
-                    solution_description=case.solution_description,
-                    score=0.5 
-                ))
+            # Con escaneo iterativo 'relaxed_order' el índice puede entregar filas
+            # levemente desordenadas: se reordena la página (barato, son pocas filas)
+            hits.sort(key=lambda hit: hit[1])
+        return hits
+
+    async def _lexical_search(
+        self,
+        session: AsyncSession,
+        search_params: SearchRequest,
+        cursor: Optional[dict],
+    ) -> List[Hit]:
+        limit = self._page_size(search_params, SearchMode.LEXICAL)
+
+        rank_col = text_search.rank_expression(search_params.query).label("rank")
+        statement = select(*self._result_columns(search_params), rank_col)
+        
+        # Filtros
+        statement = await self._apply_filters(statement, search_params)
+        
+        # Full-text (tsvector + GIN) y trigramas para códigos
+        statement = statement.where(text_search.match_condition(search_params.query))
+
+        # Paginación keyset: (rank desc, id asc)
+        if cursor:
+            statement = statement.where(or_(
+                rank_col < cursor["k"],
+                and_(rank_col == cursor["k"], DiagnosisCase.id > cursor["i"]),
+            ))
+
+        # Rankeado por relevancia
+        statement = statement.order_by(rank_col.desc(), DiagnosisCase.id).limit(limit)
+        
+        with observe_stage("db_query"):
+            exec_result = await session.execute(statement)
+            rows = exec_result.mappings().all()
+        
+        with observe_stage("hydration"):
+            hits = []
+            for row in rows:
+                rank = float(row["rank"] or 0.0)
+                hits.append((_to_search_result(row, rank), rank))
+        return hits
+
+    async def _attach_snippets(self, results: List[SearchResult], query: str) -> None:
+        """
+        Fragmento resaltado (<mark>) por resultado. Se calcula en una consulta
+        aparte solo para los IDs de la página: ts_headline es caro y no debe
+        evaluarse sobre todos los candidatos. El texto se escapa antes de
+        insertar los <mark> (el cliente puede renderizarlo como HTML).
+        """
+        headline_col = text_search.headline_expression(query)
+        with observe_stage("snippets"):
+            exec_result = await self.session.execute(
+                select(DiagnosisCase.id, headline_col).where(DiagnosisCase.id.in_([r.id for r in results]))
+            )
+            snippets = dict(exec_result.all())
+        for result in results:
+            fragment = snippets.get(result.id)
+            result.snippet = text_search.render_headline(fragment) if fragment is not None else None
+
+    async def similar_cases(self, case_id: int, search_params: SearchRequest) -> List[SearchResult]:
+        """
+        Casos parecidos a uno existente, con su vector ya guardado: sin llamada a la IA.
+        Sin filtros (y con NEIGHBORS_PRECOMPUTE) se responde desde las listas
+        precalculadas; si no, ANN en vivo con los mismos filtros que la búsqueda.
+        El caso mismo nunca aparece en el resultado.
+        """
+        searchable = await self.is_searchable(case_id)
+        if searchable is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Caso no encontrado")
+        if not searchable:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El caso todavía no tiene embedding (ver GET /api/cases/{id}/status)"
+            )
+
+        filtered = bool(search_params.model_filter or search_params.group_filter)
+        if not filtered:
+            precomputed = await self._precomputed_neighbors([case_id], search_params)
+            if case_id in precomputed:
+                SEARCH_PATH_TOTAL.labels(path="similar_precomputed").inc()
+                return precomputed[case_id]
+
+        SEARCH_PATH_TOTAL.labels(path="similar").inc()
+        hits = await self._similar_hits(self.session, case_id, search_params)
+        return [result for result, _ in hits]
+
+    async def similar_cases_batch(self, request: SimilarCasesRequest) -> List[SimilarCases]:
+        """
+        Variante por lotes: una sola lectura de las listas precalculadas para
+        todos los IDs; los que no tengan lista (o si está desactivado) van por ANN.
+        IDs inexistentes o sin embedding devuelven una lista vacía.
+        """
+        search_params = SearchRequest(query="", limit=request.limit, fields=request.fields)
+        case_ids = list(dict.fromkeys(request.ids))
+        precomputed = await self._precomputed_neighbors(case_ids, search_params)
+
+        response = []
+        for case_id in case_ids:
+            if case_id in precomputed:
+                SEARCH_PATH_TOTAL.labels(path="similar_precomputed").inc()
+                results = precomputed[case_id]
+            elif await self.is_searchable(case_id):
+                SEARCH_PATH_TOTAL.labels(path="similar").inc()
+                results = [result for result, _ in await self._similar_hits(self.session, case_id, search_params)]
+            else:
+                results = []
+            response.append(SimilarCases(id=case_id, results=results))
+        return response
+
+    async def _similar_hits(self, session: AsyncSession, case_id: int, search_params: SearchRequest) -> List[Hit]:
+        """ANN con el embedding guardado del caso como vector de consulta (subconsulta, sin round trip extra)."""
+        stored_vector = (
+            select(DiagnosisCase.embedding).where(DiagnosisCase.id == case_id).limit(1).scalar_subquery()
+        )
+        return await self._vector_search(session, stored_vector, search_params, None, exclude_id=case_id)
+
+    async def _precomputed_neighbors(
+        self, case_ids: List[int], search_params: SearchRequest
+    ) -> Dict[int, List[SearchResult]]:
+        """Listas de case_neighbors por caso (vacío si están desactivadas o no alcanzan el límite)."""
+        limit = self._page_size(search_params, SearchMode.VECTOR)
+        if not neighbor_index.enabled or limit > NEIGHBORS_K:
+            return {}
+
+        exec_result = await self.session.execute(
+            select(CaseNeighbor.case_id.label("source_id"), CaseNeighbor.distance, *self._result_columns(search_params))
+            .join(DiagnosisCase, DiagnosisCase.id == CaseNeighbor.neighbor_id)
+            .where(CaseNeighbor.case_id.in_(case_ids), DiagnosisCase.variant_of_id.is_(None))
+            .order_by(CaseNeighbor.case_id, CaseNeighbor.distance)
+        )
+        neighbors: Dict[int, List[SearchResult]] = {}
+        for row in exec_result.mappings().all():
+            results = neighbors.setdefault(row["source_id"], [])
+            if len(results) < limit:
+                results.append(_to_search_result(row, max(0, 1 - row["distance"])))
+        return neighbors
+
+    async def get_case(self, case_id: int) -> DiagnosisCaseRead:
+        """Detalle completo de un caso (sin el vector)."""
+        exec_result = await self.session.execute(
+            select(DiagnosisCase).options(*LEAN_CASE_OPTIONS).where(DiagnosisCase.id == case_id)
+        )
+        case = exec_result.scalar_one_or_none()
+        if case is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Caso no encontrado")
+        return DiagnosisCaseRead.model_validate(case)
+
+    async def measure_recall(self, sample_size: int, k: int) -> dict:
+        """
+        Recall@k de la búsqueda vectorial tal como está configurada (índice,
+        compresión, re-ranking) frente al k-NN exacto (Seq Scan sin índice),
+        usando como consultas vectores ya guardados.
+        """
+        result = await self.session.execute(
+            select(DiagnosisCase.embedding)
+            .where(DiagnosisCase.embedding.is_not(None))
+            .order_by(func.random())
+            .limit(sample_size)
+        )
+        queries = [vector.tolist() if hasattr(vector, "tolist") else list(vector) for vector in result.scalars().all()]
+        params = SearchRequest(query="", limit=k, fields=SearchFields.SUMMARY)
+
+        matched = 0
+        for query_vector in queries:
+            async with async_session() as session:
+                async with session.begin():
+                    approx = await self._vector_search(session, query_vector, params, None)
+
+            async with async_session() as session:
+                async with session.begin():
+                    await session.execute(text("SET LOCAL enable_indexscan = off"))
+                    await session.execute(text("SET LOCAL enable_bitmapscan = off"))
+                    exact = await session.execute(
+                        select(DiagnosisCase.id)
+                        .where(DiagnosisCase.embedding.is_not(None), DiagnosisCase.variant_of_id.is_(None))
+                        .order_by(DiagnosisCase.embedding.cosine_distance(query_vector))
+                        .limit(k)
+                    )
+                    exact_ids = set(exact.scalars().all())
+
+            matched += len(exact_ids & {hit.id for hit, _ in approx})
+
+        total = len(queries) * k
+        return {
+            "sample": len(queries),
+            "k": k,
+            "recall": round(matched / total, 4) if total else None,
+            "index_type": vector_index.VECTOR_INDEX_TYPE,
+            "compression": vector_index.EMBEDDING_COMPRESSION,
+            "rerank_depth": RERANK_DEPTH if vector_index.uses_rerank() else None,
+        }
+
+def fuse_results(
+    ranked_lists: List[Tuple[List[SearchResult], float]],
+    method: FusionMethod,
+    rrf_k: int = 60,
+) -> List[SearchResult]:
+    """
+    Fusiona listas rankeadas (cada una con su peso) en un único ranking.
+    - RRF: score = Σ peso / (k + posición). Robusto ante escalas distintas de score.
+    - WEIGHTED: score = Σ peso * score_original.
+    En ambos casos el resultado se normaliza a [0, 1] dividiendo por el máximo posible.
+    """
+    fused: Dict[int, float] = {}
+    by_id: Dict[int, SearchResult] = {}
+
+    for results, weight in ranked_lists:
+        for position, result in enumerate(results, start=1):
+            if method == FusionMethod.RRF:
+                contribution = weight / (rrf_k + position)
+            else:
+                contribution = weight * result.score
+            fused[result.id] = fused.get(result.id, 0.0) + contribution
+            by_id.setdefault(result.id, result)
+
+    if method == FusionMethod.RRF:
+        max_score = sum(weight / (rrf_k + 1) for _, weight in ranked_lists)
+    else:
+        max_score = sum(weight for _, weight in ranked_lists)
+
+    ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+    return [
+        by_id[case_id].model_copy(update={"score": score / max_score if max_score else 0.0})
+        for case_id, score in ranked
+    ]
+
+
+def _to_search_result(row, score: float) -> SearchResult:
+    return SearchResult(
+        id=row["id"],
+        title=row["title"],
+        vehicle_model=row["vehicle_model"],
+        year=row["year"],
+        construction_group=row["construction_group"],
+        problem_description=row.get("problem_description"),
+        solution_description=row.get("solution_description"),
+        score=score,
+    )
+
+
+def encode_cursor(sort_key: float, case_id: int, offset: int) -> str:
+    """Cursor opaco: clave de orden + id del último resultado + resultados ya entregados."""
+    payload = json.dumps({"k": sort_key, "i": case_id, "n": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {"k": float(data["k"]), "i": int(data["i"]), "n": int(data["n"])}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
 
-        return results
\ No newline at end of file
+def _format_validation_error(error: ValidationError) -> str:
+    """Resumen legible de un ValidationError de Pydantic: 'campo: mensaje; ...'."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
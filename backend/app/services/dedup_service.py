@@ -0,0 +1,235 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+from sqlalchemy import select, update
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.database import async_session
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.core.metrics import DEDUP_TOTAL
+from app.core.search_cache import search_cache
+from app.models import DiagnosisCase
+
+# Comportamiento ante un casi duplicado al crear un caso:
+#   'off'     -> se inserta siempre (sin consulta extra)
+#   'reject'  -> 409 con el id del caso existente
+#   'merge'   -> no se inserta; el existente suma duplicate_count
+#   'variant' -> se inserta con variant_of_id = existente (fuera de la búsqueda)
+# En POST /api/cases/async el vector llega después del 202: ahí 'reject' se
+# comporta como 'merge' (ver resolve_deferred_duplicate).
+DEDUP_MODE = os.getenv("DEDUP_MODE", "off").lower()
+# Similitud coseno (1 - distancia) a partir de la cual dos casos son el mismo
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.95"))
+
+# Job offline: casos por lote y vecinos revisados por caso
+DEDUP_BATCH_SIZE = int(os.getenv("DEDUP_BATCH_SIZE", "200"))
+DEDUP_CLUSTER_CANDIDATES = int(os.getenv("DEDUP_CLUSTER_CANDIDATES", "20"))
+
+if DEDUP_MODE not in ("off", "reject", "merge", "variant"):
+    raise ValueError(f"FATAL: DEDUP_MODE inválido: '{DEDUP_MODE}' (usar 'off', 'reject', 'merge' o 'variant').")
+
+logger = logging.getLogger(__name__)
+
+# (id del caso existente, similitud)
+Duplicate = Tuple[int, float]
+
+
+async def find_near_duplicates(
+    session: AsyncSession,
+    query_vector: Union[List[float], ColumnElement],
+    vehicle_model_id: int,
+    construction_group: str,
+    exclude_id: Optional[int] = None,
+    min_id: Optional[int] = None,
+    limit: int = 1,
+) -> List[Duplicate]:
+    """
+    Casos canónicos (no variantes) del mismo modelo y grupo con similitud
+    >= DEDUP_THRESHOLD, del más parecido al menos parecido.
+
+    Distancia exacta, sin el índice ANN: un ANN puede saltarse justo el
+    duplicado y con el filtro (vehicle_model_id, construction_group) el
+    conjunto comparado es chico (una partición, vía el B-tree de filtros).
+    """
+    distance_col = DiagnosisCase.embedding.cosine_distance(query_vector).label("distance")
+    statement = select(DiagnosisCase.id, distance_col).where(
+        DiagnosisCase.embedding.is_not(None),
+        DiagnosisCase.variant_of_id.is_(None),
+        DiagnosisCase.vehicle_model_id == vehicle_model_id,
+        DiagnosisCase.construction_group == construction_group,
+    )
+    if exclude_id is not None:
+        statement = statement.where(DiagnosisCase.id != exclude_id)
+    if min_id is not None:
+        statement = statement.where(DiagnosisCase.id > min_id)
+    # '+ 0': el ORDER BY deja de coincidir con el operador del índice HNSW/IVFFlat,
+    # así que el planner no puede usarlo (scan exacto sobre las filas filtradas)
+    statement = statement.order_by(distance_col + 0).limit(limit)
+
+    result = await session.execute(statement)
+
+    max_distance = 1 - DEDUP_THRESHOLD
+    return [(case_id, 1 - distance) for case_id, distance in result.all() if distance is not None and distance <= max_distance]
+
+
+async def merge_into(session: AsyncSession, existing_id: int) -> None:
+    """Fusiona un alta casi idéntica: el caso existente suma una confirmación (sin commit)."""
+    await session.execute(
+        update(DiagnosisCase)
+        .where(DiagnosisCase.id == existing_id)
+        .values(duplicate_count=DiagnosisCase.duplicate_count + 1)
+    )
+    DEDUP_TOTAL.labels(action="merge").inc()
+
+
+async def resolve_deferred_duplicate(
+    session: AsyncSession,
+    case_id: int,
+    vector: List[float],
+    vehicle_model_id: Optional[int],
+    construction_group: str,
+) -> Optional[int]:
+    """
+    DEDUP_MODE al adjuntar el vector a un caso ya guardado (cola de
+    POST /api/cases/async y backfill). Retorna el caso canónico si es un casi
+    duplicado (para guardarlo en variant_of_id) o None.
+
+    El caso ya fue aceptado con 202 y su id entregado: no se puede rechazar ni
+    borrar. Con 'reject' y 'merge' el existente suma duplicate_count y el caso
+    nuevo queda como variante (fuera de la búsqueda); con 'variant' solo se
+    enlaza. GET /api/cases/{id}/status lo informa como 'duplicate'.
+    """
+    if DEDUP_MODE == "off" or vehicle_model_id is None:
+        return None
+    duplicates = await find_near_duplicates(
+        session, vector, vehicle_model_id, construction_group, exclude_id=case_id
+    )
+    if not duplicates:
+        return None
+
+    existing_id, _ = duplicates[0]
+    if DEDUP_MODE == "variant":
+        DEDUP_TOTAL.labels(action="variant").inc()
+    else:
+        await merge_into(session, existing_id)
+    return existing_id
+
+
+class DedupJob:
+    """
+    Job offline de deduplicación sobre la tabla existente (agrupamiento greedy).
+
+    Recorre los casos canónicos por id en lotes; cada caso todavía canónico es
+    el "líder" de su grupo y los casi duplicados más nuevos (id mayor, mismo
+    modelo y grupo) pasan a ser variantes suyas (variant_of_id). No borra nada:
+    las variantes solo dejan de aparecer en la búsqueda y se revierten con
+    UPDATE diagnosis_cases SET variant_of_id = NULL.
+    """
+
+    def __init__(self, batch_size: int = DEDUP_BATCH_SIZE, candidates: int = DEDUP_CLUSTER_CANDIDATES):
+        self.batch_size = batch_size
+        self.candidates = candidates
+        self._lock = asyncio.Lock()
+        self.status: dict = {
+            "running": False, "dry_run": None, "started_at": None, "finished_at": None,
+            "scanned": 0, "clusters": 0, "variants": 0, "error": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def run(self, dry_run: bool = False) -> dict:
+        async with self._lock:
+            self.status.update(
+                running=True, dry_run=dry_run, started_at=datetime.utcnow(), finished_at=None,
+                scanned=0, clusters=0, variants=0, error=None,
+            )
+            try:
+                last_id = 0
+                while True:
+                    last_id = await self._run_batch(last_id, dry_run)
+                    if last_id is None:
+                        break
+            except Exception as e:
+                self.status["error"] = str(e)
+                raise
+            finally:
+                self.status.update(running=False, finished_at=datetime.utcnow())
+                logger.info("🧹 Dedup%s: %d casos revisados, %d grupos, %d variantes.",
+                            " (dry run)" if dry_run else "", self.status["scanned"],
+                            self.status["clusters"], self.status["variants"])
+            return self.status
+
+    async def _run_batch(self, last_id: int, dry_run: bool) -> Optional[int]:
+        """Procesa un lote de líderes (id > last_id). Retorna el último id o None al terminar."""
+        linked = 0
+        async with async_session() as session:
+            result = await session.execute(
+                select(DiagnosisCase.id, DiagnosisCase.vehicle_model_id, DiagnosisCase.construction_group)
+                .where(
+                    DiagnosisCase.id > last_id,
+                    DiagnosisCase.embedding.is_not(None),
+                    DiagnosisCase.variant_of_id.is_(None),
+                )
+                .order_by(DiagnosisCase.id)
+                .limit(self.batch_size)
+            )
+            leaders = result.all()
+            if not leaders:
+                return None
+
+            marked: set = set()
+            for case_id, vehicle_model_id, construction_group in leaders:
+                self.status["scanned"] += 1
+                if case_id in marked or vehicle_model_id is None:
+                    continue
+
+                stored_vector = select(DiagnosisCase.embedding).where(DiagnosisCase.id == case_id).limit(1).scalar_subquery()
+                duplicates = await find_near_duplicates(
+                    session, stored_vector, vehicle_model_id, construction_group,
+                    min_id=case_id, limit=self.candidates,
+                )
+                variant_ids = [dup_id for dup_id, _ in duplicates if dup_id not in marked]
+                if not variant_ids:
+                    continue
+
+                self.status["clusters"] += 1
+                self.status["variants"] += len(variant_ids)
+                marked.update(variant_ids)
+                if not dry_run:
+                    await session.execute(
+                        update(DiagnosisCase).where(DiagnosisCase.id.in_(variant_ids)).values(variant_of_id=case_id)
+                    )
+                    linked += len(variant_ids)
+
+            if dry_run:
+                await session.rollback()
+            else:
+                await session.commit()
+
+        if linked:
+            # Las variantes salen de los resultados
+            await search_cache.invalidate()
+            DEDUP_TOTAL.labels(action="job_variant").inc(linked)
+        return leaders[-1][0]
+
+
+# Instancia del proceso web (disparada desde POST /api/admin/dedup/run)
+dedup_job = DedupJob()
+
+
+# --- Proceso standalone: python -m app.services.dedup_service [--dry-run] ---
+if __name__ == "__main__":
+    import sys
+
+    async def main():
+        setup_logging()
+        await dedup_job.run(dry_run="--dry-run" in sys.argv)
+
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_logging()
@@ -0,0 +1,287 @@
+import os
+import time
+import logging
+import random
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import select, update, func, or_
+from app.core.ai_client import AIClient, get_ai_client
+from app.core.database import async_session
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.core.search_cache import search_cache
+from app.models import DiagnosisCase
+from app.services.case_service import build_embedding_text
+from app.services.case_neighbors import neighbor_index
+from app.services.dedup_service import resolve_deferred_duplicate
+
+# --- CONFIGURACIÓN ---
+EMBEDDING_BACKFILL_ENABLED = os.getenv("EMBEDDING_BACKFILL_ENABLED", "true").lower() == "true"
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "64"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "2"))
+BACKFILL_IDLE_SECONDS = float(os.getenv("BACKFILL_IDLE_SECONDS", "30"))
+BACKFILL_MAX_BACKOFF_SECONDS = float(os.getenv("BACKFILL_MAX_BACKOFF_SECONDS", "300"))
+# Filas que fallan solas (texto que el proveedor rechaza): se reintentan cada
+# BACKFILL_RETRY_AFTER_SECONDS y se abandonan tras BACKFILL_MAX_ATTEMPTS intentos
+BACKFILL_MAX_ATTEMPTS = int(os.getenv("BACKFILL_MAX_ATTEMPTS", "5"))
+BACKFILL_RETRY_AFTER_SECONDS = float(os.getenv("BACKFILL_RETRY_AFTER_SECONDS", "3600"))
+
+# Ventana para calcular el throughput reciente
+THROUGHPUT_WINDOW_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackfillWorker:
+    """
+    Completa en segundo plano los casos guardados con embedding NULL
+    (IA caída al crearlos, cargas masivas sin vector, etc.).
+
+    Cada lote se reclama con SELECT ... FOR UPDATE SKIP LOCKED, así que pueden
+    correr varios workers a la vez (tareas de este proceso, otros workers de
+    uvicorn o el proceso standalone) sin procesar dos veces la misma fila.
+
+    Una sola fila "venenosa" (p. ej. texto sobre el límite del modelo) hace
+    fallar la llamada multi-input de todo el lote: el lote fallido se bisecta
+    hasta aislarla, y la fila que falla sola anota embedding_attempts /
+    embedding_failed_at para dejar de bloquear el backlog.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        concurrency: int = BACKFILL_CONCURRENCY,
+        idle_seconds: float = BACKFILL_IDLE_SECONDS,
+        max_backoff_seconds: float = BACKFILL_MAX_BACKOFF_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.idle_seconds = idle_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.ai_client: Optional[AIClient] = None  # Singleton del proceso, se toma al arrancar
+        self._tasks: List[asyncio.Task] = []
+
+        # Métricas
+        self.processed_total = 0
+        self.failed_total = 0
+        self.isolated_total = 0  # Filas que fallaron solas (intento anotado)
+        self.batches_total = 0
+        self.last_batch_at: Optional[datetime] = None
+        self._recent: deque = deque()  # (monotonic_ts, filas procesadas)
+
+    # --- Ciclo de vida ---
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self.ai_client = self.ai_client or get_ai_client()
+        self._tasks = [asyncio.create_task(self._loop(i)) for i in range(self.concurrency)]
+        logger.info("🔁 Backfill de embeddings iniciado (%d tareas, lotes de %d).", self.concurrency, self.batch_size)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self) -> None:
+        await asyncio.gather(*self._tasks)
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    # --- Trabajo ---
+    async def _loop(self, worker_id: int) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                processed, failed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("❌ Backfill[%d] error: %s", worker_id, e)
+                processed, failed = 0, 1
+
+            if failed:
+                # Proveedor caído o DB con problemas: backoff exponencial con jitter
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+            elif processed == 0:
+                # Sin backlog: dormir hasta la próxima ronda
+                backoff = 1.0
+                await asyncio.sleep(self.idle_seconds)
+            else:
+                backoff = 1.0
+
+    async def run_once(self) -> tuple[int, int]:
+        """
+        Procesa un lote. Retorna (filas resueltas, filas que siguen sin vector por
+        falla del proveedor); las resueltas incluyen las apartadas por fallar solas.
+        Los locks de fila se mantienen hasta el commit, por eso otros workers
+        saltan estas filas mientras se calcula el embedding.
+        """
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(
+                        DiagnosisCase.id,
+                        DiagnosisCase.problem_description,
+                        DiagnosisCase.solution_description,
+                        DiagnosisCase.vehicle_model_id,
+                        DiagnosisCase.construction_group,
+                    )
+                    .where(DiagnosisCase.embedding.is_(None), *retryable_filter())
+                    .order_by(DiagnosisCase.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                rows = result.all()
+                if not rows:
+                    return 0, 0
+
+                self.ai_client = self.ai_client or get_ai_client()
+
+                vectors, isolated = await self._embed_isolating([
+                    build_embedding_text(problem, solution) for _, problem, solution, _, _ in rows
+                ])
+                if isolated:
+                    # Fallaron solas con el proveedor respondiendo: no bloquean los próximos lotes
+                    isolated_ids = [rows[position][0] for position in isolated]
+                    await session.execute(
+                        update(DiagnosisCase)
+                        .where(DiagnosisCase.id.in_(isolated_ids))
+                        .values(
+                            embedding_attempts=DiagnosisCase.embedding_attempts + 1,
+                            embedding_failed_at=datetime.utcnow(),
+                        )
+                    )
+                    self.isolated_total += len(isolated_ids)
+                    logger.warning("☠️  Backfill: %d casos fallan por sí solos (ids %s).", len(isolated_ids), isolated_ids)
+
+                updates = []
+                for (case_id, _, _, vehicle_model_id, construction_group), vector in zip(rows, vectors):
+                    if vector is None:
+                        continue
+                    # Casos de POST /async que la cola no llegó a procesar: misma deduplicación
+                    variant_of_id = await resolve_deferred_duplicate(
+                        session, case_id, vector, vehicle_model_id, construction_group
+                    )
+                    updates.append({"id": case_id, "embedding": vector, "variant_of_id": variant_of_id})
+                if updates:
+                    # UPDATE por primary key en bloque (executemany)
+                    await session.execute(update(DiagnosisCase), updates)
+
+        if updates:
+            # Casos recién vectorizados: entran a la búsqueda semántica
+            await search_cache.invalidate()
+            neighbor_index.schedule(row["id"] for row in updates if row["variant_of_id"] is None)
+
+        # Las filas aisladas no cuentan como fallo: el resto del backlog sigue sin backoff
+        failed = len(rows) - len(updates) - len(isolated)
+        self._record(len(updates), failed)
+        return len(updates) + len(isolated), failed
+
+    async def _embed_isolating(self, texts: List[str]) -> Tuple[List[Optional[List[float]]], Set[int]]:
+        """
+        get_embeddings con bisección de los fallos: si el lote falla y el
+        proveedor sigue disponible, se reintenta cada mitad de las posiciones
+        fallidas. Retorna los vectores y las posiciones que fallaron solas.
+        Con el circuito abierto (proveedor caído) no se bisecta ni se anota nada;
+        los 400/413/422 de la fila venenosa no lo abren (ver _is_provider_failure).
+        """
+        vectors = await self.ai_client.get_embeddings(texts)
+        failed = [position for position, vector in enumerate(vectors) if vector is None]
+        if not failed or not self.ai_client.available:
+            return vectors, set()
+        if len(texts) == 1:
+            return vectors, {0}
+
+        isolated: Set[int] = set()
+        middle = max(1, len(failed) // 2)
+        for part in (failed[:middle], failed[middle:]):
+            if not part or not self.ai_client.available:
+                continue
+            part_vectors, part_isolated = await self._embed_isolating([texts[p] for p in part])
+            for position, vector in zip(part, part_vectors):
+                vectors[position] = vector
+            isolated.update(part[p] for p in part_isolated)
+        return vectors, isolated
+
+    def _record(self, processed: int, failed: int) -> None:
+        now = time.monotonic()
+        self.processed_total += processed
+        self.failed_total += failed
+        self.batches_total += 1
+        self.last_batch_at = datetime.utcnow()
+        self._recent.append((now, processed))
+        while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        recent = sum(count for ts, count in self._recent if ts >= now - THROUGHPUT_WINDOW_SECONDS)
+        return {
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "processed_total": self.processed_total,
+            "failed_total": self.failed_total,
+            "isolated_total": self.isolated_total,
+            "batches_total": self.batches_total,
+            "last_batch_at": self.last_batch_at,
+            "throughput_per_second": round(recent / THROUGHPUT_WINDOW_SECONDS, 3),
+        }
+
+
+def retryable_filter() -> list:
+    """Filas sin vector que el backfill puede reclamar (no agotadas ni fallidas hace poco)."""
+    retry_before = datetime.utcnow() - timedelta(seconds=BACKFILL_RETRY_AFTER_SECONDS)
+    return [
+        DiagnosisCase.embedding_attempts < BACKFILL_MAX_ATTEMPTS,
+        or_(DiagnosisCase.embedding_failed_at.is_(None), DiagnosisCase.embedding_failed_at < retry_before),
+    ]
+
+
+async def count_backlog() -> int:
+    """Casos que todavía no participan en la búsqueda semántica."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(DiagnosisCase).where(DiagnosisCase.embedding.is_(None))
+        )
+        return result.scalar_one()
+
+
+async def count_exhausted() -> int:
+    """Casos sin vector que agotaron BACKFILL_MAX_ATTEMPTS (requieren revisión manual)."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(DiagnosisCase).where(
+                DiagnosisCase.embedding.is_(None),
+                DiagnosisCase.embedding_attempts >= BACKFILL_MAX_ATTEMPTS,
+            )
+        )
+        return result.scalar_one()
+
+
+# Instancia del proceso web (arrancada desde el lifespan de app/main.py)
+backfill_worker = EmbeddingBackfillWorker()
+
+
+# --- Proceso standalone: python -m app.services.embedding_backfill ---
+if __name__ == "__main__":
+    async def main():
+        setup_logging()
+        logger.info("🚀 Backfill standalone: %d casos sin embedding.", await count_backlog())
+        backfill_worker.start()
+        try:
+            await backfill_worker.join()
+        finally:
+            await backfill_worker.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("🛑 Backfill detenido.")
+    finally:
+        shutdown_logging()
@@ -0,0 +1,146 @@
+import os
+import asyncio
+import logging
+from typing import List, Optional, Set
+from sqlalchemy import select, update
+from app.core.ai_client import AIClient, get_ai_client
+from app.core.database import async_session
+from app.core.search_cache import search_cache
+from app.models import DiagnosisCase
+from app.services.case_service import build_embedding_text
+from app.services.case_neighbors import neighbor_index
+from app.services.dedup_service import resolve_deferred_duplicate
+
+# --- CONFIGURACIÓN ---
+EMBEDDING_QUEUE_CONCURRENCY = int(os.getenv("EMBEDDING_QUEUE_CONCURRENCY", "4"))
+EMBEDDING_QUEUE_MAX_SIZE = int(os.getenv("EMBEDDING_QUEUE_MAX_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingQueue:
+    """
+    Cola en memoria para vectorizar casos fuera del request (POST /api/cases/async).
+    Un pool de tareas asyncio consume la cola con concurrencia limitada.
+
+    La cola no es durable: si el proceso se reinicia o la cola está llena,
+    el caso queda con embedding NULL y el worker de backfill lo completa.
+    """
+
+    def __init__(self, concurrency: int = EMBEDDING_QUEUE_CONCURRENCY, max_size: int = EMBEDDING_QUEUE_MAX_SIZE):
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.ai_client: Optional[AIClient] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[int] = set()
+
+        # Métricas
+        self.enqueued_total = 0
+        self.rejected_total = 0
+        self.embedded_total = 0
+        self.failed_total = 0
+
+    # --- Ciclo de vida ---
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self.ai_client = self.ai_client or get_ai_client()
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info("📨 Cola de embeddings iniciada (%d workers).", self.concurrency)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Lo que quede en cola sigue con embedding NULL: lo recoge el backfill
+        self._pending.clear()
+
+    # --- API ---
+    def enqueue(self, case_id: int) -> bool:
+        """Encola sin bloquear. Retorna False si la cola no está activa o está llena."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(case_id)
+        except asyncio.QueueFull:
+            self.rejected_total += 1
+            return False
+        self._pending.add(case_id)
+        self.enqueued_total += 1
+        return True
+
+    def is_pending(self, case_id: int) -> bool:
+        return case_id in self._pending
+
+    def stats(self) -> dict:
+        return {
+            "running": any(not task.done() for task in self._tasks),
+            "concurrency": self.concurrency,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "enqueued_total": self.enqueued_total,
+            "rejected_total": self.rejected_total,
+            "embedded_total": self.embedded_total,
+            "failed_total": self.failed_total,
+        }
+
+    # --- Trabajo ---
+    async def _worker(self) -> None:
+        while True:
+            case_id = await self._queue.get()
+            try:
+                await self._embed_case(case_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_total += 1
+                logger.exception("❌ Cola de embeddings: error en caso %s: %s", case_id, e)
+            finally:
+                self._pending.discard(case_id)
+                self._queue.task_done()
+
+    async def _embed_case(self, case_id: int) -> None:
+        async with async_session() as session:
+            async with session.begin():
+                # SKIP LOCKED: si el backfill ya tomó la fila, no la procesamos dos veces
+                result = await session.execute(
+                    select(
+                        DiagnosisCase.problem_description,
+                        DiagnosisCase.solution_description,
+                        DiagnosisCase.vehicle_model_id,
+                        DiagnosisCase.construction_group,
+                    )
+                    .where(DiagnosisCase.id == case_id, DiagnosisCase.embedding.is_(None))
+                    .with_for_update(skip_locked=True)
+                )
+                row = result.first()
+                if row is None:
+                    return
+
+                problem, solution, vehicle_model_id, construction_group = row
+                vector = await self.ai_client.get_embedding(build_embedding_text(problem, solution))
+                if vector is None:
+                    # Queda NULL: el backfill reintentará con backoff
+                    self.failed_total += 1
+                    return
+
+                # Casi duplicado de un caso existente: queda enlazado como variante
+                variant_of_id = await resolve_deferred_duplicate(
+                    session, case_id, vector, vehicle_model_id, construction_group
+                )
+                await session.execute(
+                    update(DiagnosisCase)
+                    .where(DiagnosisCase.id == case_id)
+                    .values(embedding=vector, variant_of_id=variant_of_id)
+                )
+        await search_cache.invalidate()
+        if variant_of_id is None:
+            neighbor_index.schedule([case_id])
+        self.embedded_total += 1
+
+
+# Instancia del proceso web (arrancada desde el lifespan de app/main.py)
+embedding_queue = EmbeddingQueue()
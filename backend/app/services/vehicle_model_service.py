@@ -0,0 +1,95 @@
+import os
+import time
+from typing import Dict, List, Optional
+import logging
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.database import async_read_session, async_session
+from app.models import VehicleModel
+
+# Otros workers pueden registrar modelos: el catálogo se relee cada N segundos
+VEHICLE_MODELS_REFRESH_SECONDS = float(os.getenv("VEHICLE_MODELS_REFRESH_SECONDS", "300"))
+# true: un modelo que no está en el catálogo se rechaza con 422 (se agrega con
+# POST /api/admin/vehicle-models); false: se registra al vuelo en la primera alta
+VEHICLE_MODELS_STRICT = os.getenv("VEHICLE_MODELS_STRICT", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def clean_name(name: str) -> str:
+    """Nombre tal como se guarda en el catálogo: sin espacios de más."""
+    return " ".join(name.split())
+
+
+class VehicleModelCatalog:
+    """
+    Copia en memoria de la tabla vehicle_models (decenas de filas).
+    Resuelve nombres a ids sin ir a la DB en cada alta o búsqueda.
+    """
+
+    def __init__(self):
+        self._by_name: Dict[str, VehicleModel] = {}
+        self._loaded_at: Optional[float] = None
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < VEHICLE_MODELS_REFRESH_SECONDS:
+            return
+        async with async_read_session() as session:
+            result = await session.execute(select(VehicleModel))
+            models = result.scalars().all()
+        self._by_name = {_normalize(model.name): model for model in models}
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    async def names(self) -> List[str]:
+        await self._ensure_loaded()
+        return sorted(model.name for model in self._by_name.values())
+
+    async def resolve(self, name: str) -> Optional[VehicleModel]:
+        """Coincidencia exacta sin distinguir mayúsculas ni espacios: 'golf  gti' -> 'Golf GTI'."""
+        await self._ensure_loaded()
+        return self._by_name.get(_normalize(name))
+
+    async def register(self, name: str) -> VehicleModel:
+        """
+        Insert-or-get: agrega el modelo al catálogo si no existe (el índice único
+        sobre lower(name) resuelve la carrera entre workers) y lo retorna.
+        Se confirma en su propia transacción, antes del caso que lo referencia.
+        """
+        existing = await self.resolve(name)
+        if existing is not None:
+            return existing
+
+        canonical = clean_name(name)
+        async with async_session() as session:
+            await session.execute(
+                pg_insert(VehicleModel)
+                .values(name=canonical)
+                .on_conflict_do_nothing(index_elements=[text("lower(name)")])
+            )
+            result = await session.execute(
+                select(VehicleModel).where(func.lower(VehicleModel.name) == canonical.lower())
+            )
+            model = result.scalars().one()
+            await session.commit()
+
+        if _normalize(model.name) not in self._by_name:
+            logger.info("🚗 Modelo de vehículo nuevo en el catálogo: '%s' (id %d).", model.name, model.id)
+        self._by_name[_normalize(model.name)] = model
+        return model
+
+    async def match_prefix(self, prefix: str) -> List[int]:
+        """Ids de los modelos cuyo nombre empieza por el filtro: 'Golf' -> Golf, Golf GTI, Golf R."""
+        await self._ensure_loaded()
+        normalized = _normalize(prefix)
+        return [model.id for key, model in self._by_name.items() if key.startswith(normalized)]
+
+
+# Instancia única por proceso
+vehicle_model_catalog = VehicleModelCatalog()
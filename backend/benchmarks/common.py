@@ -0,0 +1,61 @@
+import os
+import json
+import math
+from typing import Iterator, List, Optional
+
+# --- CONFIGURACIÓN ---
+# Por defecto contra FastAPI directo (dentro del contenedor), igual que populate_db.py
+API_URL = os.getenv("BENCH_API_URL", "http://localhost:8000")
+USERNAME = os.getenv("API_USERNAME", "admin")
+PASSWORD = os.getenv("API_PASSWORD", "secretpassword")
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Percentil por rango más cercano (q en [0, 1])."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies: List[float], elapsed: float, errors: int) -> dict:
+    """Latencias en ms, throughput en requests/s (incluye las fallidas)."""
+    total = len(latencies) + errors
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(max(latencies) if latencies else None),
+    }
+
+
+def print_report(title: str, report: dict) -> None:
+    print("\n" + "=" * 40)
+    print(f"📊 {title}")
+    for key, value in report.items():
+        print(f"   {key:<18} {value}")
+
+
+def write_json(path: Optional[str], report: dict) -> None:
+    """Guarda el reporte para comparar configuraciones (índice, caché, fusión)."""
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Reporte guardado en {path}")
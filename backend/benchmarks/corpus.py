@@ -0,0 +1,184 @@
+# backend/benchmarks/corpus.py
+#
+# Genera un corpus sintético de casos VW con la misma forma que CASES_TO_INSERT
+# (populate_db.py) y un archivo de consultas derivadas del corpus.
+#
+# Uso (desde backend/):
+#   python -m benchmarks.corpus --size 100k --out /tmp/corpus.jsonl --queries-out /tmp/queries.jsonl
+#   python populate_db.py --file /tmp/corpus.jsonl --batch-size 1000
+#
+# Para correr sin red, levantar el backend con EMBEDDING_PROVIDER=hashing.
+import argparse
+import json
+import random
+from typing import Iterator
+
+from populate_db import CASES_TO_INSERT
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Deben existir en la tabla vehicle_models (database/init.sql)
+MODELS = [
+    "Amarok", "Arteon", "Atlas", "Beetle", "Caddy", "Crafter",
+    "Golf", "Golf GTI", "Golf R", "ID.3", "ID.4", "ID.Buzz",
+    "Jetta", "Jetta GLI", "Passat", "Polo", "Saveiro",
+    "T-Cross", "Taos", "Teramont", "Tiguan", "Touareg", "Transporter",
+    "Virtus", "Vento",
+]
+
+# Distribución real aproximada: Motor y Eléctrico dominan, Climatización es chico
+GROUP_WEIGHTS = {
+    "Motor": 30, "Eléctrico": 25, "Transmisión": 10, "Suspensión": 10,
+    "Frenos": 10, "Carrocería": 7, "Infoentretenimiento": 5, "Climatización": 3,
+}
+
+# Vocabulario por grupo: (componentes, síntomas, causas, acciones, códigos)
+VOCABULARY = {
+    "Motor": (
+        ["bobina de encendido", "bujías", "inyectores", "bomba de agua", "termostato", "turbo", "válvula EGR", "sensor MAF"],
+        ["vibración en ralentí", "pérdida de potencia", "testigo de motor encendido", "humo azul en el escape", "sobrecalentamiento", "olor a gasolina"],
+        ["desgaste prematuro", "fuga de aceite", "sensor defectuoso", "carbonilla acumulada", "conector sulfatado"],
+        ["reemplazó", "limpió", "reprogramó", "ajustó"],
+        ["P0300", "P0301", "P0171", "P0420", "P0299", "P0401"],
+    ),
+    "Eléctrico": (
+        ["elevador de cristal", "alternador", "batería de 12V", "módulo de confort", "arnés de puerta", "faro LED"],
+        ["ventana no sube", "batería se descarga", "luces parpadean", "cierre centralizado no responde", "testigo de batería encendido"],
+        ["soportes plásticos rotos", "consumo parásito", "cable roto en el arnés", "relevador dañado", "fusible quemado"],
+        ["reemplazó", "reparó", "codificó", "actualizó"],
+        ["B1057", "U0140", "B10AE", "U1123"],
+    ),
+    "Transmisión": (
+        ["caja DSG", "embrague", "convertidor de par", "módulo TCU", "solenoide de cambios"],
+        ["golpe al insertar reversa", "patina al acelerar", "tirones en primera", "no engrana segunda"],
+        ["nivel de aceite ATF bajo", "software desactualizado", "mecatrónica dañada", "embrague desgastado"],
+        ["rellenó", "actualizó", "realizó ajuste básico de", "reemplazó"],
+        ["P17BF", "P0730", "P0841", "P189C"],
+    ),
+    "Suspensión": (
+        ["bujes de horquilla", "amortiguadores", "rótulas", "barra estabilizadora", "bases de amortiguador"],
+        ["ruido tipo golpe seco en baches", "vehículo se va de lado", "desgaste irregular de llantas", "rechinido en curvas"],
+        ["desgaste prematuro", "juego excesivo", "fuga de aceite del amortiguador", "soporte fracturado"],
+        ["reemplazó", "alineó", "apretó a torque", "lubricó"],
+        ["C1145", "C10AD"],
+    ),
+    "Frenos": (
+        ["discos delanteros", "balatas", "sensor de velocidad de rueda", "bomba ABS", "caliper trasero"],
+        ["vibración al frenar", "testigo de ABS encendido", "pedal esponjoso", "chillido al frenar"],
+        ["discos alabeados", "sensor sucio con lodo metálico", "aire en el sistema", "balatas cristalizadas"],
+        ["rectificó", "limpió", "purgó", "reemplazó"],
+        ["C0035", "C0040", "C1140", "00287"],
+    ),
+    "Carrocería": (
+        ["portón trasero eléctrico", "bisagras", "sellos de puerta", "cerradura", "espejo lateral"],
+        ["cajuela no abre", "filtración de agua", "ruido de viento", "puerta no cierra"],
+        ["desalineación", "sello reseco", "desagüe tapado", "cable de cerradura vencido"],
+        ["ajustó", "reemplazó", "destapó", "lubricó"],
+        ["B1312", "B1405"],
+    ),
+    "Infoentretenimiento": (
+        ["pantalla central", "módulo 5F", "cámara de reversa", "App-Connect", "antena GPS"],
+        ["pantalla negra", "no conecta el celular", "reinicios constantes", "sin señal GPS"],
+        ["bloqueo de software", "firmware desactualizado", "cable coaxial dañado", "módulo defectuoso"],
+        ["actualizó", "reinició", "reemplazó", "codificó"],
+        ["U1113", "B200A", "U0184"],
+    ),
+    "Climatización": (
+        ["compresor", "condensador", "ventilador del habitáculo", "sensor de temperatura", "válvula de expansión"],
+        ["aire acondicionado no enfría", "olor a humedad", "ventilador no funciona", "sale aire caliente"],
+        ["fuga de gas refrigerante", "filtro de polen saturado", "resistencia quemada", "embrague del compresor dañado"],
+        ["recargó", "reemplazó", "limpió", "sustituyó"],
+        ["B10B1", "B10A3"],
+    ),
+}
+
+
+def generate_cases(rows: int, seed: int = 42) -> Iterator[dict]:
+    """Casos deterministas (misma semilla -> mismo corpus), en streaming."""
+    rng = random.Random(seed)
+    groups = list(GROUP_WEIGHTS)
+    weights = list(GROUP_WEIGHTS.values())
+    templates = {}
+    for case in CASES_TO_INSERT:
+        templates.setdefault(case["construction_group"], []).append(case)
+
+    for _ in range(rows):
+        group = rng.choices(groups, weights)[0]
+        components, symptoms, causes, actions, codes = VOCABULARY[group]
+        component, symptom, cause = rng.choice(components), rng.choice(symptoms), rng.choice(causes)
+        code = rng.choice(codes)
+
+        case = {
+            "title": f"{symptom.capitalize()} ({component})",
+            "vehicle_model": rng.choice(MODELS),
+            "year": rng.randint(2008, 2025),
+            "construction_group": group,
+            "problem_description": (
+                f"El cliente reporta {symptom}. "
+                f"{rng.choice(['En frío.', 'Con el motor caliente.', 'De forma intermitente.', 'Desde hace una semana.'])} "
+                f"Escáner muestra código {code}."
+            ),
+            "solution_description": f"Se diagnosticó {cause} en {component}. Se {rng.choice(actions)} {component}.",
+        }
+
+        # Parte del corpus hereda el texto real de los casos de ejemplo del mismo grupo
+        if group in templates and rng.random() < 0.2:
+            template = rng.choice(templates[group])
+            case["problem_description"] += " " + template["problem_description"]
+            case["solution_description"] += " " + template["solution_description"]
+
+        yield case
+
+
+def generate_queries(count: int, seed: int = 7) -> Iterator[dict]:
+    """
+    Consultas como las del taller: síntoma + componente o código DTC,
+    una parte con group_filter / model_filter.
+    """
+    rng = random.Random(seed)
+    groups = list(GROUP_WEIGHTS)
+    weights = list(GROUP_WEIGHTS.values())
+
+    for _ in range(count):
+        group = rng.choices(groups, weights)[0]
+        components, symptoms, _, _, codes = VOCABULARY[group]
+        query = rng.choice([
+            f"{rng.choice(symptoms)} {rng.choice(components)}",
+            f"{rng.choice(symptoms)} código {rng.choice(codes)}",
+            rng.choice(symptoms),
+        ])
+        item = {"query": query}
+        roll = rng.random()
+        if roll < 0.3:
+            item["group_filter"] = group
+        elif roll < 0.4:
+            item["model_filter"] = rng.choice(MODELS)
+        yield item
+
+
+def write_jsonl(path: str, items: Iterator[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corpus sintético de casos VW para benchmarks")
+    parser.add_argument("--size", choices=list(SIZES), help="Tamaño predefinido (10k, 100k, 1m)")
+    parser.add_argument("--rows", type=int, help="Cantidad exacta de casos (ignora --size)")
+    parser.add_argument("--out", default="corpus.jsonl", help="Archivo JSONL de casos")
+    parser.add_argument("--queries", type=int, default=500, help="Consultas a generar")
+    parser.add_argument("--queries-out", help="Archivo JSONL de consultas (opcional)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = args.rows or SIZES[args.size or "10k"]
+    written = write_jsonl(args.out, generate_cases(rows, args.seed))
+    print(f"✅ {written} casos escritos en {args.out}")
+
+    if args.queries_out:
+        written = write_jsonl(args.queries_out, generate_queries(args.queries, args.seed + 1))
+        print(f"✅ {written} consultas escritas en {args.queries_out}")
@@ -0,0 +1,108 @@
+# backend/benchmarks/load.py
+#
+# Generador de carga contra la API con concurrencia configurable.
+# Reporta latencia p50/p95/p99 y throughput.
+#
+# Uso (desde backend/):
+#   python -m benchmarks.load search --queries /tmp/queries.jsonl --concurrency 32 --requests 5000
+#   python -m benchmarks.load search --queries /tmp/queries.jsonl --mode hybrid --fusion rrf --distinct 20
+#   python -m benchmarks.load create --corpus /tmp/corpus.jsonl --concurrency 8 --requests 500
+#
+# ATENCIÓN: 'create' inserta casos reales en la base; usar una base de benchmark.
+import argparse
+import asyncio
+import itertools
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.common import API_URL, USERNAME, PASSWORD, read_jsonl, latency_summary, print_report, write_json
+
+
+def build_search_payloads(args) -> List[dict]:
+    queries = list(read_jsonl(args.queries))
+    if args.distinct:
+        # Conjunto caliente chico: mide el efecto de las cachés
+        queries = queries[:args.distinct]
+
+    overrides = {"mode": args.mode, "fusion": args.fusion, "limit": args.limit,
+                 "fields": args.fields, "ef_search": args.ef_search}
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    return [{**query, **overrides} for query in queries]
+
+
+async def run_load(path: str, payloads: List[dict], concurrency: int, total: int, warmup: int) -> dict:
+    latencies: List[float] = []
+    status_codes: dict = {}
+    errors = 0
+    payload_cycle = itertools.cycle(payloads)
+    counter = itertools.count()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=API_URL, auth=(USERNAME, PASSWORD), limits=limits, timeout=60) as client:
+
+        # Calentamiento (conexiones, caché de planes de Postgres); no se mide
+        for _ in range(warmup):
+            await client.post(path, json=next(payload_cycle))
+
+        async def worker():
+            nonlocal errors
+            while next(counter) < total:
+                payload = next(payload_cycle)
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=payload)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                elapsed = time.perf_counter() - start
+
+                status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+                if response.is_success:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    report = latency_summary(latencies, elapsed, errors)
+    report["concurrency"] = concurrency
+    report["status_codes"] = status_codes
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la API de casos")
+    parser.add_argument("endpoint", choices=["search", "create"])
+    parser.add_argument("--queries", help="JSONL de consultas (search)")
+    parser.add_argument("--corpus", help="JSONL de casos (create)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--distinct", type=int, help="Usar solo las primeras N consultas (conjunto caliente)")
+    parser.add_argument("--mode", choices=["auto", "vector", "lexical", "hybrid"])
+    parser.add_argument("--fusion", choices=["rrf", "weighted"])
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--fields", choices=["full", "summary"])
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    args = parser.parse_args()
+
+    if args.endpoint == "search":
+        if not args.queries:
+            parser.error("search requiere --queries")
+        path, payloads = "/api/cases/search", build_search_payloads(args)
+    else:
+        if not args.corpus:
+            parser.error("create requiere --corpus")
+        path, payloads = "/api/cases/", list(read_jsonl(args.corpus))[:max(args.requests, 1)]
+
+    print(f"🚀 {args.requests} requests a {API_URL}{path} (concurrencia {args.concurrency})...")
+    report = asyncio.run(run_load(path, payloads, args.concurrency, args.requests, args.warmup))
+    report["endpoint"] = args.endpoint
+    report["settings"] = {key: value for key, value in vars(args).items() if value is not None}
+    print_report(f"Benchmark {args.endpoint}", report)
+    write_json(args.json, report)
@@ -0,0 +1,115 @@
+# backend/benchmarks/recall.py
+#
+# Recall@k de /api/cases/search frente a la búsqueda exacta (fuerza bruta,
+# sin índice) sobre la misma base. Los vectores de consulta se calculan aquí
+# con el mismo proveedor determinista que el backend (EMBEDDING_PROVIDER=hashing),
+# así que no hace falta red.
+#
+# Uso (desde backend/, con DATABASE_URL apuntando a la misma base que la API):
+#   python -m benchmarks.recall --queries /tmp/queries.jsonl --k 10 --sample 200
+#   python -m benchmarks.recall --queries /tmp/queries.jsonl --ef-search 100 --json /tmp/recall_ef100.json
+import argparse
+import asyncio
+import time
+from typing import List, Optional, Set
+
+import httpx
+from sqlalchemy import select, text
+
+from app.core.database import async_session
+from app.core.embedding_providers import HashingEmbeddingProvider
+from app.models import DiagnosisCase
+from app.services.vehicle_model_service import vehicle_model_catalog
+from benchmarks.common import API_URL, USERNAME, PASSWORD, read_jsonl, latency_summary, print_report, write_json
+
+
+async def exact_neighbors(query_vector: List[float], query: dict, k: int) -> Set[int]:
+    """k vecinos exactos por distancia coseno (Seq Scan), con los mismos filtros que la API."""
+    statement = select(DiagnosisCase.id).where(
+        DiagnosisCase.embedding.is_not(None), DiagnosisCase.variant_of_id.is_(None)
+    )
+    if query.get("group_filter"):
+        statement = statement.where(DiagnosisCase.construction_group == query["group_filter"])
+    if query.get("model_filter"):
+        model_ids = await vehicle_model_catalog.match_prefix(query["model_filter"])
+        statement = statement.where(DiagnosisCase.vehicle_model_id.in_(model_ids or [-1]))
+    statement = statement.order_by(DiagnosisCase.embedding.cosine_distance(query_vector)).limit(k)
+
+    async with async_session() as session:
+        async with session.begin():
+            # Sin índices: el resultado es el k-NN exacto
+            await session.execute(text("SET LOCAL enable_indexscan = off"))
+            await session.execute(text("SET LOCAL enable_bitmapscan = off"))
+            result = await session.execute(statement)
+            return set(result.scalars().all())
+
+
+async def check_provider(client: httpx.AsyncClient, provider: HashingEmbeddingProvider) -> None:
+    """Sin el mismo proveedor en el backend, el 'exacto' no es comparable."""
+    try:
+        response = await client.get("/api/admin/embeddings/provider")
+        model = response.json().get("model")
+    except Exception:
+        return
+    if model != provider.model:
+        print(f"⚠️  El backend usa '{model}' y este script '{provider.model}': "
+              f"levantar el backend con EMBEDDING_PROVIDER=hashing.")
+
+
+async def evaluate(queries: List[dict], k: int, mode: str, ef_search: Optional[int]) -> dict:
+    provider = HashingEmbeddingProvider()
+    recalls: List[float] = []
+    latencies: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=API_URL, auth=(USERNAME, PASSWORD), timeout=60) as client:
+        await check_provider(client, provider)
+
+        start = time.perf_counter()
+        for query in queries:
+            payload = {**query, "mode": mode, "limit": k, "fields": "summary"}
+            if ef_search:
+                payload["ef_search"] = ef_search
+
+            request_start = time.perf_counter()
+            response = await client.post("/api/cases/search", json=payload)
+            if not response.is_success:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - request_start)
+            returned = {item["id"] for item in response.json()}
+
+            # Mismo preprocesamiento que AIClient.get_embedding
+            query_vector = (await provider.embed([query["query"].replace("\n", " ").strip()]))[0]
+            expected = await exact_neighbors(query_vector, query, k)
+            if expected:
+                recalls.append(len(returned & expected) / len(expected))
+        elapsed = time.perf_counter() - start
+
+    report = latency_summary(latencies, elapsed, errors)
+    report.update({
+        "k": k,
+        "mode": mode,
+        "ef_search": ef_search,
+        "queries_evaluated": len(recalls),
+        f"recall@{k}": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        f"min_recall@{k}": round(min(recalls), 4) if recalls else None,
+    })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k de la búsqueda contra k-NN exacto")
+    parser.add_argument("--queries", required=True, help="JSONL de consultas (benchmarks.corpus)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=100, help="Consultas a evaluar")
+    parser.add_argument("--mode", choices=["vector", "hybrid", "auto"], default="vector")
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    args = parser.parse_args()
+
+    queries = list(read_jsonl(args.queries))[:args.sample]
+    print(f"🎯 Evaluando recall@{args.k} sobre {len(queries)} consultas (modo {args.mode})...")
+    report = asyncio.run(evaluate(queries, args.k, args.mode, args.ef_search))
+    print_report("Recall vs fuerza bruta", report)
+    write_json(args.json, report)
@@ -1,12 +1,28 @@
 # backend/populate_db.py
+#
+# Uso:
+#   python populate_db.py                              -> carga los casos de ejemplo
+#   python populate_db.py --file archivo.jsonl         -> carga masiva desde JSONL (un caso por línea)
+#   python populate_db.py --file archivo.csv --batch-size 500
+#   python populate_db.py --file export.ndjson --batch-size 100
+#                                                      -> réplica desde GET /api/cases/export?include_embeddings=true
+#                                                         (los vectores del archivo se reusan, no se vuelven a generar)
+import argparse
+import csv
+import json
 import requests
-import time
 import os
+from itertools import islice
+from typing import Iterable, Iterator, List
 
 # --- CONFIGURACIÓN INTERNA ---
 # Al correr dentro del contenedor, nos conectamos directo a FastAPI (localhost:8000)
 # en lugar de salir a Nginx.
 API_URL = "http://localhost:8000/api/cases/"
+BULK_API_URL = f"{API_URL}bulk"
+
+# Casos por request al endpoint /bulk (el servidor acepta hasta BULK_MAX_CASES)
+DEFAULT_BATCH_SIZE = 500
 
 # Obtenemos credenciales directo de las variables de entorno del contenedor
 # Esto es más seguro que escribirlas en el código.
@@ -96,36 +112,85 @@ CASES_TO_INSERT = [
     }
 ]
 
-def populate():
-    print(f"🚀 [MODO CONTENEDOR] Iniciando carga de {len(CASES_TO_INSERT)} casos...")
-    print(f"📡 Target: {API_URL}")
+def read_cases(path: str) -> Iterator[dict]:
+    """
+    Lee casos en streaming (sin cargar el archivo completo en memoria).
+    Soporta JSONL/NDJSON (un objeto por línea) y CSV con cabecera.
+    Las líneas de GET /api/cases/export traen además id/created_at (se ignoran:
+    la base destino asigna los suyos) y, opcionalmente, embedding/embedding_model.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield row
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def chunked(items: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def populate(cases: Iterable[dict] = CASES_TO_INSERT, batch_size: int = DEFAULT_BATCH_SIZE):
+    print(f"🚀 [MODO CONTENEDOR] Iniciando carga masiva (lotes de {batch_size})...")
+    print(f"📡 Target: {BULK_API_URL}")
+
+    total = inserted = failed = without_embedding = reused = 0
 
-    success_count = 0
-    
-    for case in CASES_TO_INSERT:
+    for batch in chunked(cases, batch_size):
+        offset = total
+        total += len(batch)
         try:
-            print(f"   ➡️  Procesando: {case['title']}...", end=" ")
-            
             response = requests.post(
-                API_URL,
-                json=case,
+                BULK_API_URL,
+                json=batch,
                 auth=(USERNAME, PASSWORD),
-                timeout=15 
+                timeout=300
             )
+        except Exception as e:
+            print(f"   ❌ Excepción en filas {offset}-{total - 1}: {e}")
+            failed += len(batch)
+            continue
 
-            if response.status_code in [200, 201]:
-                print("✅ OK")
-                success_count += 1
-            else:
-                print(f"❌ Error {response.status_code}: {response.text}")
+        if response.status_code != 200:
+            print(f"   ❌ Error {response.status_code} en filas {offset}-{total - 1}: {response.text}")
+            failed += len(batch)
+            continue
 
-        except Exception as e:
-            print(f"❌ Excepción: {e}")
-        
-        time.sleep(0.5)
+        report = response.json()
+        inserted += report["inserted"]
+        failed += report["failed"]
+        without_embedding += report["without_embedding"]
+        reused += report.get("reused_embeddings", 0)
+
+        # Errores por fila, con el número de fila global del archivo
+        for error in report["errors"]:
+            print(f"   ⚠️  Fila {offset + error['index']}: {error['error']}")
+
+        print(f"   ➡️  {total} procesados | ✅ {inserted} insertados | ❌ {failed} fallidos | "
+              f"🕳️  {without_embedding} sin vector | ♻️  {reused} vectores reusados")
 
     print("\n" + "="*40)
-    print(f"🏁 Carga completada: {success_count}/{len(CASES_TO_INSERT)} insertados.")
+    print(f"🏁 Carga completada: {inserted}/{total} insertados.")
+    if reused:
+        print(f"♻️  {reused} casos conservaron el vector del archivo (sin llamadas a la IA).")
+    if without_embedding:
+        print(f"ℹ️  {without_embedding} casos quedaron sin embedding (se completarán por backfill).")
+
 
 if __name__ == "__main__":
-    populate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Carga de casos de diagnóstico vía API")
+    parser.add_argument("--file", help="Archivo JSONL/NDJSON o CSV con casos (por defecto: casos de ejemplo)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Casos por request")
+    args = parser.parse_args()
+
+    populate(read_cases(args.file) if args.file else CASES_TO_INSERT, args.batch_size)
@@ -0,0 +1,140 @@
+import asyncio
+from typing import List
+
+import httpx
+import pytest
+from openai import AuthenticationError, BadRequestError, InternalServerError, UnprocessableEntityError
+
+from app.core.ai_client import AIClient
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.models import EMBEDDING_DIMENSIONS
+
+
+def _status_error(error_class, status_code: int):
+    request = httpx.Request("POST", "http://provider.test/embeddings")
+    return error_class("error", response=httpx.Response(status_code, request=request), body=None)
+
+
+class FakeProvider:
+    """Proveedor en memoria: cada llamada consume el siguiente resultado de la lista."""
+    model = "fake-model"
+    remote = False
+
+    def __init__(self, outcomes: list):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        return [[0.1] * EMBEDDING_DIMENSIONS for _ in texts]
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _client(outcomes: list, failure_threshold: int = 3, recovery_seconds: float = 0) -> AIClient:
+    client = AIClient(provider=FakeProvider(outcomes))
+    client.breaker = CircuitBreaker("test", failure_threshold, recovery_seconds)
+    return client
+
+
+def test_success_records_success():
+    client = _client(["ok"])
+    vectors = asyncio.run(client._call_provider(["texto"]))
+    assert len(vectors) == 1
+    assert client.breaker.successes_total == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_error_leaves_breaker_closed():
+    # Un texto que el proveedor rechaza (400/413/422) no habla de su salud
+    client = _client([_status_error(BadRequestError, 400)] * 3 + [_status_error(UnprocessableEntityError, 422)] * 3)
+    for _ in range(6):
+        with pytest.raises((BadRequestError, UnprocessableEntityError)):
+            asyncio.run(client._call_provider(["texto"]))
+    assert client.provider.calls == 6  # Sin reintentos
+    assert client.breaker.failures_total == 0
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_server_errors_count_as_failures():
+    client = _client([_status_error(InternalServerError, 503)] * 3, failure_threshold=3, recovery_seconds=30)
+    # Cada llamada reintenta una vez: los 3 intentos fallidos abren el circuito
+    for _ in range(2):
+        with pytest.raises(InternalServerError):
+            asyncio.run(client._call_provider(["texto"]))
+    assert client.breaker.failures_total == 3
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_persistent_auth_error_opens_circuit():
+    client = _client([_status_error(AuthenticationError, 401)] * 3, failure_threshold=3, recovery_seconds=30)
+    for _ in range(3):
+        with pytest.raises(AuthenticationError):
+            asyncio.run(client._call_provider(["texto"]))
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Con el circuito abierto ya no se llama al proveedor
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client._call_provider(["texto"]))
+    assert client.provider.calls == 3
+
+
+def test_half_open_probe_with_client_error_does_not_wedge():
+    client = _client([_status_error(BadRequestError, 400)], failure_threshold=1)
+    client.breaker.record_failure()
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # La prueba de half_open recibe un 400: sin veredicto, el cupo queda libre
+    with pytest.raises(BadRequestError):
+        asyncio.run(client._call_provider(["texto"]))
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+
+    # La siguiente prueba pasa y cierra el circuito
+    asyncio.run(client._call_provider(["texto"]))
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_with_auth_error_reopens():
+    client = _client([_status_error(AuthenticationError, 401)], failure_threshold=1)
+    client.breaker.record_failure()
+
+    with pytest.raises(AuthenticationError):
+        asyncio.run(client._call_provider(["texto"]))
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_half_open_probe_releases_slot():
+    client = _client(["hang"], failure_threshold=1)
+    client.breaker.record_failure()
+
+    async def cancel_probe():
+        task = asyncio.create_task(client._call_provider(["texto"]))
+        await asyncio.sleep(0.01)
+        assert client.breaker.state == CircuitBreaker.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.failures_total == 1  # La cancelación no cuenta como fallo
+
+    # El cupo quedó libre: la siguiente prueba pasa y cierra el circuito
+    asyncio.run(client._call_provider(["texto"]))
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_get_embedding_recovers_after_half_open_error():
+    client = _client([_status_error(BadRequestError, 400)], failure_threshold=1)
+    client.batcher = None
+    client.breaker.record_failure()
+
+    assert asyncio.run(client.get_embedding("primer intento")) is None
+    assert asyncio.run(client.get_embedding("segundo intento")) is not None
+    assert client.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,15 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services.case_export import parse_since
+
+
+def test_parse_since_accepts_sync_token():
+    assert parse_since("81234") == 81234
+
+
+@pytest.mark.parametrize("since", ["2024-05-01T10:00:00/42", "-1", "abc"])
+def test_parse_since_rejects_other_formats(since):
+    with pytest.raises(HTTPException) as error:
+        parse_since(since)
+    assert error.value.status_code == 400
@@ -0,0 +1,85 @@
+import time
+
+from app.core.circuit_breaker import CircuitBreaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_seconds=30)
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open
+    assert not breaker.allow_request()
+    assert breaker.rejected_total == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_seconds=0)
+    breaker.record_failure()
+    breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.transitions == {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=5, recovery_seconds=0)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_release_frees_half_open_slot():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_release_outside_half_open_is_noop():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_seconds=30)
+    breaker.release()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_stays_open_during_recovery_window(monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_seconds=30)
+    breaker.record_failure()
+    opened_at = breaker.opened_at
+    monkeypatch.setattr(time, "monotonic", lambda: opened_at + 29)
+    assert not breaker.allow_request()
+    monkeypatch.setattr(time, "monotonic", lambda: opened_at + 31)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+from openai import BadRequestError
+
+from app.core.ai_client import BREAKER_FAILURE_THRESHOLD, AIClient
+from app.core.circuit_breaker import CircuitBreaker
+from app.models import EMBEDDING_DIMENSIONS
+from app.services.embedding_backfill import BACKFILL_BATCH_SIZE, EmbeddingBackfillWorker
+
+
+class FakeAIClient:
+    """Multi-input que falla entero si incluye algún texto 'venenoso'."""
+
+    def __init__(self, poison: set, available: bool = True):
+        self.poison = poison
+        self.available = available
+        self.calls = []
+
+    async def get_embeddings(self, texts):
+        self.calls.append(list(texts))
+        if any(text in self.poison for text in texts):
+            return [None] * len(texts)
+        return [[0.1] for _ in texts]
+
+
+def _run(worker, texts):
+    return asyncio.run(worker._embed_isolating(texts))
+
+
+def test_batch_without_failures_is_one_call():
+    worker = EmbeddingBackfillWorker()
+    worker.ai_client = FakeAIClient(poison=set())
+    vectors, isolated = _run(worker, ["a", "b", "c"])
+    assert all(vector is not None for vector in vectors)
+    assert isolated == set()
+    assert len(worker.ai_client.calls) == 1
+
+
+def test_poison_row_is_isolated_and_rest_embedded():
+    worker = EmbeddingBackfillWorker()
+    worker.ai_client = FakeAIClient(poison={"x"})
+    texts = ["a", "b", "x", "c", "d", "e", "f", "g"]
+    vectors, isolated = _run(worker, texts)
+
+    assert isolated == {2}
+    assert vectors[2] is None
+    assert all(vector is not None for i, vector in enumerate(vectors) if i != 2)
+    # Bisección: muchas menos llamadas que una por fila
+    assert len(worker.ai_client.calls) <= 2 * 3 + 1
+
+
+def test_several_poison_rows():
+    worker = EmbeddingBackfillWorker()
+    worker.ai_client = FakeAIClient(poison={"x", "y"})
+    vectors, isolated = _run(worker, ["x", "a", "b", "y"])
+    assert isolated == {0, 3}
+    assert vectors[1] is not None and vectors[2] is not None
+
+
+def test_provider_down_isolates_nothing():
+    worker = EmbeddingBackfillWorker()
+    worker.ai_client = FakeAIClient(poison={"a", "b"}, available=False)
+    vectors, isolated = _run(worker, ["a", "b"])
+    assert vectors == [None, None]
+    assert isolated == set()
+    assert len(worker.ai_client.calls) == 1
+
+
+class RejectingProvider:
+    """Proveedor que rechaza con 400 toda llamada que incluya un texto venenoso."""
+    model = "rejecting-model"
+    remote = False
+
+    def __init__(self, poison: set):
+        self.poison = poison
+        self.calls = 0
+
+    async def embed(self, texts):
+        self.calls += 1
+        if any(text in self.poison for text in texts):
+            request = httpx.Request("POST", "http://provider.test/embeddings")
+            raise BadRequestError("input too long", response=httpx.Response(400, request=request), body=None)
+        return [[0.1] * EMBEDDING_DIMENSIONS for _ in texts]
+
+    async def aclose(self) -> None:
+        pass
+
+
+def test_poison_row_first_in_full_batch_with_real_breaker():
+    # Cliente y breaker reales: los 400 de la bisección no deben abrir el circuito
+    worker = EmbeddingBackfillWorker()
+    worker.ai_client = AIClient(provider=RejectingProvider(poison={"veneno"}))
+    worker.ai_client.breaker = CircuitBreaker("test", BREAKER_FAILURE_THRESHOLD, 30)
+    texts = ["veneno"] + [f"caso {i}" for i in range(1, BACKFILL_BATCH_SIZE)]
+
+    vectors, isolated = _run(worker, texts)
+
+    assert isolated == {0}
+    assert vectors[0] is None
+    assert all(vector is not None for vector in vectors[1:])
+    assert worker.ai_client.breaker.state == CircuitBreaker.CLOSED
+    assert worker.ai_client.available
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.core.embedding_batcher import EmbeddingBatcher
+
+
+class InputError(Exception):
+    """Equivalente a un 400 del proveedor."""
+
+
+class ServerError(Exception):
+    """Equivalente a un 503 del proveedor."""
+
+
+def _batcher(calls: list, poison: set, error=InputError) -> EmbeddingBatcher:
+    async def embed(texts):
+        calls.append(list(texts))
+        if any(text in poison for text in texts):
+            raise error("rechazado")
+        return [[float(len(text))] for text in texts]
+
+    return EmbeddingBatcher(embed, window_ms=5, max_batch_size=64, is_input_error=lambda e: isinstance(e, InputError))
+
+
+async def _submit_all(batcher: EmbeddingBatcher, texts: list) -> list:
+    return await asyncio.gather(*(batcher.submit(text) for text in texts), return_exceptions=True)
+
+
+def test_concurrent_requests_share_one_call():
+    calls = []
+    results = asyncio.run(_submit_all(_batcher(calls, poison=set()), ["a", "bb", "ccc"]))
+    assert results == [[1.0], [2.0], [3.0]]
+    assert len(calls) == 1
+
+
+def test_rejected_text_only_fails_its_own_caller():
+    calls = []
+    batcher = _batcher(calls, poison={"malo"})
+    texts = ["a", "bb", "malo", "ccc", "dddd", "e"]
+    results = asyncio.run(_submit_all(batcher, texts))
+
+    assert isinstance(results[2], InputError)
+    assert [results[i] for i in (0, 1, 3, 4, 5)] == [[1.0], [2.0], [3.0], [4.0], [1.0]]
+    assert batcher.splits_total > 0
+
+
+def test_provider_error_fails_whole_batch_without_splitting():
+    calls = []
+    batcher = _batcher(calls, poison={"a"}, error=ServerError)
+    results = asyncio.run(_submit_all(batcher, ["a", "b", "c"]))
+
+    assert all(isinstance(result, ServerError) for result in results)
+    assert len(calls) == 1
+    assert batcher.splits_total == 0
+
+
+def test_single_rejected_text_raises():
+    calls = []
+    batcher = _batcher(calls, poison={"malo"})
+    with pytest.raises(InputError):
+        asyncio.run(batcher.submit("malo"))
+    assert len(calls) == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+from app.core import ai_client as ai_client_module
+from app.core.ai_client import AIClient
+from app.core.embedding_cache import EmbeddingCache, make_key
+from app.models import EMBEDDING_DIMENSIONS
+
+
+class FakeDBTier:
+    """Sustituye las consultas del tier persistente y cuenta los round trips."""
+
+    def __init__(self, cache: EmbeddingCache, stored: dict):
+        self.stored = stored
+        self.gets = []
+        self.sets = []
+        cache.persistent = True
+        cache._db_get_many = self.get_many
+        cache._db_set_many = self.set_many
+
+    async def get_many(self, keys):
+        self.gets.append(list(keys))
+        return {key: self.stored[key] for key in keys if key in self.stored}
+
+    async def set_many(self, entries, model):
+        self.sets.append(dict(entries))
+        self.stored.update(entries)
+
+
+def test_get_many_single_db_lookup_for_memory_misses():
+    cache = EmbeddingCache()
+    cache.memory.set(make_key("en memoria", "m"), [1.0])
+    db = FakeDBTier(cache, {make_key("en db", "m"): [2.0]})
+
+    results = asyncio.run(cache.get_many(["en memoria", "en db", "nuevo"], "m"))
+
+    assert results == [[1.0], [2.0], None]
+    assert len(db.gets) == 1
+    assert set(db.gets[0]) == {make_key("en db", "m"), make_key("nuevo", "m")}
+    # Promovido al tier en memoria
+    assert cache.memory.get(make_key("en db", "m")) == [2.0]
+
+
+def test_get_many_all_in_memory_skips_db():
+    cache = EmbeddingCache()
+    cache.memory.set(make_key("a", "m"), [1.0])
+    db = FakeDBTier(cache, {})
+    assert asyncio.run(cache.get_many(["a"], "m")) == [[1.0]]
+    assert db.gets == []
+
+
+def test_set_many_single_upsert_with_unique_keys():
+    cache = EmbeddingCache()
+    db = FakeDBTier(cache, {})
+    # "P0300" y "p0300 " normalizan a la misma clave
+    asyncio.run(cache.set_many([("P0300", [1.0]), ("p0300 ", [1.0]), ("otro", [2.0])], "m"))
+    assert len(db.sets) == 1
+    assert len(db.sets[0]) == 2
+
+
+class FakeProvider:
+    model = "fake-model"
+    remote = False
+
+    async def embed(self, texts):
+        return [[0.5] * EMBEDDING_DIMENSIONS for _ in texts]
+
+    async def aclose(self):
+        pass
+
+
+def test_get_embeddings_one_lookup_and_one_write_per_batch(monkeypatch):
+    cache = EmbeddingCache()
+    db = FakeDBTier(cache, {})
+    monkeypatch.setattr(ai_client_module, "embedding_cache", cache)
+    client = AIClient(provider=FakeProvider())
+
+    texts = [f"caso {i}" for i in range(64)] + [""]
+    vectors = asyncio.run(client.get_embeddings(texts))
+
+    assert all(vector is not None for vector in vectors[:64])
+    assert vectors[64] is None
+    assert len(db.gets) == 1 and len(db.sets) == 1
+
+    # Segunda vuelta: todo sale del tier en memoria
+    asyncio.run(client.get_embeddings(texts[:64]))
+    assert len(db.gets) == 1 and len(db.sets) == 1
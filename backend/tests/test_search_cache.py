@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from app.core.search_cache import SearchCache
+from app.models import SearchPage, SearchRequest
+
+
+def _cache(replica_lag_seconds: float = 0.0) -> SearchCache:
+    cache = SearchCache()
+    cache.enabled = True
+    cache.replica_lag_seconds = replica_lag_seconds
+    return cache
+
+
+def test_invalidate_changes_key():
+    cache = _cache()
+    params = SearchRequest(query="ABS encendido")
+
+    async def scenario():
+        before = await cache.key_for(params, "m")
+        await cache.set(before, SearchPage())
+        assert await cache.get(before) is not None
+        await cache.invalidate()
+        after = await cache.key_for(params, "m")
+        assert after != before
+        assert await cache.get(after) is None
+
+    asyncio.run(scenario())
+
+
+def test_normalized_queries_share_key():
+    cache = _cache()
+    a = asyncio.run(cache.key_for(SearchRequest(query="ABS  encendido"), "m"))
+    b = asyncio.run(cache.key_for(SearchRequest(query="abs encendido "), "m"))
+    assert a == b
+
+
+def test_no_caching_right_after_write_with_replica(monkeypatch):
+    cache = _cache(replica_lag_seconds=5)
+    params = SearchRequest(query="ruido motor")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    asyncio.run(cache.invalidate())
+    # Dentro de la ventana: la réplica puede no tener la escritura, no se cachea
+    assert asyncio.run(cache.key_for(params, "m")) is None
+    assert cache.skipped_replica_lag == 1
+
+    monkeypatch.setattr(time, "time", lambda: now + 6)
+    assert asyncio.run(cache.key_for(params, "m")) is not None
+
+
+def test_without_replica_caches_immediately():
+    cache = _cache(replica_lag_seconds=0)
+    asyncio.run(cache.invalidate())
+    assert asyncio.run(cache.key_for(SearchRequest(query="x"), "m")) is not None
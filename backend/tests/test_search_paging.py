@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import FusionMethod, SearchMode, SearchRequest, SearchResult
+from app.services.case_service import (
+    LEXICAL_LIMIT, VECTOR_LIMIT, CaseService, decode_cursor, encode_cursor, fuse_results,
+)
+
+
+def _result(case_id: int, score: float = 0.0) -> SearchResult:
+    return SearchResult(
+        id=case_id, title=f"Caso {case_id}", vehicle_model="Golf", year=2020,
+        construction_group="Motor", score=score,
+    )
+
+
+class FakeAIClient:
+    model = "fake-model"
+
+    def __init__(self, vector=None):
+        self.vector = vector
+
+    async def get_embedding(self, text):
+        return self.vector
+
+
+def _service(vector=None) -> CaseService:
+    return CaseService(session=None, ai_client=FakeAIClient(vector))
+
+
+# --- Cursor ---
+def test_cursor_round_trip():
+    cursor = encode_cursor(0.123456, 42, 10)
+    assert decode_cursor(cursor) == {"k": 0.123456, "i": 42, "n": 10}
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(-1.5e-7, 2**31, 1000)
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "e30=", "eyJrIjoieCIsImkiOjEsIm4iOjF9"])
+def test_invalid_cursor_is_400(cursor):
+    # Basura, '{}' y {"k": "x", ...}
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+# --- Tamaño de página ---
+@pytest.mark.parametrize("mode, expected", [
+    (SearchMode.VECTOR, VECTOR_LIMIT),
+    (SearchMode.AUTO, VECTOR_LIMIT),
+    (SearchMode.HYBRID, VECTOR_LIMIT),
+    (SearchMode.LEXICAL, LEXICAL_LIMIT),
+])
+def test_default_page_size_per_strategy(mode, expected):
+    assert _service()._page_size(SearchRequest(query="x"), mode) == expected
+
+
+def test_explicit_limit_wins():
+    assert _service()._page_size(SearchRequest(query="x", limit=7), SearchMode.LEXICAL) == 7
+
+
+def _run_with_lexical_hits(count: int, vector=None):
+    service = _service(vector)
+
+    async def lexical_search(session, search_params, cursor):
+        return [(_result(i, 1.0 - i / 100), 1.0 - i / 100) for i in range(1, count + 1)]
+
+    async def vector_search(session, search_vector, search_params, cursor, exclude_id=None):
+        return [(_result(i, 0.9), i / 100) for i in range(1, count + 1)]
+
+    service._lexical_search = lexical_search
+    service._vector_search = vector_search
+    return asyncio.run(service._run_search(SearchRequest(query="ruido motor")))
+
+
+def test_auto_fallback_full_lexical_page_has_cursor():
+    page = _run_with_lexical_hits(LEXICAL_LIMIT)
+    assert len(page.results) == LEXICAL_LIMIT
+    assert page.next_cursor is not None
+    assert decode_cursor(page.next_cursor)["n"] == LEXICAL_LIMIT
+
+
+def test_auto_fallback_short_page_has_no_cursor():
+    page = _run_with_lexical_hits(VECTOR_LIMIT)
+    assert page.next_cursor is None
+
+
+def test_auto_vector_full_page_has_cursor():
+    page = _run_with_lexical_hits(VECTOR_LIMIT, vector=[0.1, 0.2])
+    assert page.next_cursor is not None
+
+
+# --- Fusión ---
+def test_rrf_ranks_by_position_and_normalizes():
+    vector = [_result(1, 0.9), _result(2, 0.8)]
+    lexical = [_result(2, 0.5), _result(3, 0.4)]
+    fused = fuse_results([(vector, 1.0), (lexical, 1.0)], FusionMethod.RRF, rrf_k=60)
+
+    assert [r.id for r in fused] == [2, 1, 3]
+    # En ambas listas, 1ª y 2ª posición: (1/62 + 1/61) / (2/61)
+    assert fused[0].score == pytest.approx((1 / 62 + 1 / 61) / (2 / 61))
+    assert all(0 <= r.score <= 1 for r in fused)
+
+
+def test_rrf_top_of_both_lists_scores_one():
+    fused = fuse_results([([_result(1)], 1.0), ([_result(1)], 1.0)], FusionMethod.RRF)
+    assert fused[0].score == pytest.approx(1.0)
+
+
+def test_weighted_fusion_uses_scores_and_weights():
+    vector = [_result(1, 0.9), _result(2, 0.2)]
+    lexical = [_result(2, 1.0)]
+    fused = fuse_results([(vector, 2.0), (lexical, 1.0)], FusionMethod.WEIGHTED)
+
+    scores = {r.id: r.score for r in fused}
+    assert scores[1] == pytest.approx(1.8 / 3)
+    assert scores[2] == pytest.approx((0.4 + 1.0) / 3)
+    assert [r.id for r in fused] == [1, 2]
+
+
+def test_fusion_ties_break_by_id():
+    fused = fuse_results([([_result(5), _result(3)], 1.0), ([_result(3), _result(5)], 1.0)], FusionMethod.RRF)
+    assert [r.id for r in fused] == [3, 5]
+
+
+def test_fusion_with_zero_weights_scores_zero():
+    fused = fuse_results([([_result(1, 0.9)], 0.0)], FusionMethod.WEIGHTED)
+    assert fused[0].score == 0.0
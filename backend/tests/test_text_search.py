@@ -0,0 +1,24 @@
+from sqlalchemy.dialects import postgresql
+
+from app.core.text_search import HIGHLIGHT_START, HIGHLIGHT_STOP, headline_expression, render_headline
+
+
+def test_render_headline_escapes_case_text():
+    fragment = f'<img src=x onerror="alert(1)"> falla {HIGHLIGHT_START}ABS{HIGHLIGHT_STOP} & sensor'
+    rendered = render_headline(fragment)
+
+    assert "<img" not in rendered
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in rendered
+    assert "<mark>ABS</mark>" in rendered
+    assert "&amp; sensor" in rendered
+
+
+def test_literal_mark_in_case_text_is_escaped():
+    assert render_headline("<mark>no</mark>") == "&lt;mark&gt;no&lt;/mark&gt;"
+
+
+def test_headline_uses_plain_text_delimiters():
+    compiled = headline_expression("abs").compile(dialect=postgresql.dialect())
+    options = [value for value in compiled.params.values() if isinstance(value, str) and "StartSel" in value]
+    assert options and "<mark>" not in options[0]
+    assert HIGHLIGHT_START in options[0] and HIGHLIGHT_STOP in options[0]
@@ -0,0 +1,58 @@
+import asyncio
+
+from app.core import vector_index
+from app.core.vector_index import apply_search_params, search_server_settings
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+def test_defaults_cost_no_round_trip(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_TYPE", "hnsw")
+    session = RecordingSession()
+    asyncio.run(apply_search_params(session))
+    asyncio.run(apply_search_params(session, ef_search=vector_index.HNSW_EF_SEARCH))
+    assert session.statements == []
+
+
+def test_override_is_a_single_statement(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_TYPE", "hnsw")
+    session = RecordingSession()
+    asyncio.run(apply_search_params(session, ef_search=200))
+
+    assert len(session.statements) == 1
+    sql, params = session.statements[0]
+    assert sql.startswith("SELECT set_config(")
+    assert params == {"name_0": "hnsw.ef_search", "value_0": "200"}
+
+
+def test_ivfflat_deep_probes_raise_max_probes_in_same_statement(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_TYPE", "ivfflat")
+    monkeypatch.setattr(vector_index, "VECTOR_ITERATIVE_SCAN", "relaxed_order")
+    session = RecordingSession()
+    asyncio.run(apply_search_params(session, probes=vector_index.IVFFLAT_MAX_PROBES + 50))
+
+    assert len(session.statements) == 1
+    sql, params = session.statements[0]
+    assert sql.count("set_config") == 2
+    assert params["name_1"] == "ivfflat.max_probes"
+
+
+def test_server_settings_hnsw(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(vector_index, "VECTOR_ITERATIVE_SCAN", "strict_order")
+    settings = search_server_settings()
+    assert settings["hnsw.ef_search"] == str(vector_index.HNSW_EF_SEARCH)
+    assert settings["hnsw.iterative_scan"] == "strict_order"
+    assert all(isinstance(value, str) for value in settings.values())
+
+
+def test_server_settings_without_iterative_scan(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(vector_index, "VECTOR_ITERATIVE_SCAN", "off")
+    assert set(search_server_settings()) == {"hnsw.ef_search"}
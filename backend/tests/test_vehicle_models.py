@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import VehicleModel
+from app.services import case_service
+from app.services.case_service import CaseService
+
+
+class FakeCatalog:
+    def __init__(self, known: dict):
+        self.known = known
+        self.registered = []
+
+    async def resolve(self, name):
+        return self.known.get(" ".join(name.split()).casefold())
+
+    async def register(self, name):
+        model = VehicleModel(id=100 + len(self.registered), name=" ".join(name.split()))
+        self.registered.append(model.name)
+        return model
+
+
+def _service() -> CaseService:
+    return CaseService(session=None, ai_client=object())
+
+
+def test_unknown_model_is_registered(monkeypatch):
+    catalog = FakeCatalog({"golf": VehicleModel(id=1, name="Golf")})
+    monkeypatch.setattr(case_service, "vehicle_model_catalog", catalog)
+    monkeypatch.setattr(case_service, "VEHICLE_MODELS_STRICT", False)
+
+    model = asyncio.run(_service()._resolve_vehicle_model("ID.7  Tourer"))
+    assert model.name == "ID.7 Tourer"
+    assert catalog.registered == ["ID.7 Tourer"]
+
+    assert asyncio.run(_service()._resolve_vehicle_model("golf")).id == 1
+
+
+def test_strict_mode_rejects_unknown_model(monkeypatch):
+    catalog = FakeCatalog({})
+    monkeypatch.setattr(case_service, "vehicle_model_catalog", catalog)
+    monkeypatch.setattr(case_service, "VEHICLE_MODELS_STRICT", True)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(_service()._resolve_vehicle_model("ID.7"))
+    assert error.value.status_code == 422
+    assert catalog.registered == []
+
+
+def test_blank_model_is_rejected(monkeypatch):
+    monkeypatch.setattr(case_service, "vehicle_model_catalog", FakeCatalog({}))
+    with pytest.raises(HTTPException):
+        asyncio.run(_service()._resolve_vehicle_model("   "))
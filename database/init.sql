@@ -1,20 +1,53 @@
 -- Habilitar la extensión vectorial
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- Búsqueda léxica (fallback cuando la IA no está disponible)
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- 1. Eliminar la tabla vieja si existe para asegurar que se cree limpia
+DROP TABLE IF EXISTS case_neighbors;
 DROP TABLE IF EXISTS diagnosis_cases;
+DROP TABLE IF EXISTS embedding_cache;
+DROP TABLE IF EXISTS vehicle_models;
+
+-- Configuración full-text: español + unaccent ("eléctrico" == "electrico")
+DROP TEXT SEARCH CONFIGURATION IF EXISTS es_unaccent;
+CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+ALTER TEXT SEARCH CONFIGURATION es_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
 
 -- 2. (Opcional) Crear el tipo ENUM si SQLAlchemy lo requiere, 
 -- pero para evitar problemas de casting, usaremos VARCHAR en la tabla
 -- y dejaremos que Python maneje la validación.
 
+-- 2.1 Catálogo oficial de modelos (GET /api/cases/models y filtros de búsqueda)
+CREATE TABLE vehicle_models (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL
+);
+
+CREATE UNIQUE INDEX idx_vehicle_models_name ON vehicle_models (lower(name));
+
+INSERT INTO vehicle_models (name) VALUES
+    ('Amarok'), ('Arteon'), ('Atlas'), ('Beetle'), ('Caddy'), ('Crafter'),
+    ('Golf'), ('Golf GTI'), ('Golf R'), ('ID.3'), ('ID.4'), ('ID.Buzz'),
+    ('Jetta'), ('Jetta GLI'), ('Passat'), ('Polo'), ('Saveiro'),
+    ('T-Cross'), ('Taos'), ('Teramont'), ('Tiguan'), ('Touareg'), ('Transporter'),
+    ('Virtus'), ('Vento');
+
 -- 3. Crear la tabla con los NUEVOS campos de la Épica 2
+-- Particionada por construction_group: una búsqueda con group_filter solo toca
+-- una partición y su índice vectorial (más chico). La PK debe incluir la clave
+-- de partición; id sigue siendo único por venir de una sola secuencia.
+-- Para bases existentes usar database/migrations/006_partition_by_group.sql.
 CREATE TABLE diagnosis_cases (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     title VARCHAR(255) NOT NULL,
     
     -- Nuevos campos requeridos por tu código Python
-    vehicle_model VARCHAR(100),
+    vehicle_model VARCHAR(100),      -- Nombre canónico (copia de vehicle_models.name)
+    vehicle_model_id INT REFERENCES vehicle_models (id),
     year INT,
     construction_group VARCHAR(50),  -- Aquí se guardará 'Suspensión', 'Motor', etc.
     problem_description TEXT,
@@ -22,6 +55,101 @@ CREATE TABLE diagnosis_cases (
     
     -- Campo vectorial
     embedding vector(1536),
+    -- Backfill: intentos fallidos de vectorizar la fila por sí sola (texto que el proveedor rechaza)
+    embedding_attempts INT NOT NULL DEFAULT 0,
+    embedding_failed_at TIMESTAMP,
     
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Transacción que escribió por última vez una columna exportada (trigger):
+    -- marca de sincronización de GET /api/cases/export
+    sync_xid xid8 NOT NULL DEFAULT '0',
+
+    -- Deduplicación (DEDUP_MODE / job offline): altas fusionadas y caso canónico
+    -- de las variantes (sin FK: la PK particionada es (id, construction_group))
+    duplicate_count INT NOT NULL DEFAULT 0,
+    variant_of_id INT,
+
+    -- Documento full-text ponderado (título A, problema B, solución C)
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('es_unaccent', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('es_unaccent', coalesce(problem_description, '')), 'B') ||
+        setweight(to_tsvector('es_unaccent', coalesce(solution_description, '')), 'C')
+    ) STORED,
+
+    PRIMARY KEY (id, construction_group)
+) PARTITION BY LIST (construction_group);
+
+-- Una partición por valor de ConstructionGroup (app/models.py)
+CREATE TABLE diagnosis_cases_motor PARTITION OF diagnosis_cases FOR VALUES IN ('Motor');
+CREATE TABLE diagnosis_cases_transmision PARTITION OF diagnosis_cases FOR VALUES IN ('Transmisión');
+CREATE TABLE diagnosis_cases_electrico PARTITION OF diagnosis_cases FOR VALUES IN ('Eléctrico');
+CREATE TABLE diagnosis_cases_suspension PARTITION OF diagnosis_cases FOR VALUES IN ('Suspensión');
+CREATE TABLE diagnosis_cases_carroceria PARTITION OF diagnosis_cases FOR VALUES IN ('Carrocería');
+CREATE TABLE diagnosis_cases_frenos PARTITION OF diagnosis_cases FOR VALUES IN ('Frenos');
+CREATE TABLE diagnosis_cases_climatizacion PARTITION OF diagnosis_cases FOR VALUES IN ('Climatización');
+CREATE TABLE diagnosis_cases_infoentretenimiento PARTITION OF diagnosis_cases FOR VALUES IN ('Infoentretenimiento');
+-- Grupos nuevos y 'Sin grupo' (casos heredados con grupo NULL, migración 006);
+-- la API valida el enum
+CREATE TABLE diagnosis_cases_default PARTITION OF diagnosis_cases DEFAULT;
+
+-- 4. Índice ANN para búsqueda semántica (distancia coseno)
+-- Sin este índice cada búsqueda es un Seq Scan sobre vectores de 1536 dimensiones.
+-- Sobre la tabla particionada se crea un índice HNSW por partición.
+-- Para reconstruirlo sin bloquear usar POST /api/admin/vector-index/rebuild.
+-- Con EMBEDDING_COMPRESSION=halfvec|binary el índice va sobre una expresión comprimida
+-- (embedding::halfvec(1536) / binary_quantize(embedding)::bit(1536)): se crea con ese rebuild.
+CREATE INDEX idx_diagnosis_cases_embedding
+    ON diagnosis_cases USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- 4.1 Índices de búsqueda léxica
+CREATE INDEX idx_diagnosis_cases_search_vector ON diagnosis_cases USING gin (search_vector);
+
+-- Trigramas para códigos/piezas ("P0300", "5F"); la expresión debe coincidir con app/core/text_search.py
+CREATE INDEX idx_diagnosis_cases_search_trgm ON diagnosis_cases USING gin (
+    (title || ' ' || coalesce(problem_description, '') || ' ' || coalesce(solution_description, '')) gin_trgm_ops
+);
+
+-- 4.2 Filtros de búsqueda (igualdad / IN por id de modelo, grupo y año)
+CREATE INDEX idx_diagnosis_cases_model_group_year ON diagnosis_cases (vehicle_model_id, construction_group, year);
+CREATE INDEX idx_diagnosis_cases_group_year ON diagnosis_cases (construction_group, year);
+
+-- 4.3 Exportación / sincronización incremental (GET /api/cases/export): reanudación
+-- por sync_xid (orden de commit, no de created_at). Ver migración 011.
+CREATE OR REPLACE FUNCTION diagnosis_cases_set_sync_xid() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_diagnosis_cases_sync_xid
+    BEFORE INSERT OR UPDATE OF title, vehicle_model, vehicle_model_id, year, construction_group,
+        problem_description, solution_description, embedding
+    ON diagnosis_cases
+    FOR EACH ROW EXECUTE FUNCTION diagnosis_cases_set_sync_xid();
+
+CREATE INDEX idx_diagnosis_cases_sync_xid ON diagnosis_cases (sync_xid, id);
+
+-- 5. Caché persistente de embeddings (compartida entre workers, sobrevive reinicios)
+-- key = sha256(modelo + texto normalizado)
+CREATE TABLE embedding_cache (
+    key CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    embedding vector(1536) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_embedding_cache_created_at ON embedding_cache (created_at);
+
+-- 6. Índice parcial para el backfill: localiza rápido los casos sin embedding
+CREATE INDEX idx_diagnosis_cases_embedding_null ON diagnosis_cases (id) WHERE embedding IS NULL;
+
+-- 7. Vecinos precalculados para casos similares (NEIGHBORS_PRECOMPUTE=true)
+-- Sin FK: diagnosis_cases está particionada y su PK es (id, construction_group).
+CREATE TABLE case_neighbors (
+    case_id INT NOT NULL,
+    neighbor_id INT NOT NULL,
+    distance REAL NOT NULL,   -- Distancia coseno exacta
+    PRIMARY KEY (case_id, neighbor_id)
+);
@@ -0,0 +1,16 @@
+-- Migración 001: Índice ANN (HNSW) sobre diagnosis_cases.embedding
+-- Ejecutar fuera de una transacción (CONCURRENTLY no bloquea escrituras):
+--   psql "$DATABASE_URL" -f database/migrations/001_vector_index.sql
+--
+-- Alternativa IVFFlat (build más rápido, requiere datos cargados antes de crearlo):
+--   CREATE INDEX CONCURRENTLY idx_diagnosis_cases_embedding
+--       ON diagnosis_cases USING ivfflat (embedding vector_cosine_ops) WITH (lists = 1000);
+--
+-- Para reconstruir con otros parámetros sin downtime: POST /api/admin/vector-index/rebuild
+
+-- Más memoria acelera mucho el build de HNSW (ajustar al servidor)
+SET maintenance_work_mem = '2GB';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_embedding
+    ON diagnosis_cases USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,13 @@
+-- Migración 002: Tabla de caché persistente de embeddings
+-- Se activa en el backend con EMBEDDING_CACHE_PERSISTENT=true
+--   psql "$DATABASE_URL" -f database/migrations/002_embedding_cache.sql
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    embedding vector(1536) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Purga de entradas expiradas (DELETE /api/admin/embedding-cache)
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_created_at ON embedding_cache (created_at);
@@ -0,0 +1,7 @@
+-- Migración 003: Índice parcial para el worker de backfill de embeddings
+-- El worker consulta "WHERE embedding IS NULL ORDER BY id ... FOR UPDATE SKIP LOCKED";
+-- este índice evita recorrer toda la tabla para encontrar el backlog.
+--   psql "$DATABASE_URL" -f database/migrations/003_embedding_backfill.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_embedding_null
+    ON diagnosis_cases (id) WHERE embedding IS NULL;
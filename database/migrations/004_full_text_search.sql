@@ -0,0 +1,32 @@
+-- Migración 004: Búsqueda full-text (tsvector + GIN) y trigramas para el fallback léxico
+-- Reemplaza el ILIKE '%...%' (sin índice posible) por consultas indexadas y rankeadas.
+--   psql "$DATABASE_URL" -f database/migrations/004_full_text_search.sql
+--
+-- ATENCIÓN: agregar una columna generada STORED reescribe la tabla (lock exclusivo
+-- durante la migración). Ejecutar en ventana de mantenimiento.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION es_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('es_unaccent', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('es_unaccent', coalesce(problem_description, '')), 'B') ||
+    setweight(to_tsvector('es_unaccent', coalesce(solution_description, '')), 'C')
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_search_vector
+    ON diagnosis_cases USING gin (search_vector);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_search_trgm ON diagnosis_cases USING gin (
+    (title || ' ' || coalesce(problem_description, '') || ' ' || coalesce(solution_description, '')) gin_trgm_ops
+);
@@ -0,0 +1,41 @@
+-- Migración 005: Catálogo normalizado de modelos (vehicle_models) y filtros indexables
+-- Reemplaza el filtro vehicle_model ILIKE '%...%' (sin índice posible) por
+-- vehicle_model_id = / IN (...) sobre un B-tree compuesto.
+--   psql "$DATABASE_URL" -f database/migrations/005_vehicle_models.sql
+
+CREATE TABLE IF NOT EXISTS vehicle_models (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vehicle_models_name ON vehicle_models (lower(name));
+
+INSERT INTO vehicle_models (name) VALUES
+    ('Amarok'), ('Arteon'), ('Atlas'), ('Beetle'), ('Caddy'), ('Crafter'),
+    ('Golf'), ('Golf GTI'), ('Golf R'), ('ID.3'), ('ID.4'), ('ID.Buzz'),
+    ('Jetta'), ('Jetta GLI'), ('Passat'), ('Polo'), ('Saveiro'),
+    ('T-Cross'), ('Taos'), ('Teramont'), ('Tiguan'), ('Touareg'), ('Transporter'),
+    ('Virtus'), ('Vento')
+ON CONFLICT DO NOTHING;
+
+-- Modelos ya cargados que no están en la lista oficial: se conservan en el catálogo
+INSERT INTO vehicle_models (name)
+SELECT DISTINCT ON (lower(trim(vehicle_model))) trim(vehicle_model)
+FROM diagnosis_cases
+WHERE vehicle_model IS NOT NULL AND trim(vehicle_model) <> ''
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS vehicle_model_id INT REFERENCES vehicle_models (id);
+
+-- Backfill del id y del nombre canónico ('tiguan ' -> 'Tiguan')
+UPDATE diagnosis_cases dc
+SET vehicle_model_id = vm.id, vehicle_model = vm.name
+FROM vehicle_models vm
+WHERE lower(trim(dc.vehicle_model)) = lower(vm.name)
+  AND dc.vehicle_model_id IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_model_group_year
+    ON diagnosis_cases (vehicle_model_id, construction_group, year);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_group_year
+    ON diagnosis_cases (construction_group, year);
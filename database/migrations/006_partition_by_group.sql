@@ -0,0 +1,142 @@
+-- Migración 006: Particionar diagnosis_cases por construction_group (LIST)
+-- Cada partición tiene su propio índice vectorial: una búsqueda con group_filter
+-- se poda a una sola partición (Motor y Eléctrico dominan, Climatización es chica).
+--   psql "$DATABASE_URL" -f database/migrations/006_partition_by_group.sql
+--
+-- Requiere las migraciones 001-005. Fases:
+--   1. Crear la tabla particionada con nombre temporal y copiar los datos
+--      (la tabla vieja sigue en servicio).
+--   2. Construir los índices sobre la copia (aún no recibe tráfico).
+--   3. Swap en una transacción corta: copiar el delta (altas, ediciones y bajas
+--      hechas durante la copia), renombrar y liberar nombres.
+-- La tabla original queda como diagnosis_cases_unpartitioned (sin índices) como
+-- respaldo; borrarla cuando se haya verificado la migración.
+-- La PK (id, construction_group) hace NOT NULL la clave de partición: los casos
+-- heredados con construction_group NULL se copian como 'Sin grupo' (partición
+-- DEFAULT); la tabla de respaldo conserva el NULL original.
+-- El índice vectorial se crea como HNSW por defecto; con VECTOR_INDEX_TYPE=ivfflat
+-- reconstruirlo después con POST /api/admin/vector-index/rebuild.
+
+SET maintenance_work_mem = '2GB';
+SET statement_timeout = 0;
+
+-- === 1. Tabla particionada + copia inicial ===
+CREATE TABLE diagnosis_cases_partitioned (
+    id INT NOT NULL DEFAULT nextval('diagnosis_cases_id_seq'),
+    title VARCHAR(255) NOT NULL,
+    vehicle_model VARCHAR(100),
+    vehicle_model_id INT REFERENCES vehicle_models (id),
+    year INT,
+    construction_group VARCHAR(50),
+    problem_description TEXT,
+    solution_description TEXT,
+    embedding vector(1536),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('es_unaccent', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('es_unaccent', coalesce(problem_description, '')), 'B') ||
+        setweight(to_tsvector('es_unaccent', coalesce(solution_description, '')), 'C')
+    ) STORED,
+    CONSTRAINT diagnosis_cases_partitioned_pkey PRIMARY KEY (id, construction_group)
+) PARTITION BY LIST (construction_group);
+
+CREATE TABLE diagnosis_cases_motor PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Motor');
+CREATE TABLE diagnosis_cases_transmision PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Transmisión');
+CREATE TABLE diagnosis_cases_electrico PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Eléctrico');
+CREATE TABLE diagnosis_cases_suspension PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Suspensión');
+CREATE TABLE diagnosis_cases_carroceria PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Carrocería');
+CREATE TABLE diagnosis_cases_frenos PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Frenos');
+CREATE TABLE diagnosis_cases_climatizacion PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Climatización');
+CREATE TABLE diagnosis_cases_infoentretenimiento PARTITION OF diagnosis_cases_partitioned FOR VALUES IN ('Infoentretenimiento');
+CREATE TABLE diagnosis_cases_default PARTITION OF diagnosis_cases_partitioned DEFAULT;
+
+INSERT INTO diagnosis_cases_partitioned (
+    id, title, vehicle_model, vehicle_model_id, year, construction_group,
+    problem_description, solution_description, embedding, created_at
+)
+SELECT id, title, vehicle_model, vehicle_model_id, year, coalesce(construction_group, 'Sin grupo'),
+       problem_description, solution_description, embedding, created_at
+FROM diagnosis_cases;
+
+-- === 2. Índices (sobre la tabla padre: Postgres crea uno por partición) ===
+CREATE INDEX idx_diagnosis_cases_embedding_p
+    ON diagnosis_cases_partitioned USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX idx_diagnosis_cases_search_vector_p ON diagnosis_cases_partitioned USING gin (search_vector);
+
+CREATE INDEX idx_diagnosis_cases_search_trgm_p ON diagnosis_cases_partitioned USING gin (
+    (title || ' ' || coalesce(problem_description, '') || ' ' || coalesce(solution_description, '')) gin_trgm_ops
+);
+
+CREATE INDEX idx_diagnosis_cases_embedding_null_p ON diagnosis_cases_partitioned (id) WHERE embedding IS NULL;
+CREATE INDEX idx_diagnosis_cases_model_group_year_p ON diagnosis_cases_partitioned (vehicle_model_id, construction_group, year);
+CREATE INDEX idx_diagnosis_cases_group_year_p ON diagnosis_cases_partitioned (construction_group, year);
+
+ANALYZE diagnosis_cases_partitioned;
+
+-- === 3. Swap (bloquea escrituras solo mientras dura esta transacción) ===
+BEGIN;
+
+LOCK TABLE diagnosis_cases IN EXCLUSIVE MODE;
+
+-- Casos creados durante la copia
+INSERT INTO diagnosis_cases_partitioned (
+    id, title, vehicle_model, vehicle_model_id, year, construction_group,
+    problem_description, solution_description, embedding, created_at
+)
+SELECT id, title, vehicle_model, vehicle_model_id, year, coalesce(construction_group, 'Sin grupo'),
+       problem_description, solution_description, embedding, created_at
+FROM diagnosis_cases
+WHERE id > (SELECT coalesce(max(id), 0) FROM diagnosis_cases_partitioned);
+
+-- Filas modificadas durante la copia: fila completa, no solo el embedding
+-- (ediciones de título, descripción, modelo o grupo; el cambio de grupo mueve
+-- la fila de partición)
+UPDATE diagnosis_cases_partitioned p
+SET title = o.title,
+    vehicle_model = o.vehicle_model,
+    vehicle_model_id = o.vehicle_model_id,
+    year = o.year,
+    construction_group = coalesce(o.construction_group, 'Sin grupo'),
+    problem_description = o.problem_description,
+    solution_description = o.solution_description,
+    embedding = o.embedding,
+    created_at = o.created_at
+FROM diagnosis_cases o
+WHERE p.id = o.id
+  AND (p.title, p.vehicle_model, p.vehicle_model_id, p.year, p.construction_group,
+       p.problem_description, p.solution_description, p.embedding, p.created_at)
+      IS DISTINCT FROM
+      (o.title, o.vehicle_model, o.vehicle_model_id, o.year, coalesce(o.construction_group, 'Sin grupo'),
+       o.problem_description, o.solution_description, o.embedding, o.created_at);
+
+-- Filas borradas durante la copia
+DELETE FROM diagnosis_cases_partitioned p
+WHERE NOT EXISTS (SELECT 1 FROM diagnosis_cases o WHERE o.id = p.id);
+
+ALTER TABLE diagnosis_cases RENAME TO diagnosis_cases_unpartitioned;
+ALTER TABLE diagnosis_cases_unpartitioned RENAME CONSTRAINT diagnosis_cases_pkey TO diagnosis_cases_unpartitioned_pkey;
+ALTER SEQUENCE diagnosis_cases_id_seq OWNED BY diagnosis_cases_partitioned.id;
+
+DROP INDEX IF EXISTS idx_diagnosis_cases_embedding;
+DROP INDEX IF EXISTS idx_diagnosis_cases_search_vector;
+DROP INDEX IF EXISTS idx_diagnosis_cases_search_trgm;
+DROP INDEX IF EXISTS idx_diagnosis_cases_embedding_null;
+DROP INDEX IF EXISTS idx_diagnosis_cases_model_group_year;
+DROP INDEX IF EXISTS idx_diagnosis_cases_group_year;
+
+ALTER TABLE diagnosis_cases_partitioned RENAME TO diagnosis_cases;
+ALTER TABLE diagnosis_cases RENAME CONSTRAINT diagnosis_cases_partitioned_pkey TO diagnosis_cases_pkey;
+
+ALTER INDEX idx_diagnosis_cases_embedding_p RENAME TO idx_diagnosis_cases_embedding;
+ALTER INDEX idx_diagnosis_cases_search_vector_p RENAME TO idx_diagnosis_cases_search_vector;
+ALTER INDEX idx_diagnosis_cases_search_trgm_p RENAME TO idx_diagnosis_cases_search_trgm;
+ALTER INDEX idx_diagnosis_cases_embedding_null_p RENAME TO idx_diagnosis_cases_embedding_null;
+ALTER INDEX idx_diagnosis_cases_model_group_year_p RENAME TO idx_diagnosis_cases_model_group_year;
+ALTER INDEX idx_diagnosis_cases_group_year_p RENAME TO idx_diagnosis_cases_group_year;
+
+COMMIT;
+
+-- Verificación: filas por partición
+-- SELECT tableoid::regclass AS particion, count(*) FROM diagnosis_cases GROUP BY 1 ORDER BY 2 DESC;
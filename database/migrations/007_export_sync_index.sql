@@ -0,0 +1,33 @@
+-- Migración 007: Índice (created_at, id) para GET /api/cases/export
+-- La exportación recorre el corpus en ese orden y la sincronización incremental
+-- reanuda con (created_at, id) > (:since, :id): sin este índice cada export
+-- ordena la tabla completa en memoria/disco.
+--
+-- diagnosis_cases está particionada (006): CREATE INDEX CONCURRENTLY no se
+-- admite sobre la tabla padre, así que se crea el índice padre ON ONLY
+-- (inválido, sin bloquear escrituras), uno CONCURRENTLY por partición y se
+-- adjuntan; al adjuntar la última el índice padre pasa a válido.
+-- No correr dentro de una transacción:
+--   psql "$DATABASE_URL" -f database/migrations/007_export_sync_index.sql
+
+CREATE INDEX IF NOT EXISTS idx_diagnosis_cases_created_id ON ONLY diagnosis_cases (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_motor_created_id ON diagnosis_cases_motor (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_transmision_created_id ON diagnosis_cases_transmision (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_electrico_created_id ON diagnosis_cases_electrico (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_suspension_created_id ON diagnosis_cases_suspension (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_carroceria_created_id ON diagnosis_cases_carroceria (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_frenos_created_id ON diagnosis_cases_frenos (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_climatizacion_created_id ON diagnosis_cases_climatizacion (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_infoentretenimiento_created_id ON diagnosis_cases_infoentretenimiento (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_default_created_id ON diagnosis_cases_default (created_at, id);
+
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_motor_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_transmision_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_electrico_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_suspension_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_carroceria_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_frenos_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_climatizacion_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_infoentretenimiento_created_id;
+ALTER INDEX idx_diagnosis_cases_created_id ATTACH PARTITION idx_diagnosis_cases_default_created_id;
@@ -0,0 +1,14 @@
+-- Migración 008: Vecinos precalculados para casos similares
+-- Con NEIGHBORS_PRECOMPUTE=true el backend guarda los K vecinos más cercanos
+-- de cada caso vectorizado y GET /api/cases/{id}/similar (sin filtros) y
+-- POST /api/cases/similar se responden con una lectura por PK, sin ANN.
+-- Sin FK: diagnosis_cases está particionada y su PK es (id, construction_group).
+-- Tras aplicarla, poblar con POST /api/admin/neighbors/rebuild.
+--   psql "$DATABASE_URL" -f database/migrations/008_case_neighbors.sql
+
+CREATE TABLE IF NOT EXISTS case_neighbors (
+    case_id INT NOT NULL,
+    neighbor_id INT NOT NULL,
+    distance REAL NOT NULL,   -- Distancia coseno exacta
+    PRIMARY KEY (case_id, neighbor_id)
+);
@@ -0,0 +1,12 @@
+-- Migración 009: Deduplicación de casos casi idénticos
+-- duplicate_count: altas fusionadas en el caso (DEDUP_MODE=merge).
+-- variant_of_id: caso canónico del que este es una variante (DEDUP_MODE=variant
+-- o el job offline); las variantes no aparecen en la búsqueda ni en similares.
+-- Sin FK: diagnosis_cases está particionada y su PK es (id, construction_group).
+-- Ambas columnas se agregan sin reescribir la tabla (default constante / NULL).
+-- Tras aplicarla, agrupar los duplicados existentes con
+-- POST /api/admin/dedup/run (o python -m app.services.dedup_service).
+--   psql "$DATABASE_URL" -f database/migrations/009_case_dedup.sql
+
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS duplicate_count INT NOT NULL DEFAULT 0;
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS variant_of_id INT;
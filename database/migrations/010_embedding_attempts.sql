@@ -0,0 +1,14 @@
+-- Migración 010: Intentos fallidos del backfill de embeddings por fila
+-- Una fila que el proveedor rechaza siempre (texto sobre el límite del modelo,
+-- 400 no reintentable) hacía fallar todo su lote en cada vuelta y frenaba el
+-- backlog. El worker ahora la aísla por bisección y anota el intento: se
+-- reintenta cada BACKFILL_RETRY_AFTER_SECONDS y se abandona tras
+-- BACKFILL_MAX_ATTEMPTS (ver "exhausted" en GET /api/admin/embeddings/backfill).
+-- Ambas columnas se agregan sin reescribir la tabla (default constante / NULL).
+--   psql "$DATABASE_URL" -f database/migrations/010_embedding_attempts.sql
+
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS embedding_attempts INT NOT NULL DEFAULT 0;
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS embedding_failed_at TIMESTAMP;
+
+-- Para reintentar un caso ya corregido:
+--   UPDATE diagnosis_cases SET embedding_attempts = 0, embedding_failed_at = NULL WHERE id = ...;
@@ -0,0 +1,57 @@
+-- Migración 011: Marca de sincronización por transacción para GET /api/cases/export
+-- La reanudación por (created_at, id) perdía casos: created_at lo pone la app al
+-- construir el objeto, no al confirmar, así que una transacción que confirma
+-- después de un export puede traer un (created_at, id) menor que el cursor del
+-- cliente. Tampoco se reenviaban los casos vectorizados después de exportados.
+--
+-- Ahora cada INSERT o UPDATE de una columna exportada guarda el id de su
+-- transacción (sync_xid, xid8 sin wraparound). El export entrega como token
+-- pg_snapshot_xmin(pg_current_snapshot()): toda transacción con id menor ya
+-- terminó, así que el siguiente export (sync_xid >= token) no se salta nada.
+-- Requiere PostgreSQL 13+. Los casos previos quedan con sync_xid = 0 (entran
+-- en el primer export completo).
+--
+-- Índice como en 007 (padre ON ONLY + CONCURRENTLY por partición).
+-- No correr dentro de una transacción:
+--   psql "$DATABASE_URL" -f database/migrations/011_export_sync_xid.sql
+
+ALTER TABLE diagnosis_cases ADD COLUMN IF NOT EXISTS sync_xid xid8 NOT NULL DEFAULT '0';
+
+CREATE OR REPLACE FUNCTION diagnosis_cases_set_sync_xid() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_diagnosis_cases_sync_xid ON diagnosis_cases;
+CREATE TRIGGER trg_diagnosis_cases_sync_xid
+    BEFORE INSERT OR UPDATE OF title, vehicle_model, vehicle_model_id, year, construction_group,
+        problem_description, solution_description, embedding
+    ON diagnosis_cases
+    FOR EACH ROW EXECUTE FUNCTION diagnosis_cases_set_sync_xid();
+
+CREATE INDEX IF NOT EXISTS idx_diagnosis_cases_sync_xid ON ONLY diagnosis_cases (sync_xid, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_motor_sync_xid ON diagnosis_cases_motor (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_transmision_sync_xid ON diagnosis_cases_transmision (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_electrico_sync_xid ON diagnosis_cases_electrico (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_suspension_sync_xid ON diagnosis_cases_suspension (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_carroceria_sync_xid ON diagnosis_cases_carroceria (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_frenos_sync_xid ON diagnosis_cases_frenos (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_climatizacion_sync_xid ON diagnosis_cases_climatizacion (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_infoentretenimiento_sync_xid ON diagnosis_cases_infoentretenimiento (sync_xid, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_diagnosis_cases_default_sync_xid ON diagnosis_cases_default (sync_xid, id);
+
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_motor_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_transmision_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_electrico_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_suspension_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_carroceria_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_frenos_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_climatizacion_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_infoentretenimiento_sync_xid;
+ALTER INDEX idx_diagnosis_cases_sync_xid ATTACH PARTITION idx_diagnosis_cases_default_sync_xid;
+
+-- El índice (created_at, id) de la migración 007 ya no lo usa el export
+DROP INDEX IF EXISTS idx_diagnosis_cases_created_id;